@@ -0,0 +1,308 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Benchmark of the read, poll, subscribe and write paths of the asyncua client.
+
+The example server (local/local_example_server.py) is started in a separate
+process with N variables that are updated at a fixed interval. For every
+benchmark the sustained throughput and the latency distribution are measured
+and written to a JSON file. With --baseline a previous result file is compared
+and the exit code is 1 if a benchmark regressed more than the tolerance.
+
+Usage: python benchmark.py [--variables 100] [--duration 5] [--output file.json] [--baseline file.json]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from asyncua import Client, ua
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "local"))
+from local_example_server import create_example_server, run_example_server
+
+ENDPOINT = "opc.tcp://127.0.0.1:{}/example/"
+UPDATE_INTERVAL = 0.01 # [FLOAT: seconds], update interval of the values on the server
+PUBLISHING_INTERVALS = [10, 100, 1000] # [FLOAT: milliseconds]
+BENCHMARKS = ["poll", "batch_read", "subscribe", "write", "batch_write"]
+
+
+def serve(port: int, count: int) -> None:
+
+    """Runs the example server, in its own process."""
+
+    async def run():
+        server, variables = await create_example_server(ENDPOINT.format(port), count)
+        await run_example_server(server, variables, UPDATE_INTERVAL)
+
+    # Only the results of the client are logged
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('asyncua').setLevel(logging.CRITICAL)
+    asyncio.run(run())
+
+
+def get_result(name: str, duration: float, operations: int, values: int, latencies: list, **extra) -> dict:
+
+    """Returns the result of a benchmark. The latencies are in seconds, the result in milliseconds."""
+
+    latencies = np.asarray(latencies, dtype=np.float64) * 1000
+
+    result = {
+        "name": name,
+        "duration": duration,
+        "operations": operations,
+        "operations_per_s": operations / duration,
+        "values_per_s": values / duration,
+        "latency_ms": {
+            "mean": float(np.mean(latencies)) if len(latencies) > 0 else 0.0,
+            "p50": float(np.percentile(latencies, 50)) if len(latencies) > 0 else 0.0,
+            "p99": float(np.percentile(latencies, 99)) if len(latencies) > 0 else 0.0,
+            "max": float(np.max(latencies)) if len(latencies) > 0 else 0.0}}
+    result.update(extra)
+
+    logging.info("{0:<16} {1:>10.0f} ops/s {2:>10.0f} values/s   p50 {3:>8.3f} ms   p99 {4:>8.3f} ms".format(
+        name, result["operations_per_s"], result["values_per_s"], result["latency_ms"]["p50"], result["latency_ms"]["p99"]))
+
+    return result
+
+
+async def benchmark_poll(client: Client, nodes: list, duration: float) -> dict:
+
+    """Single read_value of one node in a loop, as the polling mode of the load cell."""
+
+    node = nodes[0]
+    latencies = []
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration:
+        t0 = time.perf_counter()
+        await node.read_value()
+        latencies.append(time.perf_counter() - t0)
+
+    return get_result("poll", time.perf_counter() - start, len(latencies), len(latencies), latencies)
+
+
+async def benchmark_batch_read(client: Client, nodes: list, duration: float) -> dict:
+
+    """Read of all nodes in one request."""
+
+    latencies = []
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration:
+        t0 = time.perf_counter()
+        await client.read_values(nodes)
+        latencies.append(time.perf_counter() - t0)
+
+    return get_result("batch_read", time.perf_counter() - start, len(latencies), len(latencies) * len(nodes), latencies)
+
+
+class LatencyHandler:
+
+    """Subscription handler that records the time between the source timestamp and the notification."""
+
+    def __init__(self):
+        self.latencies = []
+
+    def datachange_notification(self, node, val, data):
+        timestamp = data.monitored_item.Value.SourceTimestamp
+        if timestamp is not None:
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            self.latencies.append((datetime.now(timezone.utc) - timestamp).total_seconds())
+
+
+async def benchmark_subscribe(client: Client, nodes: list, duration: float, period: float) -> dict:
+
+    """
+    Data change subscription of all nodes with the given publishing interval [ms].
+    The latency is the time from the source timestamp to the notification, it includes the publishing interval.
+    """
+
+    handler = LatencyHandler()
+    duration = max(duration, 5 * period / 1000)
+    subscription = await client.create_subscription(period, handler)
+    queuesize = max(1, int(period / 1000 / UPDATE_INTERVAL) + 1)
+    await subscription.subscribe_data_change(nodes, queuesize=queuesize, sampling_interval=UPDATE_INTERVAL * 1000)
+
+    # Skip the initial values
+    await asyncio.sleep(2 * period / 1000)
+    handler.latencies.clear()
+    start = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    latencies = list(handler.latencies)
+    await subscription.delete()
+
+    return get_result("subscribe_{}ms".format(int(period)), elapsed, len(latencies), len(latencies), latencies,
+                      publishing_interval=period, queuesize=queuesize)
+
+
+async def benchmark_write(client: Client, nodes: list, duration: float) -> dict:
+
+    """Single write_value of one node in a loop."""
+
+    node = nodes[0]
+    latencies = []
+    value = 0.0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration:
+        value += 1
+        t0 = time.perf_counter()
+        await node.write_value(ua.DataValue(ua.Variant(value, ua.VariantType.Double)))
+        latencies.append(time.perf_counter() - t0)
+
+    return get_result("write", time.perf_counter() - start, len(latencies), len(latencies), latencies)
+
+
+async def benchmark_batch_write(client: Client, nodes: list, duration: float) -> dict:
+
+    """Write of all nodes in one request."""
+
+    latencies = []
+    value = 0.0
+    start = time.perf_counter()
+
+    while time.perf_counter() - start < duration:
+        value += 1
+        values = [ua.DataValue(ua.Variant(value, ua.VariantType.Double)) for _ in nodes]
+        t0 = time.perf_counter()
+        await client.write_values(nodes, values)
+        latencies.append(time.perf_counter() - t0)
+
+    return get_result("batch_write", time.perf_counter() - start, len(latencies), len(latencies) * len(nodes), latencies)
+
+
+async def run_benchmarks(port: int, count: int, duration: float, benchmarks: list) -> list:
+
+    """Connects to the server and runs the benchmarks."""
+
+    results = []
+
+    async with Client(url=ENDPOINT.format(port)) as client:
+        idx = await client.get_namespace_index("http://examples.freeopcua.github.io")
+        values = await client.nodes.objects.get_child("{}:Values".format(idx))
+        nodes = [await values.get_child("{0}:Value {1}".format(idx, i)) for i in range(1, count + 1)]
+
+        if "poll" in benchmarks:
+            results.append(await benchmark_poll(client, nodes, duration))
+        if "batch_read" in benchmarks:
+            results.append(await benchmark_batch_read(client, nodes, duration))
+        if "subscribe" in benchmarks:
+            for period in PUBLISHING_INTERVALS:
+                results.append(await benchmark_subscribe(client, nodes, duration, period))
+        if "write" in benchmarks:
+            results.append(await benchmark_write(client, nodes, duration))
+        if "batch_write" in benchmarks:
+            results.append(await benchmark_batch_write(client, nodes, duration))
+
+    return results
+
+
+async def wait_for_server(port: int, timeout: float = 30.0) -> None:
+
+    """Waits until the server accepts connections."""
+
+    deadline = time.monotonic() + timeout
+
+    while True:
+        try:
+            async with Client(url=ENDPOINT.format(port)):
+                return
+        except (OSError, asyncio.TimeoutError, ua.UaError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+
+    """Returns the benchmarks that are slower than the baseline: lower throughput or higher p99 latency."""
+
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+
+    for result in results:
+        old = previous.get(result["name"])
+
+        if old is None:
+            continue
+
+        throughput = result["values_per_s"] / old["values_per_s"] if old["values_per_s"] > 0 else 1.0
+        latency = result["latency_ms"]["p99"] / old["latency_ms"]["p99"] if old["latency_ms"]["p99"] > 0 else 1.0
+        logging.info("{0:<16} throughput {1:>6.2f}x   p99 {2:>6.2f}x of the baseline".format(result["name"], throughput, latency))
+
+        # Subscriptions are limited by the update rate of the server, only the latency counts
+        if (throughput < 1 - tolerance and not result["name"].startswith("subscribe")) or latency > 1 + tolerance:
+            regressions.append(result["name"])
+
+    return regressions
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark of the asyncua client against the local example server.")
+    parser.add_argument("--variables", type=int, default=100, help="Number of variables on the server.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Duration of every benchmark [s].")
+    parser.add_argument("--port", type=int, default=48480)
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--output", help="Result file, default benchmark_<date>_<time>.json.")
+    parser.add_argument("--baseline", help="Result file of a previous run to compare with.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression.")
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(args.port, args.variables), daemon=True)
+    server.start()
+
+    try:
+        asyncio.run(wait_for_server(args.port))
+        results = asyncio.run(run_benchmarks(args.port, args.variables, args.duration, args.benchmarks))
+    finally:
+        server.terminate()
+        server.join()
+
+    output = args.output or datetime.now().strftime("benchmark_%Y%m%d_%H%M%S.json")
+    report = {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "asyncua": getattr(sys.modules["asyncua"], "__version__", "unknown"),
+        "variables": args.variables,
+        "duration": args.duration,
+        "update_interval": UPDATE_INTERVAL,
+        "results": results}
+
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    logging.info("Results written to {}.".format(output))
+
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if len(regressions) > 0:
+            logging.error("Regression of: {}".format(", ".join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.getLogger('asyncua').setLevel(logging.WARNING)
+    logging.basicConfig(level=logging.INFO)
+    main()
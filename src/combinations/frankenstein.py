@@ -2,72 +2,106 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
+import os
+import sys
+import time
 from datetime import datetime
-from asyncua import Client, Node, ua
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
+from fan_out import FanOutWriter
+from metrics import MetricsHandler, MetricsRegistry, MetricsServer, register_connection, register_fan_out
+from session_group import SessionGroup
+
+METRICS_PORT = 9100 # [INT: -], metrics on http://127.0.0.1:9100/metrics, None to disable
 
 async def main():
   
-    while True:
-        
-        mtec_client = Client(url="opc.tcp://10.129.4.73:4840")
-        material_client = Client(url="opc.tcp://10.129.4.30:4840")
-        vertico_client = Client(url="opc.tcp://10.129.4.40:4840")
-
-        try:
-            async with mtec_client, vertico_client, material_client:
-                               
-                node_mtec = mtec_client.get_node("ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.aut_mixer") #UInt16
-                node_material = material_client.get_node("ns=4;i=22") #DO1, Boolean
-                node_vertico = vertico_client.get_node("ns=5;i=2") # DO3, Boolean
-                sync_handler = SyncHandler(node_material, node_vertico)
-
-                sub = await mtec_client.create_subscription(100, sync_handler)
-                await sub.subscribe_data_change(node_mtec)
-                
-                logging.info("Start")
-                
-                while True: 
-                    
-                    # Wait
-                    await asyncio.sleep(1.0)
-                    
-                    # Check connections
-                    await mtec_client.check_connection()
-                    await material_client.check_connection()
-                    await vertico_client.check_connection()
-
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    # Connected concurrently, every machine reconnects on its own
+    group = SessionGroup({
+        "mtec": ConnectionManager("opc.tcp://10.129.4.73:4840"),
+        "material": ConnectionManager("opc.tcp://10.129.4.30:4840"),
+        "vertico": ConnectionManager("opc.tcp://10.129.4.40:4840")})
+                       
+    # Mixer signal is written to both machines concurrently
+    writer = FanOutWriter({
+        "material": group["material"].get_node("ns=4;i=22"), #DO1, Boolean
+        "vertico": group["vertico"].get_node("ns=5;i=2")}) # DO3, Boolean
+    sync_handler = SyncHandler(writer, group)
+    handler = sync_handler
+
+    # Notification rate and delay, handler time, write latency per machine and reconnects
+    if METRICS_PORT is not None:
+        registry = MetricsRegistry()
+        for name, connection in group.managers.items():
+            register_connection(registry, name, connection)
+        register_fan_out(registry, "mixer", writer)
+        handler = MetricsHandler(sync_handler, registry, "mtec", {"ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.aut_mixer": "aut_mixer"})
+        MetricsServer(registry, METRICS_PORT).start()
+
+    group["mtec"].add_subscription(100, handler, ["ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.aut_mixer"]) #UInt16
+    
+    logging.info("Start")
+    
+    await group.run()
 
 class SyncHandler:
 
     """
     Subscription Handler. To receive events from the server for a subscription.
+
+    Mixer changes are only forwarded while all machines are connected. The
+    forwarding stops as soon as one of the sessions is lost, and the last mixer
+    state is written again once all machines are connected.
     """
     
-    def __init__(self, node_material : Node, node_vertico : Node):
+    def __init__(self, writer : FanOutWriter, group : SessionGroup):
 
         """Initializes the event handler."""
 
-        self.node_material = node_material
-        self.node_vertico = node_vertico
+        self.writer = writer
+        self.group = group
+        self.enabled = False
+        self.last_value = None
+        self._resync = None # Write of the last mixer state after a reconnect, superseded by a newer mixer command
         self.last_batch_start = datetime.now()
         self.last_batch_end = datetime.now()
         self.dict_batch_duration = {}
         self.dict_batch_interval = {}
         self.dict_pred_mass_flow = {}
+        group.add_listener(self.on_state_change)
+
+    def on_state_change(self, name, state, reason):
+
+        """
+        Called on every connection state change of one of the machines.
+        """
+
+        enabled = self.group.is_connected()
+
+        if enabled == self.enabled:
+            return
+
+        self.enabled = enabled
+        self._cancel_resync()
+
+        if not enabled:
+            logging.warning("Stopped forwarding mixer commands, {0} is {1}: {2}".format(name, state, reason))
+        elif self.last_value is not None:
+            logging.info("All machines connected, forwarding mixer commands. Mixer state {} is written again.".format(self.last_value))
+            self._resync = asyncio.ensure_future(self.writer.write(self.last_value))
+        else:
+            logging.info("All machines connected, forwarding mixer commands.")
 
     async def datachange_notification(self, node, val, data):
         
@@ -75,33 +109,51 @@ class SyncHandler:
         Called for every data change notification from the server.
         """
 
-        # Changes values of other systems
-        await self.node_material.write_value(val)
-        await self.node_vertico.write_value(val)
+        start = time.monotonic()
+        now = datetime.now()
+        self.last_value = val
+        self._cancel_resync()
 
-        time = datetime.now()
+        # Not forwarded while one of the machines is disconnected
+        if not self.enabled:
+            logging.info("Mixer command %s held until all machines are connected.", val)
+            return
+
+        # Changes values of other systems, errors are reported per machine
+        await self.writer.write(val, start)
 
         # Mixer switched on
         if (val == True):
             logging.info("Mixer started.")
-            self.last_batch_start = time
+            self.last_batch_start = now
 
         # Mixer switched off
         else:
             logging.info("Mixer stopped.")
 
             # Calculate values
-            duration = (time - self.last_batch_start).total_seconds()
-            interval = (time - self.last_batch_end).total_seconds()
+            duration = (now - self.last_batch_start).total_seconds()
+            interval = (now - self.last_batch_end).total_seconds()
 
             # Set values
-            self.dict_batch_duration[time] = duration
-            self.dict_batch_interval[time] = interval
-            self.last_batch_end = time
+            self.dict_batch_duration[now] = duration
+            self.dict_batch_interval[now] = interval
+            self.last_batch_end = now
+
+            logging.info("Batch interval [sec]  : %.2f", interval)
+            logging.info("Batch duration [sec]  : %.2f", duration)
+            self.writer.log_stats()
+            logging.info("")
+
+
+    def _cancel_resync(self) -> None:
+
+        """Cancels the write of the last mixer state if it is still in flight: an older state never follows a newer one."""
 
-            logging.info("Batch interval [sec]  : {0:.2f}".format(interval))
-            logging.info("Batch duration [sec]  : {0:.2f}\n".format(duration))
+        if self._resync is not None and not self._resync.done():
+            self._resync.cancel()
 
+        self._resync = None
 
     def event_notification(self, event):
         
@@ -122,5 +174,5 @@ class SyncHandler:
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
     asyncio.run(main())
\ No newline at end of file
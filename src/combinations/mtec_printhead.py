@@ -2,79 +2,71 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
-from asyncua import Client, ua
+import os
+import sys
+from asyncua import ua
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
+from schedule_runner import ScheduleRunner
+from session_group import SessionGroup
+from tag_registry import TagRegistry
 
 DELTA_TIME = 10 # Minutes
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mtec_printhead_state.json") # Progress, to resume after a restart
+# Tags of the printhead PLC, the namespace index is looked up on the server
+PRINTHEAD_TAGS = {"velocity_jog_left": "nsu=http://www.siemens.com/simatic-s7-opcua;s=\"Velocity_Jog_left\""}
+TAG_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag_cache.json") # Resolved node ids per server version
 MTEC_RPMS = [180, 180, 180, 180, 180, 180, 300, 300, 300, 300, 300, 300, 180, 180, 180, 180, 180, 180, 300, 300, 300, 300, 300, 300, 180]
 PRINTHEAD_RPMS = [51, 450, 150, 50, 300, 600, 51, 450, 50, 300, 600, 150, 51, 150, 300, 50, 450, 600, 51, 600, 50, 300, 450, 150, 51]
 
 async def main():
   
-    while True:
-        
-        # Data check
-        if (len(PRINTHEAD_RPMS) != len(MTEC_RPMS)):
-            logging.error("List lenghts are not equal.")
-            break
-        
-        n = len(PRINTHEAD_RPMS)
-        mtec = Client(url="opc.tcp://10.129.4.73:4840")
-        printhead = Client(url="opc.tcp://10.129.4.20:4840")
+    # Data check
+    if (len(PRINTHEAD_RPMS) != len(MTEC_RPMS)):
+        logging.error("List lenghts are not equal.")
+        return
+    
+    # Connected concurrently, every machine reconnects on its own
+    group = SessionGroup({
+        "mtec": ConnectionManager("opc.tcp://10.129.4.73:4840"),
+        "printhead": ConnectionManager("opc.tcp://10.129.4.20:4840", tags=TagRegistry(PRINTHEAD_TAGS, TAG_CACHE))})
 
-        try:
-            async with mtec, printhead:
-                
-                counter = 0
-                
-                logging.info("Get nodes")
-                node_printhead_rpm = printhead.get_node("ns=3;s=\"Velocity_Jog_left\"")
-                node_mtec_rpm =  mtec.get_node("ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.set_value_mixingpump")
-                
-                logging.info("Start")
-                
-                while True: 
-                    
-                    # Get values
-                    printhead_rpm = PRINTHEAD_RPMS[counter]
-                    mtec_rpm = int((MTEC_RPMS[counter]-169.2)*65000.0/(420.0-169.2))
+    await group.run(run_schedule)
 
-                    # Log
-                    logging.info("Settings: {}, {}, {}, {}, {}".format(counter, n, printhead_rpm, MTEC_RPMS[counter], mtec_rpm))
 
-                    # Write values
-                    value1 = ua.DataValue(ua.Variant(printhead_rpm, ua.VariantType.Double))
-                    value2 = ua.DataValue(ua.Variant(mtec_rpm, ua.VariantType.UInt16))
+async def run_schedule(group: SessionGroup):
 
-                    await node_printhead_rpm.write_value(value1)
-                    await node_mtec_rpm.write_value(value2)
+    logging.info("Get nodes")
+    nodes = {
+        "printhead": group["printhead"].get_node("velocity_jog_left"),
+        "mtec": group["mtec"].get_node("ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.set_value_mixingpump")}
 
-                    # Wait
-                    await asyncio.sleep(DELTA_TIME*60)
-                    
-                    # Increase counter
-                    counter = counter + 1
+    # Settings of every step, written concurrently at the start of the step
+    steps = []
 
-                    # Check connections
-                    await mtec.check_connection()
-                    await printhead.check_connection()
+    for printhead_rpm, rpm in zip(PRINTHEAD_RPMS, MTEC_RPMS):
+        mtec_rpm = int((rpm-169.2)*65000.0/(420.0-169.2))
+        steps.append({
+            "printhead": ua.Variant(printhead_rpm, ua.VariantType.Double),
+            "mtec": ua.Variant(mtec_rpm, ua.VariantType.UInt16)})
 
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    logging.info("Start")
+    runner = ScheduleRunner(nodes, steps, DELTA_TIME*60, STATE_FILE, wait_ready=group.wait_connected)
+    await runner.run()
 
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,406 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Streaming aggregation of recorded signals, between acquisition and storage.
+
+A long recording at full resolution is rarely read at full resolution. The
+stages below reduce a stream of (timestamp, value) samples before it is
+written to signal files (see signal_store.py):
+
+    WindowAggregator : min, max, mean, last and count per fixed time window
+    LttbDownsampler  : Largest-Triangle-Three-Buckets downsample for plotting
+    EventCapture     : the raw samples only around flagged events
+
+AggregatingWriter combines them and can be used instead of a SignalWriter.
+Timestamps are int64 nanoseconds since the Unix epoch and should be increasing.
+"""
+
+import os
+import numpy as np
+from signal_store import SignalWriter, to_nanoseconds
+
+STATISTICS = ["min", "max", "mean", "last", "count"]
+
+
+def lttb(timestamps, values, threshold: int) -> tuple:
+
+    """
+    Downsamples to `threshold` points with the Largest-Triangle-Three-Buckets
+    algorithm: the first and last point are kept and from every bucket in
+    between the point that forms the largest triangle with the selected point
+    of the previous bucket and the average of the next bucket.
+    """
+
+    timestamps = np.asarray(timestamps)
+    values = np.asarray(values)
+    n = len(values)
+
+    if threshold >= n or threshold < 3:
+        return timestamps, values
+
+    # Relative times, the products of nanoseconds since the epoch lose precision
+    x = (timestamps - timestamps[0]).astype(np.float64)
+    y = values.astype(np.float64)
+    bucket = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        average_x = x[end:next_end].mean()
+        average_y = y[end:next_end].mean()
+        area = np.abs((x[a] - average_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (average_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return timestamps[selected], values[selected]
+
+
+class WindowAggregator:
+
+    """
+    Computes statistics per fixed time window and writes them to a writer per
+    statistic (for example a SignalWriter), with the start of the window as timestamp.
+
+    The windows are aligned to multiples of the window length. A window is
+    written as soon as the first sample of a later window arrives, the open
+    window is written on flush.
+    """
+
+    def __init__(self, window: float, writers: dict):
+
+        """Initializes the aggregator. window in seconds, writers: dictionary statistic -> writer."""
+
+        for statistic in writers:
+            if statistic not in STATISTICS:
+                raise ValueError("Unknown statistic: {}".format(statistic))
+
+        self.window = int(window * 1e9)
+        self.writers = writers
+        self.windows_written = 0
+        self._timestamps = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=np.float64)
+
+    def extend(self, timestamps, values) -> None:
+
+        """Adds samples, writes the windows that are complete."""
+
+        timestamps = np.concatenate([self._timestamps, np.asarray(timestamps, dtype=np.int64)])
+        values = np.concatenate([self._values, np.asarray(values, dtype=np.float64)])
+
+        if len(timestamps) == 0:
+            return
+
+        # Samples of the last (open) window are kept
+        windows = timestamps // self.window
+        end = int(np.searchsorted(windows, windows[-1]))
+        self._write(windows[:end], values[:end])
+        self._timestamps = timestamps[end:]
+        self._values = values[end:]
+
+    def flush(self) -> None:
+
+        """Writes the open window."""
+
+        self._write(self._timestamps // self.window, self._values)
+        self._timestamps = self._timestamps[:0]
+        self._values = self._values[:0]
+
+    def _write(self, windows: np.ndarray, values: np.ndarray) -> None:
+
+        """Writes the statistics of the windows of a sorted array of samples."""
+
+        if len(values) == 0:
+            return
+
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(windows)) + 1])
+        counts = np.diff(np.concatenate([starts, [len(values)]]))
+        timestamps = windows[starts] * self.window
+        statistics = {
+            "min": lambda: np.minimum.reduceat(values, starts),
+            "max": lambda: np.maximum.reduceat(values, starts),
+            "mean": lambda: np.add.reduceat(values, starts) / counts,
+            "last": lambda: values[starts + counts - 1],
+            "count": lambda: counts.astype(np.float64)}
+
+        for statistic, writer in self.writers.items():
+            writer.extend(timestamps.tolist(), statistics[statistic]().tolist())
+
+        self.windows_written += len(starts)
+
+
+class LttbDownsampler:
+
+    """Downsamples every block of `block_size` samples to `points` samples with LTTB."""
+
+    def __init__(self, writer, block_size: int = 10000, points: int = 100):
+
+        """Initializes the downsampler."""
+
+        self.writer = writer
+        self.block_size = block_size
+        self.points = points
+        self._timestamps = []
+        self._values = []
+
+    def extend(self, timestamps, values) -> None:
+
+        """Adds samples, downsamples and writes the complete blocks."""
+
+        self._timestamps.extend(timestamps)
+        self._values.extend(values)
+
+        while len(self._timestamps) >= self.block_size:
+            self._write(self._timestamps[:self.block_size], self._values[:self.block_size], self.points)
+            del self._timestamps[:self.block_size]
+            del self._values[:self.block_size]
+
+    def flush(self) -> None:
+
+        """Downsamples and writes the incomplete block, with the same reduction as a full block."""
+
+        points = max(3, round(len(self._timestamps) * self.points / self.block_size))
+        self._write(self._timestamps, self._values, points)
+        self._timestamps = []
+        self._values = []
+
+    def _write(self, timestamps: list, values: list, points: int) -> None:
+
+        if len(timestamps) == 0:
+            return
+
+        timestamps, values = lttb(np.asarray(timestamps, dtype=np.int64), np.asarray(values, dtype=np.float64), points)
+        self.writer.extend(timestamps.tolist(), values.tolist())
+
+
+class EventCapture:
+
+    """
+    Writes the raw samples only around flagged events: from `pre` seconds before
+    to `post` seconds after every flag.
+
+    Events are flagged with flag(), or automatically for every sample above or
+    below the optional limits. The samples of the last `pre` seconds are kept in
+    memory until they are written or too old.
+    """
+
+    def __init__(self, writer, pre: float = 5.0, post: float = 5.0, above: float = None, below: float = None):
+
+        """Initializes the event capture. pre and post in seconds."""
+
+        self.writer = writer
+        self.pre = int(pre * 1e9)
+        self.post = int(post * 1e9)
+        self.above = above
+        self.below = below
+        self.events = 0
+        self._capture_until = None
+        self._timestamps = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=np.float64)
+
+    def flag(self, timestamp: int) -> None:
+
+        """Flags an event at the given time: writes the kept samples of the last pre seconds."""
+
+        self.events += 1
+        self._capture(np.asarray([timestamp], dtype=np.int64))
+
+    def extend(self, timestamps, values) -> None:
+
+        """Adds samples, writes the samples around events."""
+
+        timestamps = np.concatenate([self._timestamps, np.asarray(timestamps, dtype=np.int64)])
+        values = np.concatenate([self._values, np.asarray(values, dtype=np.float64)])
+
+        if len(timestamps) == 0:
+            return
+
+        # Samples out of the limits flag an event, a flag after the capture range of the previous flag is a new event
+        flagged = np.zeros(len(values), dtype=bool)
+
+        if self.above is not None:
+            flagged |= values > self.above
+        if self.below is not None:
+            flagged |= values < self.below
+
+        flags = timestamps[flagged]
+
+        if len(flags) > 0:
+            previous_end = np.concatenate([[self._capture_until if self._capture_until is not None else -1], flags[:-1] + self.post])
+            self.events += int(np.count_nonzero(flags > previous_end))
+
+        self._timestamps = timestamps
+        self._values = values
+        self._capture(flags)
+
+    def flush(self) -> None:
+
+        """Drops the kept samples, they are not around an event."""
+
+        self._timestamps = self._timestamps[:0]
+        self._values = self._values[:0]
+
+    def _capture(self, flags: np.ndarray) -> None:
+
+        """Writes the kept samples within the capture range of the (new) flags and keeps the rest of the last pre seconds."""
+
+        timestamps = self._timestamps
+        values = self._values
+
+        if len(timestamps) == 0:
+            if len(flags) > 0:
+                self._capture_until = max(self._capture_until or 0, int(flags[-1]) + self.post)
+            return
+
+        mask = np.zeros(len(timestamps), dtype=bool)
+
+        if self._capture_until is not None:
+            mask |= timestamps <= self._capture_until
+
+        if len(flags) > 0:
+            # Previous flag within post, or next flag within pre
+            index = np.searchsorted(flags, timestamps, side="right")
+            previous = flags[np.maximum(index - 1, 0)]
+            following = flags[np.minimum(index, len(flags) - 1)]
+            mask |= (index > 0) & (timestamps - previous <= self.post)
+            mask |= (following >= timestamps) & (following - timestamps <= self.pre)
+            self._capture_until = max(self._capture_until or 0, int(flags[-1]) + self.post)
+
+        if mask.any():
+            self.writer.extend(timestamps[mask].tolist(), values[mask].tolist())
+
+        keep = ~mask & (timestamps > timestamps[-1] - self.pre)
+        self._timestamps = timestamps[keep]
+        self._values = values[keep]
+
+
+class AggregatingWriter:
+
+    """
+    Writes a signal reduced by the aggregation stages to signal files, with the
+    interface of a SignalWriter.
+
+    Files (next to `file`, without its extension):
+        <base>_<statistic>.sig : statistics per window
+        <base>_lttb.sig        : LTTB downsample (if lttb_points > 0)
+        <base>_raw.sig         : raw samples around events (if pre + post > 0)
+    """
+
+    def __init__(self, file: str, window: float = 1.0, statistics: list = None, lttb_block: int = 10000, lttb_points: int = 0,
+                 pre: float = 0.0, post: float = 0.0, above: float = None, below: float = None, name: str = None):
+
+        """Initializes the writer. window, pre and post in seconds."""
+
+        base = os.path.splitext(file)[0]
+        self.file = file
+        self.name = name if name is not None else os.path.basename(base)
+        statistics = statistics if statistics is not None else ["min", "max", "mean", "last"]
+        self.writers = {statistic: SignalWriter("{0}_{1}.sig".format(base, statistic), "float64", name="{0}_{1}".format(self.name, statistic))
+                        for statistic in statistics}
+        self.stages = [WindowAggregator(window, dict(self.writers))]
+
+        if lttb_points > 0:
+            self.writers["lttb"] = SignalWriter(base + "_lttb.sig", "float64", name=self.name + "_lttb")
+            self.stages.append(LttbDownsampler(self.writers["lttb"], lttb_block, lttb_points))
+
+        self.capture = None
+
+        if pre + post > 0:
+            self.writers["raw"] = SignalWriter(base + "_raw.sig", "float64", name=self.name + "_raw")
+            self.capture = EventCapture(self.writers["raw"], pre, post, above, below)
+            self.stages.append(self.capture)
+
+        self.samples = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self) -> None:
+
+        """Opens the files."""
+
+        for writer in self.writers.values():
+            writer.open()
+
+    def append(self, timestamp: int, value) -> None:
+
+        """Adds a sample. The timestamp is in nanoseconds since the Unix epoch."""
+
+        self.extend([timestamp], [value])
+
+    def extend(self, timestamps, values) -> None:
+
+        """Adds multiple samples."""
+
+        for stage in self.stages:
+            stage.extend(timestamps, values)
+
+        self.samples += len(timestamps)
+
+    def write_row(self, row: tuple) -> bool:
+
+        """Adds a (datetime, value) sample, compatible with the rows of the CSV logger."""
+
+        self.append(to_nanoseconds(row[0]), row[1])
+
+        return True
+
+    def write_rows(self, rows) -> int:
+
+        """Adds multiple (datetime, value) samples."""
+
+        rows = list(rows)
+        self.extend([to_nanoseconds(date) for date, _ in rows], [value for _, value in rows])
+
+        return 0
+
+    def flag(self, timestamp: int) -> None:
+
+        """Flags an event at the given time (nanoseconds since the Unix epoch): the raw samples around it are kept."""
+
+        if self.capture is not None:
+            self.capture.flag(timestamp)
+
+    def get_stats(self) -> dict:
+
+        """Returns the counters of this writer, rows_written counts the samples of all files."""
+
+        written = sum(writer.samples_written + writer.get_stats()["queue_depth"] for writer in self.writers.values())
+
+        return {
+            "file": self.file,
+            "samples": self.samples,
+            "rows_written": written,
+            "rows_dropped": 0,
+            "reduction": self.samples / written if written > 0 else 0.0,
+            "events": self.capture.events if self.capture is not None else 0,
+            "bytes_written": sum(writer.bytes_written for writer in self.writers.values()),
+            "queue_depth": 0,
+            "last_flush_latency": 0.0}
+
+    def close(self) -> None:
+
+        """Writes the open window and the incomplete block and closes the files."""
+
+        for stage in self.stages:
+            stage.flush()
+
+        for writer in self.writers.values():
+            writer.close()
@@ -0,0 +1,268 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+_STOP = object()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+
+    """
+    Logging handler that puts the records on a bounded queue and never blocks.
+
+    The message is not formatted here: the record keeps its format string and
+    arguments and is formatted by the handlers on the logging thread. Use lazy
+    formatting (logging.info("... %s", value)) on hot paths and don't modify the
+    arguments after the call. Records that don't fit in the queue are dropped
+    and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+
+        """Initializes the handler."""
+
+        super().__init__(log_queue)
+        self.queued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        """Keeps the record as is, only the traceback is formatted (it refers to the frames of this thread)."""
+
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+
+        """Puts the record on the queue, drops it if the queue is full."""
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        self.queued += 1
+
+
+class RateLimitFilter(logging.Filter):
+
+    """
+    Passes at most `burst` records of the same message (logger, level and format
+    string) per `interval` seconds. Records at or above `max_level` (warnings and
+    errors by default) always pass. Suppressed records are counted.
+
+    A message that is formatted before logging ("...".format()) is a new message
+    every time: the windows that have expired are removed every `interval`
+    seconds, so the memory is bounded by the messages of one interval.
+    """
+
+    def __init__(self, burst: int = 10, interval: float = 1.0, max_level: int = logging.WARNING):
+
+        """Initializes the filter."""
+
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.max_level = max_level
+        self.suppressed = 0
+        self._windows = {} # (logger, level, message) -> [window start, count]
+        self._next_prune = time.monotonic() + interval
+
+    def filter(self, record: logging.LogRecord) -> bool:
+
+        """Returns False if the record is suppressed."""
+
+        if record.levelno >= self.max_level:
+            return True
+
+        now = time.monotonic()
+
+        if now >= self._next_prune:
+            self._windows = {key: window for key, window in self._windows.items() if now - window[0] < self.interval}
+            self._next_prune = now + self.interval
+
+        key = (record.name, record.levelno, record.msg)
+        window = self._windows.get(key)
+
+        if window is None or now - window[0] >= self.interval:
+            self._windows[key] = [now, 1]
+            return True
+
+        window[1] += 1
+
+        if window[1] > self.burst:
+            self.suppressed += 1
+            return False
+
+        return True
+
+
+class QueueLogging:
+
+    """
+    Logging pipeline with the I/O on a background thread.
+
+    The root logger gets a DroppingQueueHandler: a call to logging.info() on the
+    event loop only creates the record and puts it on the queue. The logging
+    thread formats the records and writes them to the handlers (the console by
+    default), so a slow terminal or disk can't stall the acquisition. With a rate
+    limit, repeated messages are suppressed. The numbers of dropped and
+    suppressed records are logged every summary_interval seconds if they changed.
+    """
+
+    def __init__(self, level: int = logging.INFO, handlers: list = None, max_queue_size: int = 10000,
+                 rate_limit: int = None, rate_interval: float = 1.0, summary_interval: float = 10.0):
+
+        """Initializes the logging pipeline. rate_limit: records of the same message per rate_interval, None for no limit."""
+
+        self.level = level
+        self.summary_interval = summary_interval
+
+        if handlers is None:
+            console = logging.StreamHandler(sys.stderr)
+            console.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+            handlers = [console]
+
+        self.handlers = handlers
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.filter = None
+
+        if rate_limit is not None:
+            self.filter = RateLimitFilter(rate_limit, rate_interval)
+            self.handler.addFilter(self.filter)
+
+        self.written = 0
+        self._thread = None
+        self._reported = (0, 0)
+
+    def start(self) -> None:
+
+        """Replaces the handlers of the root logger and starts the logging thread."""
+
+        if self._thread is not None:
+            return
+
+        root = logging.getLogger()
+
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self._thread = threading.Thread(target=self._run, name="QueueLogging", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0) -> None:
+
+        """Writes the queued records, stops the logging thread and restores the handlers on the root logger."""
+
+        if self._thread is None:
+            return
+
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+
+        for handler in self.handlers:
+            root.addHandler(handler)
+
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_stats(self) -> dict:
+
+        """Returns the counters of the logging pipeline."""
+
+        return {
+            "queued": self.handler.queued,
+            "written": self.written,
+            "dropped": self.handler.dropped,
+            "suppressed": self.filter.suppressed if self.filter is not None else 0,
+            "queue_depth": self.queue.qsize()}
+
+    def _run(self) -> None:
+
+        """Main loop of the logging thread."""
+
+        next_summary = time.monotonic() + self.summary_interval
+
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0.0, next_summary - time.monotonic()))
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                break
+
+            if record is not None:
+                self._handle(record)
+
+            if time.monotonic() >= next_summary:
+                self._summarize()
+                next_summary = time.monotonic() + self.summary_interval
+
+        # Records that were queued before the stop
+        self._summarize()
+
+    def _handle(self, record: logging.LogRecord) -> None:
+
+        """Writes a record to the handlers, formatted by the handlers."""
+
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+        self.written += 1
+
+    def _summarize(self) -> None:
+
+        """Logs the number of dropped and suppressed records since the last summary."""
+
+        stats = self.get_stats()
+        dropped, suppressed = stats["dropped"], stats["suppressed"]
+
+        if (dropped, suppressed) == self._reported:
+            return
+
+        message = "Logging: {0} records dropped (queue full), {1} suppressed by the rate limit since the last summary".format(
+            dropped - self._reported[0], suppressed - self._reported[1])
+        self._reported = (dropped, suppressed)
+        self._handle(logging.LogRecord(__name__, logging.WARNING, __file__, 0, message, None, None))
+
+
+def setup_logging(level: int = logging.INFO, **kwargs) -> QueueLogging:
+
+    """
+    Sets up queue based logging for the root logger, instead of logging.basicConfig().
+    The records are written on a background thread: a log call in the event loop
+    doesn't wait for the console or a file. The keyword arguments are passed to
+    QueueLogging. Returns the started pipeline.
+    """
+
+    pipeline = QueueLogging(level, **kwargs)
+    pipeline.start()
+
+    return pipeline
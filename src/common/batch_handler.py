@@ -0,0 +1,103 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from asyncua import Node, ua
+from histogram import LatencyHistogram
+
+
+class BatchHandler:
+
+    """
+    Subscription Handler that collects all data changes of one publish response
+    and passes them as one batch to a callback.
+
+    asyncua dispatches the monitored items of a publish response one by one. The
+    first notification of a response schedules the flush with call_soon, so the
+    callback runs once after all notifications of that response are delivered.
+    The callback receives a list of (node, ua.DataValue) tuples. The execution
+    time of the callback is kept in a latency histogram.
+    """
+
+    def __init__(self, callback):
+
+        """Initializes the event handler."""
+
+        self.callback = callback
+        self.batches = 0
+        self.notifications = 0
+        self.callback_time = LatencyHistogram() # [s]
+        self._batch = []
+
+    def datachange_notification(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server.
+        """
+
+        if len(self._batch) == 0:
+            asyncio.get_running_loop().call_soon(self._flush)
+
+        self._batch.append((node, data.monitored_item.Value))
+
+    def event_notification(self, event: ua.EventNotificationList):
+
+        """
+        Called for every event notification from server.
+        """
+
+        pass
+
+    def status_change_notification(self, status: ua.StatusChangeNotification):
+
+        """
+        Called for every status change notification from server.
+        """
+
+        pass
+
+    def _flush(self) -> None:
+
+        """Passes the collected notifications to the callback."""
+
+        batch = self._batch
+        self._batch = []
+        self.batches += 1
+        self.notifications += len(batch)
+
+        start = time.perf_counter()
+
+        try:
+            self.callback(batch)
+        except Exception:
+            logging.exception("Exception in batch callback")
+
+        self.callback_time.add(time.perf_counter() - start)
+
+
+def get_source_time(data_value: ua.DataValue) -> datetime:
+
+    """
+    Returns the source timestamp of a data value as an aware datetime in UTC.
+    Falls back to the server timestamp and the client time if the server doesn't send it.
+    """
+
+    time = data_value.SourceTimestamp or data_value.ServerTimestamp
+
+    if time is None:
+        return datetime.now(timezone.utc)
+    if time.tzinfo is None:
+        return time.replace(tzinfo=timezone.utc)
+
+    return time
@@ -0,0 +1,686 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+import os
+import random
+import time
+from asyncua import Client, Node, ua
+from asyncua.crypto import security_policies
+from asyncua.crypto.uacrypto import CertProperties
+from histogram import LatencyHistogram
+from monitoring import FILTER_ERRORS, MonitoringConfig, NotificationCounter, get_savings, measure_unfiltered
+from tag_registry import TagRegistry
+
+# Exceptions that mean the connection is gone or could not be made
+CONNECTION_ERRORS = (ua.UaError, ConnectionError, OSError, asyncio.TimeoutError)
+
+# Connection states, passed to the listeners
+STATE_DISCONNECTED = "disconnected" # Not connected yet or disconnected on purpose
+STATE_CONNECTED = "connected" # Session open and subscriptions restored
+STATE_LOST = "lost" # Connection lost, reconnecting
+
+_managers = {}
+
+
+class SubscriptionSpec:
+
+    """
+    Subscription that is (re)created by the connection manager on every connect.
+    """
+
+    def __init__(self, period: float, handler, node_ids: list, queuesize: int = 0, sampling_interval: float = 50.0, settings: dict = None,
+                 monitoring: MonitoringConfig = None):
+
+        """
+        Initializes the subscription specification. The sampling interval in
+        milliseconds, -1 is the publishing interval and 0 the fastest rate of the server.
+
+        monitoring: optional default monitoring settings of the items (see monitoring.py),
+        instead of the sampling interval and queue size. settings: optional dictionary
+        node id -> MonitoringConfig or (sampling_interval, queuesize) for items with
+        other settings than the subscription defaults.
+        """
+
+        self.period = period
+        self.handler = handler
+        self.node_ids = node_ids
+        self.monitoring = monitoring if monitoring is not None else MonitoringConfig(sampling_interval, queuesize)
+        self.queuesize = self.monitoring.queuesize
+        self.sampling_interval = self.monitoring.sampling_interval
+        self.settings = {node_id: item if isinstance(item, MonitoringConfig) else MonitoringConfig(*item)
+                         for node_id, item in (settings or {}).items()}
+        self.counter = None # Counts the notifications per item if an item has a filter
+        self.rejected = set() # Node ids of the items with a filter the server doesn't support
+        self.unfiltered = {} # Node id -> measured notifications per second of a filtered item without its filter
+        self.subscription = None # Subscription of the current session
+        self.handles = []
+
+        if any(config.has_filter() for config in [self.monitoring, *self.settings.values()]):
+            self.counter = NotificationCounter(handler)
+
+    def get_monitoring(self, node_id) -> MonitoringConfig:
+
+        """Returns the monitoring settings of an item."""
+
+        return self.settings.get(node_id, self.monitoring)
+
+    def get_item_settings(self, node_id) -> tuple:
+
+        """Returns the (sampling_interval, queuesize) of an item."""
+
+        config = self.get_monitoring(node_id)
+
+        return config.sampling_interval, config.queuesize
+
+    def get_sample_interval(self, node_id = None) -> float:
+
+        """
+        Returns the interval at which the server samples the (given) items [ms].
+        A sampling interval of -1 is the publishing interval, 0 is the fastest
+        rate of the server, that is unknown here and taken as the publishing interval.
+        """
+
+        sampling_interval = self.get_item_settings(node_id)[0] if node_id is not None else self.sampling_interval
+
+        if sampling_interval > 0:
+            return sampling_interval
+
+        return self.period
+
+
+class ConnectionManager:
+
+    """
+    Keeps a session with one OPC UA server alive.
+
+    The client object is created once and reconnected on connection loss with an
+    exponential backoff with jitter. Nodes are cached and stay valid across
+    reconnects. Subscriptions added with add_subscription are restored in bulk
+    after every (re)connect. With a tag registry, get_node also accepts the
+    logical names of the registry; they are resolved on every connect, before
+    the subscriptions are restored. A connection attempt (including the secure
+    channel handshake) that takes longer than connect_timeout is aborted.
+
+    Connection loss is detected by events instead of polling: the socket closing,
+    a bad status change of a subscription (server shutdown, session timeout) and
+    a keepalive subscription on the current time of the server that stops
+    publishing for keepalive_timeout seconds. Every state change is passed to the
+    listeners (add_listener) at the moment it is detected.
+    """
+
+    def __init__(self, url: str, user: str = None, password: str = None, timeout: float = 4,
+                 min_delay: float = 0.5, max_delay: float = 30.0, tags: TagRegistry = None, connect_timeout: float = 10.0,
+                 keepalive_interval: float = 500, keepalive_timeout: float = 3.0):
+
+        """
+        Initializes the connection manager. The keepalive interval (publishing interval
+        of the keepalive subscription) in milliseconds, 0 disables the keepalive.
+        """
+
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_timeout = keepalive_timeout
+        self.client = Client(url=url, timeout=timeout)
+        self.connected = asyncio.Event()
+        self.subscriptions = []
+        self.tags = tags
+        self.state = STATE_DISCONNECTED
+
+        if user is not None:
+            self.client.set_user(user)
+        if password is not None:
+            self.client.set_password(password)
+
+        self._nodes = {}
+        self._lost_time = None
+        self._security = None # Key material, read once
+        self._security_applied = False
+        self._listeners = []
+        self._lost_event = asyncio.Event()
+        self._last_keepalive = 0.0
+        self._closing = False
+        self._measure_task = None # Measurement of the notification rates without filter, once
+
+        # Statistics
+        self.connects = 0
+        self.reconnects = 0
+        self.failed_attempts = 0
+        self.last_reconnect_time = 0.0 # Time between connection loss and restored subscriptions [s]
+        self.max_reconnect_time = 0.0
+        self.total_downtime = 0.0
+        self.missed_notifications = 0 # Estimate, samples of all items during the downtime
+        self.last_error = None
+        self.last_lost_reason = None
+        self.handshake = LatencyHistogram() # Time of a successful connect: socket, secure channel and session [s]
+        self.last_handshake_time = 0.0
+        self.security_setup_time = 0.0 # Time to parse the key material and get the server certificate [s]
+
+    async def set_security(self, policy, certificate: str, private_key: str, application_uri: str = None,
+                           server_certificate: str = None, mode = ua.MessageSecurityMode.SignAndEncrypt) -> None:
+
+        """
+        Sets the security policy that is used for every connection attempt.
+
+        The certificate and key files are read once and kept in memory. The policy is
+        applied on the first connection attempt: without a server certificate, the
+        certificate of the server is taken from its endpoints. The parsed keys and
+        the server certificate are kept by the client for all reconnects.
+        """
+
+        if application_uri is not None:
+            self.client.application_uri = application_uri
+
+        self._security = {
+            "policy": policy,
+            "certificate": read_key_file(certificate),
+            "private_key": read_key_file(private_key),
+            "server_certificate": read_key_file(server_certificate) if server_certificate is not None else None,
+            "mode": mode}
+        self._security_applied = False
+
+    def add_subscription(self, period: float, handler, node_ids: list, queuesize: int = 0, sampling_interval: float = 50.0,
+                         settings: dict = None, monitoring: MonitoringConfig = None) -> SubscriptionSpec:
+
+        """
+        Adds a data change subscription for a list of node ids.
+        The subscription is created when connected and restored after every reconnect.
+        With monitoring all items get these monitoring settings (deadband, trigger, queue).
+        With settings (node id -> MonitoringConfig or (sampling_interval, queuesize)) every item gets its own settings.
+        """
+
+        spec = SubscriptionSpec(period, handler, node_ids, queuesize, sampling_interval, settings, monitoring)
+        self.subscriptions.append(spec)
+
+        return spec
+
+    def add_listener(self, callback) -> None:
+
+        """
+        Adds a listener for the connection state. The callback is called with the new
+        state and the reason on every state change, directly when it is detected.
+        """
+
+        self._listeners.append(callback)
+
+    def get_node(self, node_id) -> Node:
+
+        """
+        Returns the (cached) node with the given node id or tag name. The node id of
+        a tag is updated when the tags are resolved, the node object stays the same.
+        """
+
+        node = self._nodes.get(node_id)
+
+        if node is None:
+            if self.tags is not None and node_id in self.tags:
+                node = self.client.get_node(self.tags.get_node_id(node_id, self.url))
+            else:
+                node = self.client.get_node(node_id)
+            self._nodes[node_id] = node
+
+        return node
+
+    async def wait_connected(self) -> None:
+
+        """Waits until the session is connected."""
+
+        await self.connected.wait()
+
+    async def run(self, session = None):
+
+        """
+        Connects and keeps the connection alive.
+
+        The optional session is an async function that is called with the client
+        after every (re)connect and runs while connected. If it returns, run()
+        disconnects and returns its result. Without a session, run() runs forever.
+        """
+
+        attempt = 0
+
+        try:
+            while True:
+
+                try:
+                    await self._connect()
+                    attempt = 0
+
+                    # Run the session and the connection watch until one of them stops
+                    tasks = [asyncio.ensure_future(self._watch())]
+
+                    if session is not None:
+                        tasks.append(asyncio.ensure_future(session(self.client)))
+
+                    try:
+                        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+
+                    for task in done:
+                        if task.exception() is not None:
+                            raise task.exception()
+
+                    result = tasks[-1].result()
+                    await self.disconnect()
+                    return result
+
+                except CONNECTION_ERRORS as e:
+                    self.last_error = e
+                    self.failed_attempts += 1
+
+                    if isinstance(e, ua.UaError):
+                        logging.warning("An OPC UA error occurred on {0}: {1}".format(self.url, e))
+
+                    # The server certificate from the endpoints may have changed, get it again on the next attempt
+                    if isinstance(e, ua.UaStatusCodeError) and self._security is not None and self._security["server_certificate"] is None:
+                        self._security_applied = False
+
+                    self._on_lost(str(e) or type(e).__name__)
+                    await self._close()
+                    delay = self.get_delay(attempt)
+                    attempt += 1
+                    logging.warning("Lost connection to {0}. Reconnecting in {1:.1f} seconds...".format(self.url, delay))
+                    await asyncio.sleep(delay)
+
+        finally:
+            # Cancelled or stopped by an exception of the session
+            if self.state == STATE_CONNECTED:
+                self._set_state(STATE_DISCONNECTED, "stopped")
+
+    def get_delay(self, attempt: int) -> float:
+
+        """Returns the delay before the next attempt: exponential backoff with jitter."""
+
+        delay = min(self.max_delay, self.min_delay * 2 ** attempt)
+
+        return random.uniform(delay / 2, delay)
+
+    def get_stats(self) -> dict:
+
+        """Returns the connection statistics."""
+
+        return {
+            "url": self.url,
+            "state": self.state,
+            "connected": self.connected.is_set(),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "failed_attempts": self.failed_attempts,
+            "last_reconnect_time": self.last_reconnect_time,
+            "max_reconnect_time": self.max_reconnect_time,
+            "total_downtime": self.total_downtime,
+            "missed_notifications": self.missed_notifications,
+            "last_handshake_time": self.last_handshake_time,
+            "handshake": self.handshake.get_stats(),
+            "security_setup_time": self.security_setup_time,
+            "last_error": str(self.last_error) if self.last_error is not None else None,
+            "last_lost_reason": self.last_lost_reason,
+            "keepalive_age": time.monotonic() - self._last_keepalive if self.state == STATE_CONNECTED else None}
+
+    def get_monitoring_stats(self) -> dict:
+
+        """
+        Returns per item with a filter (node id -> dictionary) the filter, the
+        notifications per second in the current session, the measured notifications
+        per second without filter and the difference: the notifications saved by
+        the filter. The last two are None until the rate without filter is measured.
+        """
+
+        stats = {}
+
+        for spec in self.subscriptions:
+            if spec.counter is None:
+                continue
+
+            for node_id in spec.node_ids:
+                config = spec.get_monitoring(node_id)
+                if not config.has_filter():
+                    continue
+                rate, unfiltered, saved = get_savings(spec.counter, self.get_node(node_id).nodeid, spec.unfiltered.get(node_id))
+                stats[node_id] = {
+                    "filter": config.describe() if node_id not in spec.rejected else "filter not supported",
+                    "rate": rate,
+                    "unfiltered_rate": unfiltered if node_id not in spec.rejected else rate,
+                    "saved_rate": saved if node_id not in spec.rejected else 0.0}
+
+        return stats
+
+    async def _connect(self) -> None:
+
+        """Connects, restores the subscriptions and updates the statistics."""
+
+        await asyncio.wait_for(self._open_session(), self.connect_timeout)
+        self._lost_event.clear()
+        self._last_keepalive = time.monotonic()
+        self._hook_socket()
+        await self._resolve_tags()
+        await self._restore_subscriptions()
+        self.connects += 1
+
+        if self._measure_task is None or self._measure_task.done():
+            self._measure_task = asyncio.ensure_future(self._measure_unfiltered())
+
+        lost_time = self._lost_time
+        self._set_state(STATE_CONNECTED)
+
+        if lost_time is not None:
+            downtime = time.monotonic() - lost_time
+            missed = sum(int(downtime * 1000 / spec.get_sample_interval(node_id)) for spec in self.subscriptions for node_id in spec.node_ids)
+            self.reconnects += 1
+            self.last_reconnect_time = downtime
+            self.max_reconnect_time = max(self.max_reconnect_time, downtime)
+            self.total_downtime += downtime
+            self.missed_notifications += missed
+            self._lost_time = None
+            logging.info("Reconnected to {0} in {1:.2f} seconds (handshake {2:.0f} ms), up to {3} notifications missed.".format(
+                self.url, downtime, self.last_handshake_time * 1000, missed))
+        else:
+            logging.info("Connected to {0} (handshake {1:.0f} ms).".format(self.url, self.last_handshake_time * 1000))
+
+    async def _open_session(self) -> None:
+
+        """Applies the security policy if not done yet, and connects. Measures the handshake time."""
+
+        if self._security is not None and not self._security_applied:
+            start = time.perf_counter()
+            await self.client.set_security(self._security["policy"], certificate=self._security["certificate"],
+                                           private_key=self._security["private_key"],
+                                           server_certificate=self._security["server_certificate"],
+                                           mode=self._security["mode"])
+            self._security_applied = True
+            self.security_setup_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await self.client.connect()
+        self.last_handshake_time = time.perf_counter() - start
+        self.handshake.add(self.last_handshake_time)
+
+    async def _resolve_tags(self) -> None:
+
+        """Resolves the tags and updates the node ids of the cached nodes."""
+
+        if self.tags is None:
+            return
+
+        node_ids = await self.tags.resolve(self.client, self.url)
+
+        for name, node_id in node_ids.items():
+            node = self._nodes.get(name)
+            if node is not None:
+                node.nodeid = node_id
+
+    async def _restore_subscriptions(self) -> None:
+
+        """Creates all subscriptions concurrently, with all items of a subscription in one request."""
+
+        await asyncio.gather(self._subscribe_keepalive(), *[self._subscribe(spec) for spec in self.subscriptions])
+
+    async def _subscribe_keepalive(self) -> None:
+
+        """Creates the keepalive subscription on the current time of the server."""
+
+        if self.keepalive_interval <= 0:
+            return
+
+        subscription = await self.client.create_subscription(self.keepalive_interval, KeepaliveHandler(self))
+        await subscription.subscribe_data_change(self.client.get_node(ua.ObjectIds.Server_ServerStatus_CurrentTime))
+
+    def _hook_socket(self) -> None:
+
+        """Reports the connection as lost as soon as the socket of the current session closes."""
+
+        protocol = self.client.uaclient.protocol
+        connection_lost = protocol.connection_lost
+
+        def on_connection_lost(exc):
+            connection_lost(exc)
+            self._on_lost("socket closed: {}".format(exc) if exc is not None else "socket closed by the server")
+
+        protocol.connection_lost = on_connection_lost
+
+    async def _subscribe(self, spec: SubscriptionSpec) -> None:
+
+        """Creates a single subscription and its monitored items."""
+
+        nodes = [self.get_node(node_id) for node_id in spec.node_ids]
+        handler = spec.handler
+
+        if spec.counter is not None:
+            spec.counter.reset()
+            handler = spec.counter
+
+        spec.subscription = await self.client.create_subscription(spec.period, handler)
+
+        if len(spec.settings) == 0 and spec.monitoring.is_default():
+            spec.handles = await spec.subscription.subscribe_data_change(nodes, queuesize=spec.queuesize, sampling_interval=spec.sampling_interval)
+            return
+
+        # Monitored items with their own monitoring settings, all in one request (client handles are unique within the subscription)
+        requests = [spec.get_monitoring(node_id).create_request(node.nodeid, i + 1) for i, (node_id, node) in enumerate(zip(spec.node_ids, nodes))]
+        spec.handles = await spec.subscription.create_monitored_items(requests)
+
+        # Items with a filter the server doesn't support for the node: again without filter
+        rejected = [i for i, handle in enumerate(spec.handles)
+                    if isinstance(handle, ua.StatusCode) and handle.value in FILTER_ERRORS and requests[i].RequestedParameters.Filter is not None]
+
+        spec.rejected = {spec.node_ids[i] for i in rejected}
+
+        if len(rejected) > 0:
+            for i in rejected:
+                logging.warning("Filter of {0} not supported ({1}), monitored without filter.".format(spec.node_ids[i], spec.handles[i].name))
+                requests[i].RequestedParameters.Filter = None
+            for i, handle in zip(rejected, await spec.subscription.create_monitored_items([requests[i] for i in rejected])):
+                spec.handles[i] = handle
+
+        for node_id, handle in zip(spec.node_ids, spec.handles):
+            if isinstance(handle, ua.StatusCode):
+                logging.warning("Failed to monitor {0}: {1}".format(node_id, handle))
+
+    async def _measure_unfiltered(self) -> None:
+
+        """Measures the notification rate without filter of the filtered items that are not measured yet, once per item."""
+
+        for spec in self.subscriptions:
+            if spec.counter is None:
+                continue
+
+            items = [(node_id, self.get_node(node_id).nodeid, spec.get_monitoring(node_id)) for node_id in spec.node_ids
+                     if spec.get_monitoring(node_id).has_filter() and node_id not in spec.rejected and node_id not in spec.unfiltered]
+
+            if len(items) == 0:
+                continue
+
+            try:
+                spec.unfiltered.update(await measure_unfiltered(self.client, spec.period, items))
+            except CONNECTION_ERRORS as e:
+                logging.debug("Measurement of the notification rates without filter failed, again after the next connect: {}".format(e))
+                return
+
+    async def _watch(self) -> None:
+
+        """
+        Waits for a connection loss event or a keepalive timeout.
+        Throws an exception if the connection is lost.
+        """
+
+        while not self._lost_event.is_set():
+            timeout = None
+
+            if self.keepalive_interval > 0:
+                timeout = max(0.0, self._last_keepalive + self.keepalive_timeout - time.monotonic())
+
+            try:
+                await asyncio.wait_for(self._lost_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                age = time.monotonic() - self._last_keepalive
+                if age >= self.keepalive_timeout:
+                    self._on_lost("no keepalive for {:.1f} seconds".format(age))
+
+        raise ConnectionError(self.last_lost_reason)
+
+    def _on_keepalive(self) -> None:
+
+        """Called for every notification of the keepalive subscription."""
+
+        self._last_keepalive = time.monotonic()
+
+    def _on_lost(self, reason: str) -> None:
+
+        """Marks an open connection as lost and wakes up the watch. Ignored while disconnecting."""
+
+        if self.state != STATE_CONNECTED or self._closing:
+            return
+
+        self.last_lost_reason = reason
+        logging.warning("Connection to {0} lost: {1}".format(self.url, reason))
+        self._set_state(STATE_LOST, reason)
+        self._lost_event.set()
+
+    def _set_state(self, state: str, reason: str = "") -> None:
+
+        """Sets the connection state and calls the listeners on a change."""
+
+        if state == self.state:
+            return
+
+        if self.state == STATE_CONNECTED:
+            self._lost_time = time.monotonic()
+
+        self.state = state
+
+        if state == STATE_CONNECTED:
+            self.connected.set()
+        else:
+            self.connected.clear()
+
+        for callback in self._listeners:
+            try:
+                callback(state, reason)
+            except Exception:
+                logging.exception("Exception in connection state listener")
+
+    async def _close(self) -> None:
+
+        """Closes the session and ignores errors of an already closed connection."""
+
+        self._closing = True
+
+        if self._measure_task is not None:
+            self._measure_task.cancel()
+
+        for spec in self.subscriptions:
+            spec.subscription = None
+            spec.handles = []
+
+        try:
+            await self.client.disconnect()
+        except Exception:
+            pass
+        finally:
+            self._closing = False
+
+    async def disconnect(self) -> None:
+
+        """Disconnects and ignores errors of an already closed connection."""
+
+        self._set_state(STATE_DISCONNECTED, "disconnected")
+        await self._close()
+
+
+class KeepaliveHandler:
+
+    """
+    Subscription Handler of the keepalive subscription. Every notification proves
+    that the server still publishes, a bad status change means the session is gone.
+    """
+
+    def __init__(self, manager: ConnectionManager):
+
+        """Initializes the event handler."""
+
+        self.manager = manager
+
+    def datachange_notification(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server.
+        """
+
+        self.manager._on_keepalive()
+
+    def event_notification(self, event: ua.EventNotificationList):
+
+        """
+        Called for every event notification from server.
+        """
+
+        pass
+
+    def status_change_notification(self, status: ua.StatusChangeNotification):
+
+        """
+        Called for every status change notification from server.
+        """
+
+        if not status.Status.is_good():
+            self.manager._on_lost("status change: {}".format(status.Status))
+
+
+def read_key_file(file: str) -> CertProperties:
+
+    """Returns the contents of a certificate or key file, with its format (pem or der) for the parser."""
+
+    with open(file, "rb") as handle:
+        content = handle.read()
+
+    return CertProperties(content, os.path.splitext(file)[1].lstrip(".").lower())
+
+
+def get_connection_manager(url: str, **kwargs) -> ConnectionManager:
+
+    """Returns the connection manager of an endpoint, one per endpoint in this process."""
+
+    manager = _managers.get(url)
+
+    if manager is None:
+        manager = ConnectionManager(url, **kwargs)
+        _managers[url] = manager
+
+    return manager
+
+
+async def create_connection(config: dict, directory: str = "", connect_timeout: float = 10.0) -> ConnectionManager:
+
+    """
+    Returns the connection manager of an endpoint config (url, user, password,
+    connect_timeout and security), as used by the config files of the recorder
+    and the gateway. Relative paths of key files are relative to the given directory.
+    """
+
+    connection = ConnectionManager(config["url"], user=config.get("user"), password=config.get("password"),
+                                   connect_timeout=config.get("connect_timeout", connect_timeout))
+    security = config.get("security")
+
+    if security is not None:
+        policy = getattr(security_policies, "SecurityPolicy" + security["policy"])
+        server_certificate = security.get("server_certificate")
+        await connection.set_security(policy, certificate=os.path.join(directory, security["certificate"]),
+                                      private_key=os.path.join(directory, security["private_key"]),
+                                      application_uri=security.get("application_uri"),
+                                      server_certificate=os.path.join(directory, server_certificate) if server_certificate is not None else None)
+
+    return connection
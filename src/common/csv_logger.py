@@ -0,0 +1,361 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import csv
+import io
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+_STOP = object()
+
+
+class CsvLogger:
+
+    """
+    CSV logging sink that writes from a background thread.
+
+    Rows are put on a bounded queue by the producer (typically the asyncio loop)
+    and written in batches by a writer thread. A batch is flushed when it holds
+    `batch_size` rows or when `flush_interval` seconds have passed. The file is
+    rotated when it grows beyond `max_bytes` and/or when the date changes.
+
+    If a write fails the batch is retried every `flush_interval` and no rows are
+    taken from the queue in the meantime: the memory stays bounded by the queue,
+    rows are dropped (and counted) when it is full. Rows that can't be formatted
+    are skipped and counted as invalid.
+    """
+
+    def __init__(self, file: str, header: list, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_queue_size: int = 100000, max_bytes: int = None, rotate_daily: bool = False,
+                 formatter = None):
+
+        """Initializes the CSV logger."""
+
+        self.file = file
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.formatter = formatter # Optional function row -> row, called in the writer thread
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._handle = None
+        self._writer = None
+        self._date = None
+        self._part = 0
+        self._offset = None # (file, size) before a write that failed, the partial write is removed before the retry
+
+        # Counters
+        self.rows_queued = 0
+        self.rows_dropped = 0
+        self.rows_invalid = 0
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        self.max_queue_depth = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.current_file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def start(self) -> None:
+
+        """Starts the writer thread."""
+
+        if self._thread is not None:
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="CsvLogger", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+
+        """Flushes all queued rows and stops the writer thread."""
+
+        if self._thread is None:
+            return
+
+        self._stopping.set()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def write_row(self, row) -> bool:
+
+        """
+        Queues a single row. Never blocks.
+        Returns False if the queue is full and the row is dropped.
+        """
+
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.rows_dropped += 1
+            return False
+
+        self.rows_queued += 1
+        depth = self._queue.qsize()
+
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+        return True
+
+    def write_rows(self, rows) -> int:
+
+        """Queues multiple rows. Returns the number of rows that were dropped."""
+
+        dropped = 0
+
+        for row in rows:
+            if not self.write_row(row):
+                dropped += 1
+
+        return dropped
+
+    def get_stats(self) -> dict:
+
+        """Returns a snapshot of the counters of this logger."""
+
+        with self._lock:
+            return {
+                "file": self.current_file,
+                "rows_queued": self.rows_queued,
+                "rows_written": self.rows_written,
+                "rows_dropped": self.rows_dropped,
+                "rows_invalid": self.rows_invalid,
+                "batches_written": self.batches_written,
+                "write_errors": self.write_errors,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "last_flush_latency": self.last_flush_latency,
+                "max_flush_latency": self.max_flush_latency}
+
+    def _run(self) -> None:
+
+        """Main loop of the writer thread."""
+
+        batch = []
+        pending = None # Formatted batch that failed to write: (text, number of rows)
+        next_flush = time.monotonic() + self.flush_interval
+        stop = False
+
+        while not stop:
+
+            # Retry a failed batch without taking rows from the queue: the bounded queue takes the back-pressure
+            if pending is not None:
+                stop = self._stopping.wait(self.flush_interval)
+                if self._flush(*pending):
+                    pending = None
+                next_flush = time.monotonic() + self.flush_interval
+                continue
+
+            # Wait for the next row or the flush deadline
+            timeout = max(0.0, next_flush - time.monotonic())
+
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            # Drain the queue up to the batch size without waiting
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+
+            # Flush on size, time or stop
+            if len(batch) >= self.batch_size or time.monotonic() >= next_flush or stop:
+                if len(batch) > 0:
+                    pending = self._format(batch)
+                    batch = []
+                    if self._flush(*pending):
+                        pending = None
+                next_flush = time.monotonic() + self.flush_interval
+
+        # Last attempt for a batch that failed to write before and the rows that are still queued
+        if pending is not None and not self._flush(*pending):
+            with self._lock:
+                self.rows_dropped += pending[1]
+
+        batch = self._drain()
+
+        if len(batch) > 0:
+            pending = self._format(batch)
+            if not self._flush(*pending):
+                with self._lock:
+                    self.rows_dropped += pending[1]
+
+        self._close()
+
+    def _drain(self) -> list:
+
+        """Returns the rows that are still in the queue."""
+
+        rows = []
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return rows
+            if item is not _STOP:
+                rows.append(item)
+
+    def _format(self, batch: list) -> tuple:
+
+        """Formats a batch of rows as CSV text. Returns the text and the number of rows, invalid rows are skipped."""
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        rows = 0
+        invalid = 0
+        error = None
+
+        for row in batch:
+            try:
+                writer.writerow(self.formatter(row) if self.formatter is not None else row)
+                rows += 1
+            except Exception as e:
+                invalid += 1
+                error = e
+
+        if invalid > 0:
+            with self._lock:
+                self.rows_invalid += invalid
+            logging.warning("Skipped {0} invalid rows for {1}: {2}".format(invalid, self.file, error))
+
+        return buffer.getvalue(), rows
+
+    def _flush(self, text: str, rows: int) -> bool:
+
+        """Writes a formatted batch to disk. Returns False if the write failed."""
+
+        start = time.perf_counter()
+
+        try:
+            # Remove the part of the batch that was written before a failure
+            if self._offset is not None:
+                file, offset = self._offset
+                if os.path.exists(file) and os.path.getsize(file) > offset:
+                    os.truncate(file, offset)
+                self._offset = None
+
+            self._rotate()
+            self._offset = (self.current_file, self._handle.tell())
+            self._handle.write(text)
+            self._handle.flush()
+            self._offset = None
+
+        except Exception as e:
+            # Keep the batch and retry at the next flush, e.g. when the disk is back
+            with self._lock:
+                self.write_errors += 1
+            logging.warning("Failed to write {0} rows to {1}: {2}".format(rows, self.current_file, e))
+            self._close()
+            return False
+
+        latency = time.perf_counter() - start
+
+        with self._lock:
+            self.rows_written += rows
+            self.batches_written += 1
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+
+        return True
+
+    def _rotate(self) -> None:
+
+        """Opens the (next) file if there is no open file or if a rotation condition is met."""
+
+        today = datetime.now().date()
+
+        if self._handle is not None:
+            if self.rotate_daily and today != self._date:
+                self._close()
+                self._part = 0
+            elif self.max_bytes is not None and self._handle.tell() >= self.max_bytes:
+                self._close()
+                self._part += 1
+
+        if self._handle is None:
+            self._date = today
+            file = self._get_file_name()
+
+            # Skip files that are already full from an earlier run
+            while self.max_bytes is not None and os.path.exists(file) and os.path.getsize(file) >= self.max_bytes:
+                self._part += 1
+                file = self._get_file_name()
+
+            self._open(file)
+
+    def _get_file_name(self) -> str:
+
+        """Returns the file name of the current date and part."""
+
+        base, extension = os.path.splitext(self.file)
+
+        if self.rotate_daily:
+            base = "{0}_{1}".format(base, self._date.strftime("%Y%m%d"))
+        if self._part > 0:
+            base = "{0}_{1:03d}".format(base, self._part)
+
+        return base + extension
+
+    def _open(self, file: str) -> None:
+
+        """Opens a file and writes the header if the file doesn't exist yet."""
+
+        exists = os.path.exists(file)
+        self._handle = open(file, 'a', newline='')
+        self._writer = csv.writer(self._handle, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
+
+        if not exists:
+            self._writer.writerow(self.header)
+
+        with self._lock:
+            self.current_file = file
+
+    def _close(self) -> None:
+
+        """Closes the current file."""
+
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except OSError:
+                pass
+
+        self._handle = None
+        self._writer = None
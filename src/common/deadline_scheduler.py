@@ -0,0 +1,98 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+from histogram import LatencyHistogram
+
+
+class DeadlineScheduler:
+
+    """
+    Named, cancellable timers for controller actions.
+
+    schedule() returns immediately: the action runs in its own task at the
+    deadline, so subscription handlers don't have to sleep. Scheduling a name
+    that is still pending re-arms the timer. Deadlines are on the monotonic
+    clock of the event loop and for every timer the lateness (time between the
+    deadline and the start of the action) is logged and kept in a histogram.
+    """
+
+    def __init__(self):
+
+        """Initializes the scheduler."""
+
+        self.lateness = LatencyHistogram()
+        self.fired = 0
+        self.cancelled = 0
+        self._timers = {}
+
+    def schedule(self, name: str, delay: float, action, *args) -> float:
+
+        """
+        Runs the async function action(*args) after delay seconds. A pending timer with
+        the same name is cancelled. Returns the deadline (loop time).
+        """
+
+        self.cancel(name)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + delay
+        self._timers[name] = loop.create_task(self._run(name, deadline, action, args))
+
+        return deadline
+
+    def cancel(self, name: str) -> bool:
+
+        """Cancels a pending timer. Returns True if there was a pending timer."""
+
+        task = self._timers.pop(name, None)
+
+        if task is None:
+            return False
+
+        task.cancel()
+        self.cancelled += 1
+        logging.debug("Timer '{}' cancelled.".format(name))
+
+        return True
+
+    def cancel_all(self) -> None:
+
+        """Cancels all pending timers."""
+
+        for name in list(self._timers.keys()):
+            self.cancel(name)
+
+    def is_pending(self, name: str) -> bool:
+
+        """Returns True if the timer is pending."""
+
+        return name in self._timers
+
+    async def _run(self, name: str, deadline: float, action, args: tuple) -> None:
+
+        """Waits until the deadline and runs the action."""
+
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, deadline - loop.time()))
+
+        # From here on the action can't be cancelled by a new schedule() of the same name
+        self._timers.pop(name, None)
+        late = loop.time() - deadline
+        self.lateness.add(late)
+        self.fired += 1
+        logging.info("Timer '{0}' fired {1:.1f} ms after its deadline.".format(name, late * 1000))
+
+        try:
+            await action(*args)
+        except Exception as e:
+            logging.error("Action of timer '{0}' failed: {1}".format(name, e))
@@ -0,0 +1,88 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+import time
+from asyncua import Node
+from histogram import LatencyHistogram
+
+
+class FanOutWriter:
+
+    """
+    Writes one value to multiple nodes (on multiple servers) concurrently.
+
+    Errors are reported per target: a failing machine doesn't stop the writes to
+    the other machines. For every target the time from the start of the write
+    (e.g. the arrival of the notification that triggered it) to the write
+    response is kept in a latency histogram, together with the spread: the time
+    between the first and the last response of the same write.
+    """
+
+    def __init__(self, targets: dict):
+
+        """Initializes the writer with a dictionary name -> Node."""
+
+        self.targets = targets
+        self.latency = {name: LatencyHistogram() for name in targets}
+        self.spread = LatencyHistogram()
+        self.errors = {name: 0 for name in targets}
+        self.writes = 0
+
+    async def write(self, value, start: float = None) -> dict:
+
+        """
+        Writes the value to all targets. The optional start is a time.monotonic() value
+        from which the latency is measured. Returns a dictionary name -> exception or None.
+        """
+
+        start = start if start is not None else time.monotonic()
+        names = list(self.targets.keys())
+        results = await asyncio.gather(*[self._write(name, self.targets[name], value, start) for name in names])
+        self.writes += 1
+
+        # Time between the first and last machine that switched
+        times = [t for t, _ in results if t is not None]
+
+        if len(times) > 1:
+            self.spread.add(max(times) - min(times))
+
+        return {name: error for name, (_, error) in zip(names, results)}
+
+    async def _write(self, name: str, node: Node, value, start: float) -> tuple:
+
+        """Writes to a single target. Returns the time of the response and the error."""
+
+        try:
+            await node.write_value(value)
+        except Exception as e:
+            self.errors[name] += 1
+            logging.warning("Failed to write %s to %s: %s", value, name, e)
+            return None, e
+
+        now = time.monotonic()
+        self.latency[name].add(now - start)
+
+        return now, None
+
+    def log_stats(self) -> None:
+
+        """Logs the latency of every target and the spread between the targets."""
+
+        for name, histogram in self.latency.items():
+            stats = histogram.get_stats()
+            logging.info("Write latency %-10s [ms] : p50 %.1f, p99 %.1f, max %.1f, errors %d",
+                         name, stats["p50"]*1000, stats["p99"]*1000, stats["max"]*1000, self.errors[name])
+
+        stats = self.spread.get_stats()
+        logging.info("Write spread          [ms] : p50 %.1f, p99 %.1f, max %.1f",
+                     stats["p50"]*1000, stats["p99"]*1000, stats["max"]*1000)
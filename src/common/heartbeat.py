@@ -0,0 +1,259 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from asyncua import Node, ua
+from connection_manager import ConnectionManager
+from histogram import LatencyHistogram
+from rolling_stats import RollingStats
+
+# Statistics
+LOG_INTERVAL = 60.0 # [FLOAT: seconds]
+INTERVAL_WINDOW = 60 # [INT: -], number of livebit intervals for the jitter
+
+
+class Heartbeat:
+
+    """
+    Echoes the livebit of a PLC on its own thread, event loop and session.
+
+    The PLC toggles the input livebit, the heartbeat writes the received value
+    to the output livebit. Stalls of the main event loop (slow handlers, disk
+    access) don't delay the echo. Every echo has to be written within the
+    deadline. The echo latency (notification to write response) and the jitter
+    of the livebit interval are measured. If no echo succeeded for
+    watchdog_time - margin seconds, the alarm is raised: logged, the alarm event
+    is set and the optional on_alarm callback is called (on the heartbeat thread),
+    before the watchdog of the PLC expires.
+    """
+
+    def __init__(self, url: str, input_node_id: str, output_node_id: str, watchdog_time: float = 3.0, margin: float = 1.0,
+                 deadline: float = 0.5, publishing_interval: float = 50, user: str = None, password: str = None, on_alarm = None):
+
+        """Initializes the heartbeat. Times in seconds, the publishing interval in milliseconds."""
+
+        self.url = url
+        self.input_node_id = input_node_id
+        self.output_node_id = output_node_id
+        self.watchdog_time = watchdog_time
+        self.margin = margin
+        self.deadline = deadline
+        self.publishing_interval = publishing_interval
+        self.user = user
+        self.password = password
+        self.on_alarm = on_alarm
+        self.alarm = threading.Event()
+
+        # Statistics
+        self.echoes = 0
+        self.missed_deadlines = 0
+        self.failed_echoes = 0
+        self.superseded_echoes = 0
+        self.alarms = 0
+        self.latency = LatencyHistogram() # Notification to write response [s]
+        self.intervals = RollingStats([INTERVAL_WINDOW]) # Time between livebit changes [s]
+
+        self._thread = None
+        self._loop = None
+        self._task = None
+        self._echo_task = None # The echo in flight, superseded by the echo of a newer value
+        self._last_echo = None
+        self._last_change = None
+        self._last_value = None
+
+    def start(self) -> None:
+
+        """Starts the heartbeat thread."""
+
+        self._thread = threading.Thread(target=self._run_thread, name="Heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+
+        """Stops the heartbeat thread."""
+
+        if self._loop is not None and self._task is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_stats(self) -> dict:
+
+        """Returns the heartbeat statistics."""
+
+        last_echo = self._last_echo
+
+        return {
+            "echoes": self.echoes,
+            "missed_deadlines": self.missed_deadlines,
+            "failed_echoes": self.failed_echoes,
+            "superseded_echoes": self.superseded_echoes,
+            "alarms": self.alarms,
+            "alarm": self.alarm.is_set(),
+            "last_echo_age": time.monotonic() - last_echo if last_echo is not None else None,
+            "latency": self.latency.get_stats(),
+            "interval_mean": self.intervals.get_mean(INTERVAL_WINDOW),
+            "interval_jitter": math.sqrt(self.intervals.get_variance(INTERVAL_WINDOW))}
+
+    def _run_thread(self) -> None:
+
+        """Runs the event loop of the heartbeat."""
+
+        self._loop = asyncio.new_event_loop()
+
+        try:
+            self._task = self._loop.create_task(self._run())
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    async def _run(self) -> None:
+
+        """Connects and runs the echo, the watchdog and the statistics."""
+
+        connection = ConnectionManager(self.url, user=self.user, password=self.password, max_delay=self.margin)
+        output = connection.get_node(self.output_node_id)
+        connection.add_subscription(self.publishing_interval, LivebitHandler(self, output), [self.input_node_id])
+        self._last_echo = time.monotonic()
+        tasks = [connection.run(), self._watch(), self._log_stats()]
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if self._echo_task is not None:
+                self._echo_task.cancel()
+            await connection.disconnect()
+
+    def on_change(self, output: Node, value) -> None:
+
+        """Called on a change of the input livebit."""
+
+        now = time.monotonic()
+
+        # Interval between toggles, the initial value of a (new) subscription is not a toggle
+        if value != self._last_value:
+            if self._last_value is not None:
+                if self._last_change is not None and now - self._last_change < self.watchdog_time:
+                    self.intervals.add(now - self._last_change)
+                self._last_change = now
+            self._last_value = value
+
+        # One echo in flight: an older echo never overwrites a newer value
+        if self._echo_task is not None and not self._echo_task.done():
+            self._echo_task.cancel()
+            self.superseded_echoes += 1
+
+        self._echo_task = asyncio.ensure_future(self._echo(output, value, now))
+
+    async def _echo(self, output: Node, value, received: float) -> None:
+
+        """Writes the livebit to the output within the deadline."""
+
+        try:
+            await asyncio.wait_for(output.write_value(ua.DataValue(ua.Variant(bool(value), ua.VariantType.Boolean))), self.deadline)
+        except asyncio.TimeoutError:
+            self.missed_deadlines += 1
+            logging.warning("Livebit echo missed its deadline of {:.0f} ms.".format(self.deadline * 1000))
+            return
+        except Exception as e:
+            self.failed_echoes += 1
+            logging.warning("Livebit echo failed: {}".format(e))
+            return
+
+        now = time.monotonic()
+        self.latency.add(now - received)
+        self.echoes += 1
+        self._last_echo = now
+
+        if self.alarm.is_set():
+            self.alarm.clear()
+            logging.info("Livebit echo restored.")
+
+    async def _watch(self) -> None:
+
+        """Raises the alarm if there was no echo for watchdog_time - margin seconds."""
+
+        limit = self.watchdog_time - self.margin
+
+        while True:
+            await asyncio.sleep(min(0.1, limit / 10))
+            age = time.monotonic() - self._last_echo
+
+            if age > limit and not self.alarm.is_set():
+                self.alarm.set()
+                self.alarms += 1
+                message = "No livebit echo for {0:.1f} seconds, the watchdog of {1} expires in {2:.1f} seconds.".format(
+                    age, self.url, self.watchdog_time - age)
+                logging.error(message)
+
+                if self.on_alarm is not None:
+                    try:
+                        self.on_alarm(message)
+                    except Exception:
+                        logging.exception("Exception in heartbeat alarm callback")
+
+    async def _log_stats(self) -> None:
+
+        """Logs the latency and jitter every LOG_INTERVAL."""
+
+        while True:
+            await asyncio.sleep(LOG_INTERVAL)
+            stats = self.get_stats()
+            latency = stats["latency"]
+            logging.info("Livebit: {0} echoes, latency p50 {1:.1f} ms, p99 {2:.1f} ms, max {3:.1f} ms, interval {4:.3f} s +/- {5:.1f} ms, {6} missed deadlines, {7} alarms".format(
+                stats["echoes"], latency["p50"] * 1000, latency["p99"] * 1000, latency["max"] * 1000,
+                stats["interval_mean"], stats["interval_jitter"] * 1000, stats["missed_deadlines"], stats["alarms"]))
+
+
+class LivebitHandler:
+
+    """
+    Subscription Handler. Passes the changes of the input livebit to the heartbeat.
+    """
+
+    def __init__(self, heartbeat: Heartbeat, output: Node):
+
+        """Initializes the event handler."""
+
+        self.heartbeat = heartbeat
+        self.output = output
+
+    def datachange_notification(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server.
+        """
+
+        self.heartbeat.on_change(self.output, val)
+
+    def event_notification(self, event: ua.EventNotificationList):
+
+        """
+        Called for every event notification from server.
+        """
+
+        pass
+
+    def status_change_notification(self, status: ua.StatusChangeNotification):
+
+        """
+        Called for every status change notification from server.
+        """
+
+        pass
@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import bisect
+
+# Upper bounds of the buckets [s]
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+
+class LatencyHistogram:
+
+    """
+    Histogram with fixed buckets for latencies in seconds.
+
+    The buckets are allocated once, adding a value is a bisect and an increment.
+    Percentiles are estimated with the upper bound of the bucket.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+
+        """Initializes the histogram."""
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last bucket: larger than the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float) -> None:
+
+        """Adds a value to the histogram."""
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def get_mean(self) -> float:
+
+        """Returns the mean value."""
+
+        return self.sum / self.count if self.count > 0 else 0.0
+
+    def get_percentile(self, percentile: float) -> float:
+
+        """Returns an estimate of the percentile (0-100): the upper bound of its bucket, at most the max."""
+
+        if self.count == 0:
+            return 0.0
+
+        rank = percentile / 100.0 * self.count
+        total = 0
+
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count > 0:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+
+        return self.max
+
+    def get_stats(self) -> dict:
+
+        """Returns count, mean, min, max, p50 and p99."""
+
+        return {
+            "count": self.count,
+            "mean": self.get_mean(),
+            "min": self.min if self.min is not None else 0.0,
+            "max": self.max if self.max is not None else 0.0,
+            "p50": self.get_percentile(50),
+            "p99": self.get_percentile(99)}
+
+    def reset(self) -> None:
+
+        """Clears all counts."""
+
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
@@ -0,0 +1,356 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Metrics of the acquisition in the Prometheus text format, served over HTTP.
+
+Counters and histograms are allocated once per metric and label set; in the
+hot path an update is an increment or a bisect (see histogram.py). Values
+that already exist elsewhere (reconnects, queue depths) are registered as
+functions and only read when the metrics are scraped. The HTTP server runs on
+its own thread, a scrape never waits for the event loop.
+
+Usage:
+    registry = MetricsRegistry()
+    register_connection(registry, "mtec", connection)
+    handler = MetricsHandler(handler, registry, "mtec")
+    MetricsServer(registry, 9100).start() # http://127.0.0.1:9100/metrics
+"""
+
+import inspect
+import logging
+import threading
+import time
+from datetime import timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from asyncua import Node, ua
+from histogram import LatencyHistogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+
+    """Counter that only goes up."""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class MetricsRegistry:
+
+    """
+    Collection of metrics. A metric has a name, a type, a help text and one or
+    more label sets, each with its own source: a Counter, a LatencyHistogram or a
+    function that returns the value.
+    """
+
+    def __init__(self):
+
+        """Initializes the registry."""
+
+        self._metrics = {} # Name -> (type, help, list of (labels, source))
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, labels: dict = None) -> Counter:
+
+        """Returns a new counter."""
+
+        return self._add(name, "counter", description, labels, Counter())
+
+    def histogram(self, name: str, description: str, labels: dict = None, histogram: LatencyHistogram = None) -> LatencyHistogram:
+
+        """Returns a new histogram in seconds, or registers an existing one."""
+
+        return self._add(name, "histogram", description, labels, histogram if histogram is not None else LatencyHistogram())
+
+    def gauge(self, name: str, description: str, function, labels: dict = None) -> None:
+
+        """Registers a function that returns the current value, called when scraped."""
+
+        self._add(name, "gauge", description, labels, function)
+
+    def counter_function(self, name: str, description: str, function, labels: dict = None) -> None:
+
+        """Registers a function that returns a count that only goes up, called when scraped."""
+
+        self._add(name, "counter", description, labels, function)
+
+    def render(self) -> str:
+
+        """Returns all metrics in the Prometheus text format."""
+
+        with self._lock:
+            metrics = [(name, kind, description, list(series)) for name, (kind, description, series) in self._metrics.items()]
+
+        lines = []
+
+        for name, kind, description, series in metrics:
+            lines.append("# HELP {0} {1}".format(name, description))
+            lines.append("# TYPE {0} {1}".format(name, kind))
+
+            for labels, source in series:
+                if isinstance(source, LatencyHistogram):
+                    lines.extend(render_histogram(name, labels, source))
+                    continue
+
+                try:
+                    value = source.value if isinstance(source, Counter) else source()
+                except Exception as e:
+                    logging.debug("Metric %s failed: %s", name, e)
+                    continue
+
+                if value is not None:
+                    lines.append("{0}{1} {2}".format(name, format_labels(labels), format_value(value)))
+
+        return "\n".join(lines) + "\n"
+
+    def _add(self, name: str, kind: str, description: str, labels: dict, source):
+
+        """Adds a label set of a metric, a metric has one type."""
+
+        with self._lock:
+            metric = self._metrics.setdefault(name, (kind, description, []))
+
+            if metric[0] != kind:
+                raise ValueError("Metric {0} is a {1}".format(name, metric[0]))
+
+            metric[2].append((labels or {}, source))
+
+        return source
+
+
+def format_labels(labels: dict, extra: str = None) -> str:
+
+    """Returns the label set as {name="value",...}."""
+
+    items = ['{0}="{1}"'.format(key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+             for key, value in labels.items()]
+
+    if extra is not None:
+        items.append(extra)
+
+    return "{" + ",".join(items) + "}" if len(items) > 0 else ""
+
+
+def format_value(value) -> str:
+
+    """Returns a sample value, booleans as 0 or 1."""
+
+    return repr(float(value)) if not isinstance(value, bool) else str(int(value))
+
+
+def render_histogram(name: str, labels: dict, histogram: LatencyHistogram) -> list:
+
+    """Returns the cumulative buckets, the sum and the count of a histogram."""
+
+    lines = []
+    counts = list(histogram.counts)
+    total = 0
+
+    for bound, count in zip(histogram.buckets, counts):
+        total += count
+        lines.append("{0}_bucket{1} {2}".format(name, format_labels(labels, 'le="{}"'.format(bound)), total))
+
+    lines.append("{0}_bucket{1} {2}".format(name, format_labels(labels, 'le="+Inf"'), total + counts[-1]))
+    lines.append("{0}_sum{1} {2}".format(name, format_labels(labels), repr(float(histogram.sum))))
+    lines.append("{0}_count{1} {2}".format(name, format_labels(labels), total + counts[-1]))
+
+    return lines
+
+
+class MetricsHandler:
+
+    """
+    Subscription Handler that measures the notifications per monitored item
+    and passes them to the wrapped handler.
+
+    Per item: the number of notifications, the delay from the source timestamp
+    to the arrival and the execution time of the wrapped handler. The metrics of
+    an item are allocated on its first notification. names: optional dictionary
+    node id -> item name for the labels, the node id is used otherwise.
+    """
+
+    def __init__(self, handler, registry: MetricsRegistry, endpoint: str, names: dict = None):
+
+        """Initializes the event handler."""
+
+        self.handler = handler
+        self.registry = registry
+        self.endpoint = endpoint
+        self.names = {}
+        self._items = {}
+
+        for node_id, name in (names or {}).items():
+            try:
+                self.names[ua.NodeId.from_string(node_id)] = name
+            except Exception:
+                self.names[node_id] = name
+
+        # Async handlers are awaited
+        if inspect.iscoroutinefunction(handler.datachange_notification):
+            self.datachange_notification = self._datachange_notification_async
+
+    def datachange_notification(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server.
+        """
+
+        start = time.perf_counter()
+        notifications, duration = self._count(node, data)
+        self.handler.datachange_notification(node, val, data)
+        duration.add(time.perf_counter() - start)
+        notifications.inc()
+
+    async def _datachange_notification_async(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server, for async handlers.
+        """
+
+        start = time.perf_counter()
+        notifications, duration = self._count(node, data)
+        await self.handler.datachange_notification(node, val, data)
+        duration.add(time.perf_counter() - start)
+        notifications.inc()
+
+    def event_notification(self, event: ua.EventNotificationList):
+
+        """
+        Called for every event notification from server.
+        """
+
+        self.handler.event_notification(event)
+
+    def status_change_notification(self, status: ua.StatusChangeNotification):
+
+        """
+        Called for every status change notification from server.
+        """
+
+        self.handler.status_change_notification(status)
+
+    def _count(self, node: Node, data) -> tuple:
+
+        """Adds the delay of a notification, returns the counter and the handler histogram of the item."""
+
+        item = self._items.get(node.nodeid)
+
+        if item is None:
+            labels = {"endpoint": self.endpoint, "item": self.names.get(node.nodeid, node.nodeid.to_string())}
+            item = (self.registry.counter("opcua_notifications_total", "Data change notifications per monitored item.", labels),
+                    self.registry.histogram("opcua_notification_delay_seconds", "Time from the source timestamp to the arrival of the notification.", labels),
+                    self.registry.histogram("opcua_handler_seconds", "Execution time of the subscription handler per notification.", labels))
+            self._items[node.nodeid] = item
+
+        source = data.monitored_item.Value.SourceTimestamp
+
+        if source is not None:
+            if source.tzinfo is None:
+                source = source.replace(tzinfo=timezone.utc)
+            item[1].add(time.time() - source.timestamp())
+
+        return item[0], item[2]
+
+
+def register_connection(registry: MetricsRegistry, name: str, connection) -> None:
+
+    """Registers the statistics of a ConnectionManager (see connection_manager.py)."""
+
+    labels = {"endpoint": name}
+    registry.gauge("opcua_connected", "1 if the session is connected.", lambda: connection.connected.is_set(), labels)
+    registry.counter_function("opcua_connects_total", "Successful connects.", lambda: connection.connects, labels)
+    registry.counter_function("opcua_reconnects_total", "Reconnects after a connection loss.", lambda: connection.reconnects, labels)
+    registry.counter_function("opcua_failed_attempts_total", "Failed connection attempts and losses.", lambda: connection.failed_attempts, labels)
+    registry.counter_function("opcua_missed_notifications_total", "Estimate of the notifications missed while disconnected.", lambda: connection.missed_notifications, labels)
+    registry.counter_function("opcua_downtime_seconds_total", "Time between connection losses and restored subscriptions.", lambda: connection.total_downtime, labels)
+    registry.gauge("opcua_keepalive_age_seconds", "Time since the last keepalive notification.", lambda: connection.get_stats()["keepalive_age"], labels)
+    registry.histogram("opcua_handshake_seconds", "Time of a connect: socket, secure channel and session.", labels, connection.handshake)
+
+
+def register_fan_out(registry: MetricsRegistry, name: str, writer) -> None:
+
+    """Registers the write latencies and errors per target of a FanOutWriter (see fan_out.py)."""
+
+    for target, histogram in writer.latency.items():
+        labels = {"writer": name, "target": target}
+        registry.histogram("opcua_write_seconds", "Time from the trigger to the write response per target node.", labels, histogram)
+        registry.counter_function("opcua_write_errors_total", "Failed writes per target node.", lambda target=target: writer.errors[target], labels)
+
+    registry.histogram("opcua_write_spread_seconds", "Time between the first and last response of the same write.", {"writer": name}, writer.spread)
+
+
+class MetricsServer:
+
+    """Serves the metrics of a registry on http://host:port/metrics, on its own thread."""
+
+    def __init__(self, registry: MetricsRegistry, port: int = 9100, host: str = "127.0.0.1"):
+
+        """Initializes the server. Bound to the local host by default."""
+
+        self.registry = registry
+        self.port = port
+        self.host = host
+        self.scrapes = 0
+        self._server = None
+        self._thread = None
+
+    def start(self) -> None:
+
+        """Starts the HTTP server thread."""
+
+        if self._server is not None:
+            return
+
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = server.registry.render().encode("utf-8")
+                server.scrapes += 1
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), RequestHandler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logging.info("Metrics on http://{0}:{1}/metrics".format(self.host, self.port))
+
+    def stop(self) -> None:
+
+        """Stops the HTTP server."""
+
+        if self._server is None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
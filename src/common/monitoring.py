@@ -0,0 +1,305 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Monitoring settings of the monitored items of a subscription.
+
+By default the server reports every change of a value at every sample. For a
+noisy analog signal every sample is a change. A DataChangeFilter on the server
+reports a sample only if it differs more than the deadband from the last
+reported value (absolute in engineering units, or percent of the EURange of
+the node), or only on a change of the status, value or timestamp (trigger).
+Items that are not reported are not sent, not queued and not decoded.
+
+Config of an item (all keys optional):
+    {"sampling_interval": 10, "queuesize": 20, "discard_oldest": true,
+     "trigger": "status_value", "deadband": {"type": "absolute", "value": 0.01}}
+
+The trigger is "status", "status_value" (default) or "status_value_timestamp".
+The NotificationCounter counts the notifications per item. The rate of the
+same items without filter is measured once, for MEASURE_TIME seconds on a
+temporary subscription (measure_unfiltered): the difference is the number of
+notifications per second that the filter saves.
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from asyncua import Node, ua
+
+TRIGGERS = {
+    "status": ua.DataChangeTrigger.Status,
+    "status_value": ua.DataChangeTrigger.StatusValue,
+    "status_value_timestamp": ua.DataChangeTrigger.StatusValueTimestamp}
+
+DEADBAND_TYPES = {
+    "none": ua.DeadbandType.None_,
+    "absolute": ua.DeadbandType.Absolute,
+    "percent": ua.DeadbandType.Percent}
+
+MEASURE_TIME = 10.0 # [FLOAT: seconds], measurement of the notification rate of the filtered items without filter
+
+# Keys of the monitoring settings in a config
+MONITORING_KEYS = ("sampling_interval", "queuesize", "discard_oldest", "trigger", "deadband")
+
+# Results of a monitored item request with a filter that the server doesn't support for the node
+FILTER_ERRORS = (
+    ua.StatusCodes.BadFilterNotAllowed,
+    ua.StatusCodes.BadMonitoredItemFilterInvalid,
+    ua.StatusCodes.BadMonitoredItemFilterUnsupported,
+    ua.StatusCodes.BadDeadbandFilterInvalid)
+
+
+class MonitoringConfig:
+
+    """
+    Sampling interval, queue, discard policy and data change filter of a monitored item.
+    """
+
+    def __init__(self, sampling_interval: float = 50.0, queuesize: int = 0, discard_oldest: bool = True,
+                 trigger: str = "status_value", deadband_type: str = "none", deadband_value: float = 0.0):
+
+        """
+        Initializes the monitoring settings. The sampling interval in milliseconds
+        (-1 is the publishing interval, 0 the fastest rate of the server), the
+        queue size 0 is 1 and the deadband value in engineering units (absolute)
+        or percent of the EURange (percent).
+        """
+
+        if trigger not in TRIGGERS:
+            raise ValueError("Unknown trigger: {}".format(trigger))
+        if deadband_type not in DEADBAND_TYPES:
+            raise ValueError("Unknown deadband type: {}".format(deadband_type))
+
+        self.sampling_interval = sampling_interval
+        self.queuesize = queuesize
+        self.discard_oldest = discard_oldest
+        self.trigger = trigger
+        self.deadband_type = deadband_type
+        self.deadband_value = deadband_value
+
+    @classmethod
+    def from_dict(cls, config: dict, default: "MonitoringConfig" = None) -> "MonitoringConfig":
+
+        """Returns the settings of an item config. Missing keys are taken from the default."""
+
+        default = default if default is not None else cls()
+        deadband = config.get("deadband")
+
+        if deadband is None:
+            deadband = {"type": default.deadband_type, "value": default.deadband_value}
+
+        return cls(config.get("sampling_interval", default.sampling_interval), config.get("queuesize", default.queuesize),
+                   config.get("discard_oldest", default.discard_oldest), config.get("trigger", default.trigger),
+                   deadband.get("type", "absolute"), deadband.get("value", 0.0))
+
+    def has_filter(self) -> bool:
+
+        """Returns True if the item needs a data change filter: a deadband or another trigger than the default."""
+
+        return (self.deadband_type != "none" and self.deadband_value > 0) or self.trigger != "status_value"
+
+    def is_default(self) -> bool:
+
+        """Returns True if only the sampling interval and queue size are set."""
+
+        return not self.has_filter() and self.discard_oldest
+
+    def create_filter(self) -> ua.DataChangeFilter:
+
+        """Returns the data change filter, None if the item has no filter."""
+
+        if not self.has_filter():
+            return None
+
+        data_change_filter = ua.DataChangeFilter()
+        data_change_filter.Trigger = TRIGGERS[self.trigger]
+        data_change_filter.DeadbandType = DEADBAND_TYPES[self.deadband_type] if self.deadband_value > 0 else ua.DeadbandType.None_
+        data_change_filter.DeadbandValue = self.deadband_value if self.deadband_value > 0 else 0.0
+
+        return data_change_filter
+
+    def create_request(self, node_id: ua.NodeId, client_handle: int) -> ua.MonitoredItemCreateRequest:
+
+        """Returns the request to monitor the value of a node, the client handle must be unique within the subscription."""
+
+        request = ua.MonitoredItemCreateRequest()
+        request.ItemToMonitor = ua.ReadValueId()
+        request.ItemToMonitor.NodeId = node_id
+        request.ItemToMonitor.AttributeId = ua.AttributeIds.Value
+        request.MonitoringMode = ua.MonitoringMode.Reporting
+        request.RequestedParameters = ua.MonitoringParameters()
+        request.RequestedParameters.ClientHandle = client_handle
+        request.RequestedParameters.SamplingInterval = self.sampling_interval
+        request.RequestedParameters.QueueSize = self.queuesize
+        request.RequestedParameters.DiscardOldest = self.discard_oldest
+        request.RequestedParameters.Filter = self.create_filter()
+
+        return request
+
+    def describe(self) -> str:
+
+        """Returns a short description of the filter, for the log."""
+
+        if not self.has_filter():
+            return "no filter"
+
+        if self.deadband_type == "none" or self.deadband_value <= 0:
+            return "trigger {}".format(self.trigger)
+
+        return "{0} deadband {1:g}{2}".format(self.deadband_type, self.deadband_value, "%" if self.deadband_type == "percent" else "")
+
+
+def load_monitoring(config: dict) -> tuple:
+
+    """
+    Returns the monitoring settings of a subscription config with "nodes" (name ->
+    node id or name -> item config with "node_id"): the default of the
+    subscription and the settings (node id -> MonitoringConfig) of the nodes with their own keys.
+    """
+
+    default = MonitoringConfig.from_dict(config)
+    settings = {}
+
+    for node in config["nodes"].values():
+        if isinstance(node, dict) and any(key in node for key in MONITORING_KEYS):
+            settings[node["node_id"]] = MonitoringConfig.from_dict(node, default)
+
+    return default, settings
+
+
+class NotificationCounter:
+
+    """
+    Subscription Handler that counts the notifications per item and passes them
+    to the wrapped handler, if any. The counts start again with reset() on every
+    new subscription.
+    """
+
+    def __init__(self, handler):
+
+        """Initializes the event handler."""
+
+        self.handler = handler
+        self.counts = {} # Node id -> notifications
+        self.start = time.monotonic()
+
+        # Async handlers are awaited
+        if handler is not None and inspect.iscoroutinefunction(handler.datachange_notification):
+            self.datachange_notification = self._datachange_notification_async
+
+    def reset(self) -> None:
+
+        """Starts counting again."""
+
+        self.counts = {}
+        self.start = time.monotonic()
+
+    def datachange_notification(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server.
+        """
+
+        self.counts[node.nodeid] = self.counts.get(node.nodeid, 0) + 1
+
+        if self.handler is not None:
+            self.handler.datachange_notification(node, val, data)
+
+    async def _datachange_notification_async(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server, for async handlers.
+        """
+
+        self.counts[node.nodeid] = self.counts.get(node.nodeid, 0) + 1
+        await self.handler.datachange_notification(node, val, data)
+
+    def event_notification(self, event: ua.EventNotificationList):
+
+        """
+        Called for every event notification from server.
+        """
+
+        if self.handler is not None:
+            self.handler.event_notification(event)
+
+    def status_change_notification(self, status: ua.StatusChangeNotification):
+
+        """
+        Called for every status change notification from server.
+        """
+
+        if self.handler is not None:
+            self.handler.status_change_notification(status)
+
+    def get_rate(self, node_id: ua.NodeId) -> float:
+
+        """Returns the notifications per second of an item since the start."""
+
+        duration = time.monotonic() - self.start
+
+        return self.counts.get(node_id, 0) / duration if duration > 0 else 0.0
+
+
+async def measure_unfiltered(client, period: float, items: list, duration: float = MEASURE_TIME) -> dict:
+
+    """
+    Monitors items, a list of (node id, ua.NodeId, MonitoringConfig), with the same
+    sampling interval and queue but without filter for `duration` seconds, on a
+    temporary subscription. Returns node id -> notifications per second, the
+    initial value of an item is not counted.
+    """
+
+    counter = NotificationCounter(None)
+    subscription = await client.create_subscription(period, counter)
+
+    try:
+        requests = [MonitoringConfig(config.sampling_interval, config.queuesize, config.discard_oldest).create_request(node_id, i + 1)
+                    for i, (_, node_id, config) in enumerate(items)]
+        await subscription.create_monitored_items(requests)
+        await asyncio.sleep(duration)
+        return {name: max(0, counter.counts.get(node_id, 0) - 1) / duration for name, node_id, _ in items}
+
+    finally:
+        try:
+            await subscription.delete()
+        except Exception as e:
+            logging.debug("Failed to delete the measurement subscription: %s", e)
+
+
+def get_savings(counter: NotificationCounter, node_id: ua.NodeId, unfiltered: float = None) -> tuple:
+
+    """
+    Returns the notifications per second of an item, without filter (measured,
+    None if not measured yet) and saved by the filter (None if not measured yet).
+    """
+
+    rate = counter.get_rate(node_id)
+
+    if unfiltered is None:
+        return rate, None, None
+
+    return rate, unfiltered, max(0.0, unfiltered - rate)
+
+
+def log_savings(connection) -> None:
+
+    """Logs the notification rate and the measured savings of every filtered item of a ConnectionManager."""
+
+    for node_id, stats in connection.get_monitoring_stats().items():
+        if stats["saved_rate"] is None:
+            logging.info("%s: %s, %.1f notifications/s, the rate without filter is not measured yet", node_id, stats["filter"], stats["rate"])
+            continue
+
+        logging.info("%s: %s, %.1f notifications/s, %.1f/s without filter (measured), %.1f/s saved (%.0f%%)", node_id, stats["filter"], stats["rate"],
+                     stats["unfiltered_rate"], stats["saved_rate"], 100.0 * stats["saved_rate"] / stats["unfiltered_rate"] if stats["unfiltered_rate"] > 0 else 0.0)
@@ -0,0 +1,144 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+from collections import deque
+
+
+class RollingStats:
+
+    """
+    Moving statistics over the last n values for multiple window lengths.
+
+    The values are kept in one ring buffer with the length of the largest
+    window. Every window keeps a running sum and sum of squares (relative to a
+    shift value, to avoid cancellation) for the mean and variance, and monotonic queues for the min and max. An update is
+    constant time per window (amortized for min and max) and the memory is
+    bounded by the largest window. If fewer values than the window length are
+    added, the statistics are over all values so far.
+    """
+
+    def __init__(self, windows: list):
+
+        """Initializes the rolling statistics for the given window lengths."""
+
+        self.windows = sorted(set(windows))
+        self.size = self.windows[-1]
+        self.count = 0 # Total number of added values
+        self._buffer = [0.0] * self.size
+        self._shift = None
+        self._sums = {window: 0.0 for window in self.windows}
+        self._squares = {window: 0.0 for window in self.windows}
+        self._mins = {window: deque() for window in self.windows}
+        self._maxs = {window: deque() for window in self.windows}
+
+    def add(self, value: float) -> None:
+
+        """Adds a value."""
+
+        value = float(value)
+
+        if self._shift is None:
+            self._shift = value
+
+        delta = value - self._shift
+
+        for window in self.windows:
+
+            # Remove the value that leaves the window
+            if self.count >= window:
+                old = self._buffer[(self.count - window) % self.size] - self._shift
+                self._sums[window] -= old
+                self._squares[window] -= old * old
+
+            self._sums[window] += delta
+            self._squares[window] += delta * delta
+
+            # Monotonic queues of (index, value)
+            mins = self._mins[window]
+            while len(mins) > 0 and mins[-1][1] >= value:
+                mins.pop()
+            mins.append((self.count, value))
+            if mins[0][0] <= self.count - window:
+                mins.popleft()
+
+            maxs = self._maxs[window]
+            while len(maxs) > 0 and maxs[-1][1] <= value:
+                maxs.pop()
+            maxs.append((self.count, value))
+            if maxs[0][0] <= self.count - window:
+                maxs.popleft()
+
+        self._buffer[self.count % self.size] = value
+        self.count += 1
+
+        # Recompute the running sums once per buffer length to remove rounding drift
+        if self.count % self.size == 0:
+            self._recompute()
+
+    def get_count(self, window: int) -> int:
+
+        """Returns the number of values in the window."""
+
+        return min(self.count, window)
+
+    def get_mean(self, window: int) -> float:
+
+        """Returns the mean of the window."""
+
+        n = self.get_count(window)
+
+        return self._shift + self._sums[window] / n if n > 0 else 0.0
+
+    def get_variance(self, window: int) -> float:
+
+        """Returns the sample variance of the window."""
+
+        n = self.get_count(window)
+
+        if n < 2:
+            return 0.0
+
+        mean = self._sums[window] / n
+
+        return max(0.0, (self._squares[window] - n * mean * mean) / (n - 1))
+
+    def get_min(self, window: int) -> float:
+
+        """Returns the minimum of the window."""
+
+        mins = self._mins[window]
+
+        return mins[0][1] if len(mins) > 0 else 0.0
+
+    def get_max(self, window: int) -> float:
+
+        """Returns the maximum of the window."""
+
+        maxs = self._maxs[window]
+
+        return maxs[0][1] if len(maxs) > 0 else 0.0
+
+    def get_last(self) -> float:
+
+        """Returns the last added value."""
+
+        return self._buffer[(self.count - 1) % self.size] if self.count > 0 else 0.0
+
+    def _recompute(self) -> None:
+
+        """Recomputes the running sums from the buffer, relative to the mean of the largest window."""
+
+        self._shift = sum(self._buffer) / self.size
+
+        for window in self.windows:
+            values = [self._buffer[(self.count - 1 - i) % self.size] - self._shift for i in range(self.get_count(window))]
+            self._sums[window] = sum(values)
+            self._squares[window] = sum(value * value for value in values)
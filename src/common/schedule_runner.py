@@ -0,0 +1,210 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from asyncua import ua
+from connection_manager import CONNECTION_ERRORS
+
+
+class ScheduleRunner:
+
+    """
+    Applies a list of setpoint steps at fixed intervals.
+
+    Step i is applied at start + i * step_time, with the deadlines on the
+    monotonic clock: the time of the writes and connection checks doesn't add up
+    to a drift. All setpoints of a step are written concurrently. The start time
+    and the last applied step are saved in a state file, so after a restart
+    the schedule continues with the step of the current time. Delete the state
+    file (or change the schedule) to start from the first step. The state file
+    is removed at the end of the schedule.
+
+    A step that can't be written before the next step is due is skipped. After
+    an outage the schedule continues with the step of the current time, the
+    steps that were missed in between are not written.
+    """
+
+    def __init__(self, nodes: dict, steps: list, step_time: float, state_file: str = None, wait_ready = None, retry_delay: float = 1.0):
+
+        """
+        Initializes the schedule runner.
+
+        nodes: dictionary name -> Node.
+        steps: list of dictionaries name -> ua.Variant.
+        step_time: duration of a step [s].
+        wait_ready: optional async function that waits until all nodes can be written.
+        """
+
+        self.nodes = nodes
+        self.steps = steps
+        self.step_time = step_time
+        self.state_file = state_file
+        self.wait_ready = wait_ready
+        self.retry_delay = retry_delay
+        self.fingerprint = self._get_fingerprint()
+        self.step = -1 # Last applied step
+
+    async def run(self) -> None:
+
+        """Runs the schedule until the end of the last step."""
+
+        n = len(self.steps)
+        start = self._load_state()
+
+        if start is None:
+            start = time.time()
+            logging.info("Start of the schedule with {0} steps of {1:.0f} seconds.".format(n, self.step_time))
+        else:
+            logging.info("Resume of the schedule started at {}.".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start))))
+
+        self._save_state(start)
+
+        # Start of the schedule on the monotonic clock
+        origin = time.monotonic() - (time.time() - start)
+        i = max(0, int((time.monotonic() - origin) // self.step_time))
+
+        while i < n:
+            deadline = origin + i * self.step_time
+            delay = deadline - time.monotonic()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if await self._apply(i, deadline, origin + (i + 1) * self.step_time):
+                self.step = i
+                self._save_state(start)
+
+            # Continue with the step of the current time, overdue steps are not written late
+            current = int((time.monotonic() - origin) // self.step_time)
+
+            if current > i + 1:
+                logging.warning("Steps {0} to {1} skipped, they are overdue.".format(i + 2, min(current, n)))
+
+            i = max(i + 1, current)
+
+        # Hold the last step for its duration
+        delay = origin + n * self.step_time - time.monotonic()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        self._clear_state()
+        logging.info("End of the schedule.")
+
+    async def _apply(self, i: int, deadline: float, next_deadline: float) -> bool:
+
+        """Writes all setpoints of a step concurrently. Retries until done or until the next step is due."""
+
+        step = self.steps[i]
+        names = list(step.keys())
+        logging.info("Step {0}/{1}: {2}".format(i + 1, len(self.steps), ", ".join("{0} = {1}".format(name, step[name].Value) for name in names)))
+
+        while True:
+
+            try:
+                if self.wait_ready is not None:
+                    await asyncio.wait_for(self.wait_ready(), max(0.0, next_deadline - time.monotonic()))
+
+                if time.monotonic() >= next_deadline:
+                    logging.error("Step {} skipped, the next step is due.".format(i + 1))
+                    return False
+
+                late = time.monotonic() - deadline
+                results = await asyncio.gather(*[self.nodes[name].write_value(ua.DataValue(step[name])) for name in names], return_exceptions=True)
+                errors = [(name, result) for name, result in zip(names, results) if isinstance(result, Exception)]
+
+                if len(errors) == 0:
+                    logging.info("Step {0} applied {1:.1f} ms after its deadline.".format(i + 1, late * 1000))
+                    return True
+
+                for name, error in errors:
+                    if not isinstance(error, CONNECTION_ERRORS):
+                        raise error
+                    logging.warning("Failed to write {0}: {1}".format(name, error))
+
+            except asyncio.TimeoutError:
+                logging.error("Step {} skipped, not ready before the next step is due.".format(i + 1))
+                return False
+
+            except CONNECTION_ERRORS as e:
+                logging.warning("Failed to apply step {0}: {1}".format(i + 1, e))
+
+            if time.monotonic() + self.retry_delay >= next_deadline:
+                logging.error("Step {} skipped, the next step is due.".format(i + 1))
+                return False
+
+            await asyncio.sleep(self.retry_delay)
+
+    def _get_fingerprint(self) -> str:
+
+        """Returns a hash of the schedule, to check that a state file belongs to this schedule."""
+
+        data = [self.step_time] + [[(name, str(variant.Value), int(variant.VariantType.value)) for name, variant in step.items()] for step in self.steps]
+
+        return hashlib.sha1(json.dumps(data).encode("utf-8")).hexdigest()
+
+    def _load_state(self) -> float:
+
+        """Returns the start time from the state file, or None to start a new schedule."""
+
+        if self.state_file is None or not os.path.exists(self.state_file):
+            return None
+
+        try:
+            with open(self.state_file) as file:
+                state = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning("Failed to read the state file {0}: {1}".format(self.state_file, e))
+            return None
+
+        if state.get("fingerprint") != self.fingerprint:
+            logging.info("The state file belongs to another schedule.")
+            return None
+
+        self.step = state.get("step", -1)
+
+        return state["start"]
+
+    def _save_state(self, start: float) -> None:
+
+        """Saves the start time and the last applied step."""
+
+        if self.state_file is None:
+            return
+
+        state = {"fingerprint": self.fingerprint, "start": start, "step": self.step}
+        temp = self.state_file + ".tmp"
+
+        try:
+            with open(temp, "w") as file:
+                json.dump(state, file)
+            os.replace(temp, self.state_file)
+        except OSError as e:
+            logging.warning("Failed to save the state file {0}: {1}".format(self.state_file, e))
+
+    def _clear_state(self) -> None:
+
+        """Removes the state file at the end of the schedule, a next run starts from the first step."""
+
+        if self.state_file is None:
+            return
+
+        try:
+            os.remove(self.state_file)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning("Failed to remove the state file {0}: {1}".format(self.state_file, e))
@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+import time
+from connection_manager import ConnectionManager
+
+
+class SessionGroup:
+
+    """
+    Group of sessions with multiple OPC UA servers.
+
+    All endpoints are connected concurrently and every endpoint reconnects on
+    its own: if one machine drops, the sessions and subscriptions of the other
+    machines stay up.
+    """
+
+    def __init__(self, managers: dict):
+
+        """Initializes the session group with a dictionary name -> ConnectionManager."""
+
+        self.managers = managers
+
+    def __getitem__(self, name: str) -> ConnectionManager:
+        return self.managers[name]
+
+    def add_listener(self, callback) -> None:
+
+        """
+        Adds a listener for the connection state of all endpoints. The callback is
+        called with the name of the endpoint, the new state and the reason.
+        """
+
+        for name, manager in self.managers.items():
+            manager.add_listener(lambda state, reason, name=name: callback(name, state, reason))
+
+    def is_connected(self, names: list = None) -> bool:
+
+        """Returns True if all (or the given) endpoints are connected."""
+
+        names = names if names is not None else self.managers.keys()
+
+        return all(self.managers[name].connected.is_set() for name in names)
+
+    async def wait_connected(self, names: list = None) -> None:
+
+        """Waits until all (or the given) endpoints are connected."""
+
+        names = names if names is not None else self.managers.keys()
+        await asyncio.gather(*[self.managers[name].wait_connected() for name in names])
+
+    async def run(self, session = None):
+
+        """
+        Connects all endpoints concurrently and keeps them connected.
+
+        The optional session is an async function that is called with the group once
+        all endpoints are connected. It keeps running while single endpoints
+        reconnect. If it returns, all endpoints are disconnected and its result is
+        returned. Without a session, run() runs forever.
+        """
+
+        start = time.monotonic()
+        tasks = [asyncio.ensure_future(manager.run()) for manager in self.managers.values()]
+
+        try:
+            await self._wait_for(self.wait_connected(), tasks)
+            logging.info("Connected to {0} endpoints in {1:.2f} seconds.".format(len(self.managers), time.monotonic() - start))
+
+            if session is None:
+                await asyncio.gather(*tasks)
+            else:
+                return await self._wait_for(session(self), tasks)
+
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.gather(*[manager.disconnect() for manager in self.managers.values()])
+
+    async def _wait_for(self, coroutine, tasks: list):
+
+        """Waits for a coroutine, raises the exception if one of the connection tasks fails."""
+
+        future = asyncio.ensure_future(coroutine)
+        done, _ = await asyncio.wait([future, *tasks], return_when=asyncio.FIRST_COMPLETED)
+
+        if future not in done:
+            future.cancel()
+            for task in done:
+                task.result()
+
+        return future.result()
+
+    def get_stats(self) -> dict:
+
+        """Returns the connection statistics of all endpoints."""
+
+        return {name: manager.get_stats() for name, manager in self.managers.items()}
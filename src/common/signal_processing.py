@@ -0,0 +1,293 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Streaming signal processing of blocks of samples, inline with the acquisition.
+
+Every stage processes a block of samples at once with NumPy and keeps the
+state it needs from the previous blocks (the last values of a window, the
+output of the filter). A block is processed as soon as it arrives: the output
+has no more latency than the block itself, apart from the group delay of the
+filters. The stages assume equidistant samples (a subscription with a sampling
+interval and no deadband).
+
+    Offset       : subtracts the tare
+    Gain         : multiplies with the calibration gain
+    MovingMedian : median of the last n samples, removes spikes
+    LowPass      : first order IIR low-pass filter
+    Derivative   : change per second over a span of samples
+
+Pipeline chains stages, LoadCellProcessor combines them to the weight and the
+mass flow rate (the weight loss per second) of a load cell. Timestamps are int64
+nanoseconds since the Unix epoch (see signal_store.py).
+"""
+
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class Offset:
+
+    """Subtracts an offset. tare() takes the last input as the new offset."""
+
+    def __init__(self, offset: float = 0.0):
+        self.offset = offset
+        self.last = None
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        if len(values) > 0:
+            self.last = float(values[-1])
+        return values - self.offset
+
+    def tare(self) -> None:
+        if self.last is not None:
+            self.offset = self.last
+
+    def reset(self) -> None:
+        self.last = None
+
+
+class Gain:
+
+    """Multiplies with a gain."""
+
+    def __init__(self, gain: float = 1.0):
+        self.gain = gain
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+        return values * self.gain
+
+    def reset(self) -> None:
+        pass
+
+
+class MovingMedian:
+
+    """
+    Median of the last `window` samples. A spike shorter than half the window is
+    removed, a step passes with a delay of half the window. Before the first
+    window is full the first sample is repeated.
+    """
+
+    def __init__(self, window: int = 5):
+
+        """Initializes the filter, window in samples."""
+
+        if window < 1:
+            raise ValueError("The window should be at least 1 sample")
+
+        self.window = window
+        self._history = None # Last window - 1 inputs
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+
+        """Returns the medians of a block."""
+
+        if len(values) == 0 or self.window == 1:
+            return values
+
+        if self._history is None:
+            self._history = np.full(self.window - 1, values[0], dtype=np.float64)
+
+        extended = np.concatenate([self._history, values])
+        self._history = extended[-(self.window - 1):]
+
+        return np.median(sliding_window_view(extended, self.window), axis=-1)
+
+    def reset(self) -> None:
+        self._history = None
+
+
+class LowPass:
+
+    """
+    First order IIR low-pass filter y[n] = a * y[n-1] + (1 - a) * x[n], with
+    a = exp(-2 pi cutoff / sample_rate) and the first sample as initial state.
+
+    The recursion is evaluated per segment in closed form: y[k] = a^(k+1) y[-1] +
+    (1 - a) a^k cumsum(x[j] / a^j). The segments are short enough that a^k stays
+    above 1e-6, which bounds the loss of precision of the cumulative sum.
+    """
+
+    def __init__(self, cutoff: float, sample_rate: float):
+
+        """Initializes the filter, cutoff frequency and sample rate in Hz."""
+
+        if not 0 < cutoff < sample_rate / 2:
+            raise ValueError("The cutoff frequency should be between 0 and half the sample rate")
+
+        self.cutoff = cutoff
+        self.sample_rate = sample_rate
+        self.a = math.exp(-2.0 * math.pi * cutoff / sample_rate)
+        self._segment = min(max(1, int(math.log(1e-6) / math.log(self.a))), 65536)
+        self._powers = self.a ** np.arange(self._segment, dtype=np.float64)
+        self._state = None
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+
+        """Returns the filtered block."""
+
+        if len(values) == 0:
+            return values
+
+        if self._state is None:
+            self._state = float(values[0])
+
+        output = np.empty(len(values), dtype=np.float64)
+
+        for start in range(0, len(values), self._segment):
+            segment = values[start:start + self._segment]
+            powers = self._powers[:len(segment)]
+            output[start:start + len(segment)] = powers * (self.a * self._state + (1.0 - self.a) * np.cumsum(segment / powers))
+            self._state = float(output[start + len(segment) - 1])
+
+        # A non-finite input only affects the rest of its block: the next block starts again
+        if not math.isfinite(self._state):
+            self._state = None
+
+        return output
+
+    def reset(self) -> None:
+        self._state = None
+
+
+class Derivative:
+
+    """
+    Change per second over a span of samples: (y[n] - y[n-span]) / (t[n] - t[n-span]).
+    A longer span averages out the noise that is left after the low-pass filter.
+    The output is 0 until the first span is complete.
+    """
+
+    def __init__(self, span: int = 1):
+
+        """Initializes the derivative, span in samples."""
+
+        if span < 1:
+            raise ValueError("The span should be at least 1 sample")
+
+        self.span = span
+        self._timestamps = None # Last span timestamps
+        self._values = None # Last span values
+
+    def process(self, timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+
+        """Returns the derivative of a block, per second."""
+
+        if len(values) == 0:
+            return values
+
+        if self._values is None:
+            self._timestamps = np.full(self.span, timestamps[0], dtype=np.int64)
+            self._values = np.full(self.span, values[0], dtype=np.float64)
+
+        times = np.concatenate([self._timestamps, timestamps])
+        extended = np.concatenate([self._values, values])
+        self._timestamps = times[-self.span:]
+        self._values = extended[-self.span:]
+
+        duration = (times[self.span:] - times[:-self.span]) / 1e9
+        change = extended[self.span:] - extended[:-self.span]
+
+        return np.divide(change, duration, out=np.zeros(len(values), dtype=np.float64), where=duration > 0)
+
+    def reset(self) -> None:
+        self._timestamps = None
+        self._values = None
+
+
+class Pipeline:
+
+    """Stages applied after each other to every block."""
+
+    def __init__(self, stages: list):
+
+        """Initializes the pipeline."""
+
+        self.stages = stages
+        self.samples = 0
+        self.blocks = 0
+
+    def process(self, timestamps, values) -> np.ndarray:
+
+        """Returns the output of the last stage for a block."""
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        for stage in self.stages:
+            values = stage.process(timestamps, values)
+
+        self.samples += len(values)
+        self.blocks += 1
+
+        return values
+
+    def reset(self) -> None:
+
+        """Resets the state of all stages, for example after a gap in the samples."""
+
+        for stage in self.stages:
+            stage.reset()
+
+
+class LoadCellProcessor:
+
+    """
+    Weight and mass flow rate of a load cell under a container that is emptied.
+
+    weight = low-pass(median(gain * (raw - offset)))
+    mass flow rate = -d(weight)/dt, the weight loss per second
+
+    With gain = 1 and the load in kg the mass flow rate is in kg/s. Non-finite
+    samples (a missing or bad value) are dropped before the filters and counted.
+    """
+
+    def __init__(self, sample_rate: float, offset: float = 0.0, gain: float = 1.0, median_window: int = 5,
+                 cutoff: float = 2.0, span: int = 1):
+
+        """Initializes the processor, sample rate and cutoff frequency in Hz, median window and span in samples."""
+
+        self.offset = Offset(offset)
+        self.weight = Pipeline([self.offset, Gain(gain), MovingMedian(median_window), LowPass(cutoff, sample_rate)])
+        self.derivative = Derivative(span)
+        self.invalid = 0 # Dropped non-finite samples
+
+    def process(self, timestamps, values) -> tuple:
+
+        """Returns the timestamps, the weight and the mass flow rate of the finite samples of a block of raw samples."""
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+
+        if not finite.all():
+            self.invalid += int(np.count_nonzero(~finite))
+            timestamps = timestamps[finite]
+            values = values[finite]
+
+        weight = self.weight.process(timestamps, values)
+
+        return timestamps, weight, -self.derivative.process(timestamps, weight)
+
+    def tare(self) -> None:
+
+        """Takes the last raw sample as zero."""
+
+        self.offset.tare()
+
+    def reset(self) -> None:
+
+        """Resets the filters, the offset is kept."""
+
+        self.weight.reset()
+        self.derivative.reset()
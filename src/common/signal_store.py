@@ -0,0 +1,576 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Compact binary storage for recorded signals.
+
+One file holds one signal (one column): timestamps as int64 nanoseconds since
+the Unix epoch (UTC) and values as float64 or bool. Samples are stored in
+chunks. Each chunk holds the delta encoded timestamps and the values, both
+byte-shuffled and compressed with zlib. The file ends with an index with the first and last
+timestamp, the offset and the number of samples of every chunk.
+
+File layout:
+    file header     : magic, value type, name
+    chunk 0..n-1    : chunk header, timestamps, values
+    index           : (t_first, t_last, offset, count) per chunk
+    trailer         : index offset, number of chunks, magic
+
+Readers memory-map the file and only decompress the chunks that overlap with
+the requested time range. If the trailer is missing (e.g. after a crash) the
+index is rebuilt by scanning the chunk headers.
+
+Usage from the command line:
+    python signal_store.py convert 20240528_ACE1.csv --date 2024-05-28
+    python signal_store.py info 20240528_ACE1_Load.sig
+"""
+
+import argparse
+import csv
+import mmap
+import os
+import re
+import struct
+import zlib
+from datetime import date, datetime, time, timedelta, timezone
+import numpy as np
+
+FILE_MAGIC = b"3DCPSIG1"
+CHUNK_MAGIC = b"CHNK"
+INDEX_MAGIC = b"3DCPIDX1"
+
+FILE_HEADER = struct.Struct("<8ssH") # magic, value type, name length
+CHUNK_HEADER = struct.Struct("<4sIqqII") # magic, count, t_first, t_last, timestamp bytes, value bytes
+TRAILER = struct.Struct("<qq8s") # index offset, number of chunks, magic
+INDEX_DTYPE = np.dtype([("t_first", "<i8"), ("t_last", "<i8"), ("offset", "<i8"), ("count", "<i8")])
+
+VALUE_TYPES = {"float64": b"d", "bool": b"?"}
+VALUE_DTYPES = {b"d": np.dtype("<f8"), b"?": np.dtype("bool")}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class SignalWriter:
+
+    """
+    Writes a signal to a chunked binary file.
+
+    Samples are collected in memory and written as a chunk of `chunk_size` samples.
+    An existing file is opened in append mode. Timestamps should be increasing.
+    """
+
+    def __init__(self, file: str, value_type: str = "float64", chunk_size: int = 8192, name: str = None, compression_level: int = 6):
+
+        """Initializes the signal writer."""
+
+        if value_type not in VALUE_TYPES:
+            raise ValueError("Unknown value type: {}".format(value_type))
+
+        self.file = file
+        self.value_type = value_type
+        self.chunk_size = chunk_size
+        self.name = name if name is not None else os.path.splitext(os.path.basename(file))[0]
+        self.compression_level = compression_level
+        self.dtype = VALUE_DTYPES[VALUE_TYPES[value_type]]
+
+        self._timestamps = []
+        self._values = []
+        self._index = []
+        self._handle = None
+
+        # Counters
+        self.samples_written = 0
+        self.chunks_written = 0
+        self.bytes_written = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self) -> None:
+
+        """Opens the file. Creates the file or continues an existing file."""
+
+        if self._handle is not None:
+            return
+
+        if os.path.exists(self.file) and os.path.getsize(self.file) > 0:
+            reader = SignalReader(self.file)
+            if VALUE_TYPES[self.value_type] != reader.type_code:
+                reader.close()
+                raise ValueError("Value type of {0} is {1}".format(self.file, reader.value_type))
+            self._index = [tuple(int(x) for x in entry) for entry in reader.index]
+            end = reader.data_end
+            reader.close()
+
+            # Remove the index and trailer, they are written again on close
+            self._handle = open(self.file, "r+b")
+            self._handle.truncate(end)
+            self._handle.seek(end)
+
+        else:
+            name = self.name.encode("utf-8")
+            self._handle = open(self.file, "wb")
+            self._handle.write(FILE_HEADER.pack(FILE_MAGIC, VALUE_TYPES[self.value_type], len(name)))
+            self._handle.write(name)
+
+    def append(self, timestamp: int, value) -> None:
+
+        """Appends a sample. The timestamp is in nanoseconds since the Unix epoch."""
+
+        self._timestamps.append(timestamp)
+        self._values.append(value)
+
+        if len(self._timestamps) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, timestamps, values) -> None:
+
+        """Appends multiple samples."""
+
+        self._timestamps.extend(timestamps)
+        self._values.extend(values)
+
+        if len(self._timestamps) >= self.chunk_size:
+            self.flush()
+
+    def write_row(self, row: tuple) -> bool:
+
+        """Appends a (datetime, value) sample, compatible with the rows of the CSV logger."""
+
+        self.append(to_nanoseconds(row[0]), row[1])
+
+        return True
+
+    def write_rows(self, rows) -> int:
+
+        """Appends multiple (datetime, value) samples."""
+
+        for row in rows:
+            self.write_row(row)
+
+        return 0
+
+    def get_stats(self) -> dict:
+
+        """Returns the counters of this writer."""
+
+        return {
+            "file": self.file,
+            "rows_written": self.samples_written,
+            "rows_dropped": 0,
+            "chunks_written": self.chunks_written,
+            "bytes_written": self.bytes_written,
+            "queue_depth": len(self._timestamps),
+            "last_flush_latency": 0.0}
+
+    def flush(self) -> None:
+
+        """Writes the collected samples as chunks of at most `chunk_size` samples."""
+
+        if len(self._timestamps) == 0:
+            return
+
+        if self._handle is None:
+            self.open()
+
+        timestamps = np.asarray(self._timestamps, dtype="<i8")
+        values = np.asarray(self._values, dtype=self.dtype)
+        self._timestamps = []
+        self._values = []
+
+        for i in range(0, len(timestamps), self.chunk_size):
+            self._write_chunk(timestamps[i:i+self.chunk_size], values[i:i+self.chunk_size])
+
+        self._handle.flush()
+
+    def _write_chunk(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+
+        """Writes a single chunk and adds it to the index."""
+
+        offset = self._handle.tell()
+        chunk = encode_chunk(timestamps, values, self.compression_level)
+        self._handle.write(chunk)
+
+        self._index.append((int(timestamps[0]), int(timestamps[-1]), offset, len(timestamps)))
+        self.samples_written += len(timestamps)
+        self.chunks_written += 1
+        self.bytes_written += len(chunk)
+
+    def close(self) -> None:
+
+        """Writes the remaining samples and the index and closes the file."""
+
+        if self._handle is None and len(self._timestamps) == 0:
+            return
+
+        self.flush()
+
+        index = np.array(self._index, dtype="<i8").reshape(-1, 4)
+        index_offset = self._handle.tell()
+        self._handle.write(index.tobytes())
+        self._handle.write(TRAILER.pack(index_offset, len(self._index), INDEX_MAGIC))
+        self._handle.close()
+        self._handle = None
+
+
+class SignalReader:
+
+    """
+    Reads a signal file written by the SignalWriter.
+
+    The file is memory-mapped and only the chunks that overlap with the
+    requested time range are decompressed.
+    """
+
+    def __init__(self, file: str):
+
+        """Initializes the signal reader."""
+
+        self.file = file
+        self._handle = open(file, "rb")
+        self._map = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, type_code, length = FILE_HEADER.unpack_from(self._map, 0)
+
+        if magic != FILE_MAGIC:
+            self.close()
+            raise ValueError("{} is not a signal file".format(file))
+
+        self.type_code = type_code
+        self.dtype = VALUE_DTYPES[type_code]
+        self.value_type = {code: name for name, code in VALUE_TYPES.items()}[type_code]
+        self.name = bytes(self._map[FILE_HEADER.size:FILE_HEADER.size+length]).decode("utf-8")
+        self._data_start = FILE_HEADER.size + length
+        self.index, self.data_end = self._read_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return int(self.index["count"].sum())
+
+    @property
+    def start(self) -> int:
+
+        """First timestamp in the file."""
+
+        return int(self.index["t_first"][0]) if len(self.index) > 0 else None
+
+    @property
+    def end(self) -> int:
+
+        """Last timestamp in the file."""
+
+        return int(self.index["t_last"][-1]) if len(self.index) > 0 else None
+
+    def read(self, start=None, end=None) -> tuple:
+
+        """
+        Returns the timestamps and values between start and end (both inclusive).
+        Start and end are nanoseconds since the Unix epoch or datetime objects.
+        """
+
+        start = to_nanoseconds(start) if isinstance(start, datetime) else start
+        end = to_nanoseconds(end) if isinstance(end, datetime) else end
+
+        # Chunks that overlap with the time range
+        first = 0 if start is None else int(np.searchsorted(self.index["t_last"], start, side="left"))
+        last = len(self.index) if end is None else int(np.searchsorted(self.index["t_first"], end, side="right"))
+
+        timestamps = []
+        values = []
+
+        for entry in self.index[first:last]:
+            t, v = decode_chunk(self._map, int(entry["offset"]), self.dtype)
+            timestamps.append(t)
+            values.append(v)
+
+        if len(timestamps) == 0:
+            return np.empty(0, dtype="<i8"), np.empty(0, dtype=self.dtype)
+
+        timestamps = np.concatenate(timestamps)
+        values = np.concatenate(values)
+
+        # Slice the first and last chunk
+        i = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        j = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="right"))
+
+        return timestamps[i:j], values[i:j]
+
+    def read_page(self, start: int = None, end: int = None, count: int = 1000, reverse: bool = False) -> tuple:
+
+        """
+        Returns at most `count` samples between start and end (both inclusive,
+        nanoseconds since the Unix epoch), the oldest first or with reverse the
+        newest first. Only the chunks up to the last returned sample are decompressed.
+        """
+
+        first = 0 if start is None else int(np.searchsorted(self.index["t_last"], start, side="left"))
+        last = len(self.index) if end is None else int(np.searchsorted(self.index["t_first"], end, side="right"))
+        chunks = range(last - 1, first - 1, -1) if reverse else range(first, last)
+
+        timestamps = []
+        values = []
+        n = 0
+
+        for k in chunks:
+            t, v = decode_chunk(self._map, int(self.index["offset"][k]), self.dtype)
+            i = 0 if start is None else int(np.searchsorted(t, start, side="left"))
+            j = len(t) if end is None else int(np.searchsorted(t, end, side="right"))
+            t, v = (t[i:j][::-1], v[i:j][::-1]) if reverse else (t[i:j], v[i:j])
+            timestamps.append(t[:count-n])
+            values.append(v[:count-n])
+            n += len(timestamps[-1])
+            if n >= count:
+                break
+
+        if len(timestamps) == 0:
+            return np.empty(0, dtype="<i8"), np.empty(0, dtype=self.dtype)
+
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def refresh(self) -> bool:
+
+        """
+        Maps the file again if its size changed, for files that are still written.
+        Only the chunk headers after the known chunks are read. Returns True if the size changed.
+        """
+
+        size = os.fstat(self._handle.fileno()).st_size
+
+        if size == len(self._map):
+            return False
+
+        self._map.close()
+        self._map = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if size >= self.data_end:
+            self.index, self.data_end = self._read_index(self.index, self.data_end)
+        else:
+            self.index, self.data_end = self._read_index()
+
+        return True
+
+    def close(self) -> None:
+
+        """Closes the file."""
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def _read_index(self, index: np.ndarray = None, offset: int = None) -> tuple:
+
+        """
+        Reads the index from the trailer or rebuilds it from the chunk headers.
+        A known index and its end offset can be given, then only the chunks after it are scanned.
+        """
+
+        size = len(self._map)
+
+        if size >= self._data_start + TRAILER.size:
+            index_offset, count, magic = TRAILER.unpack_from(self._map, size - TRAILER.size)
+            if magic == INDEX_MAGIC and index_offset + count * INDEX_DTYPE.itemsize == size - TRAILER.size:
+                index = np.frombuffer(self._map, dtype=INDEX_DTYPE, count=count, offset=index_offset).copy()
+                return index, index_offset
+
+        # No valid trailer: scan the chunks, an incomplete last chunk is ignored
+        entries = []
+        offset = self._data_start if offset is None else offset
+
+        while offset + CHUNK_HEADER.size <= size:
+            magic, count, t_first, t_last, ts_bytes, value_bytes = CHUNK_HEADER.unpack_from(self._map, offset)
+            length = CHUNK_HEADER.size + ts_bytes + value_bytes
+            if magic != CHUNK_MAGIC or offset + length > size:
+                break
+            entries.append((t_first, t_last, offset, count))
+            offset += length
+
+        entries = np.array(entries, dtype=INDEX_DTYPE)
+
+        return (entries if index is None else np.concatenate([index, entries])), offset
+
+
+def encode_chunk(timestamps: np.ndarray, values: np.ndarray, compression_level: int = 6) -> bytes:
+
+    """Encodes a chunk: delta encoded timestamps and values, both compressed."""
+
+    deltas = np.diff(timestamps, prepend=timestamps[0])
+    ts_bytes = zlib.compress(shuffle(deltas.astype("<i8")), compression_level)
+
+    if values.dtype == np.bool_:
+        value_bytes = zlib.compress(np.packbits(values).tobytes(), compression_level)
+    else:
+        value_bytes = zlib.compress(shuffle(values.astype("<f8")), compression_level)
+
+    header = CHUNK_HEADER.pack(CHUNK_MAGIC, len(timestamps), int(timestamps[0]), int(timestamps[-1]), len(ts_bytes), len(value_bytes))
+
+    return header + ts_bytes + value_bytes
+
+
+def decode_chunk(buffer, offset: int, dtype: np.dtype) -> tuple:
+
+    """Decodes the chunk at the given offset. Returns the timestamps and values."""
+
+    magic, count, t_first, t_last, ts_bytes, value_bytes = CHUNK_HEADER.unpack_from(buffer, offset)
+    start = offset + CHUNK_HEADER.size
+
+    if magic != CHUNK_MAGIC:
+        raise ValueError("No chunk at offset {}".format(offset))
+
+    deltas = unshuffle(zlib.decompress(buffer[start:start+ts_bytes]), "<i8")
+    timestamps = t_first + np.cumsum(deltas)
+    raw = zlib.decompress(buffer[start+ts_bytes:start+ts_bytes+value_bytes])
+
+    if dtype == np.bool_:
+        values = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), count=count).astype(bool)
+    else:
+        values = unshuffle(raw, "<f8")
+
+    return timestamps, values
+
+
+def shuffle(array: np.ndarray) -> bytes:
+
+    """Groups the n-th bytes of all 8 byte values together, this compresses much better."""
+
+    return np.ascontiguousarray(array.view(np.uint8).reshape(-1, 8).T).tobytes()
+
+
+def unshuffle(raw: bytes, dtype: str) -> np.ndarray:
+
+    """Reverses shuffle()."""
+
+    return np.ascontiguousarray(np.frombuffer(raw, dtype=np.uint8).reshape(8, -1).T).view(dtype).ravel()
+
+
+def to_nanoseconds(time: datetime) -> int:
+
+    """Converts a datetime to nanoseconds since the Unix epoch. Naive datetimes are local time."""
+
+    if time.tzinfo is None:
+        time = time.astimezone()
+
+    return (time - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def to_datetime(timestamp: int) -> datetime:
+
+    """Converts nanoseconds since the Unix epoch (also a numpy.int64) to an aware datetime in UTC."""
+
+    return EPOCH + timedelta(microseconds=int(timestamp) // 1000)
+
+
+def convert_csv(file: str, day: date = None, output: str = None, chunk_size: int = 8192) -> list:
+
+    """
+    Converts a CSV database (as written by create_database) to signal files.
+
+    Every column after the time column is written to its own file:
+    <csv name>_<column>.sig. The time column only holds the time of day, the date
+    is taken from the `day` argument or from the YYYYMMDD prefix of the file name.
+    Times that go back are taken as a pass of midnight. Returns the written files.
+    """
+
+    if day is None:
+        match = re.match(r"(\d{8})", os.path.basename(file))
+        if match is None:
+            raise ValueError("No date given and no date found in the file name of {}".format(file))
+        day = datetime.strptime(match.group(1), "%Y%m%d").date()
+
+    base = output if output is not None else os.path.splitext(file)[0]
+
+    with open(file, newline='') as handle:
+        reader = csv.reader(handle, delimiter=',', quotechar='|')
+        header = next(reader)
+        columns = [[] for _ in header[1:]]
+        timestamps = []
+        day_offset = timedelta(0)
+        last = None
+
+        for row in reader:
+            if len(row) < len(header):
+                continue
+            t = datetime.combine(day, parse_time(row[0])) + day_offset
+            if last is not None and t < last - timedelta(hours=12):
+                day_offset += timedelta(days=1)
+                t += timedelta(days=1)
+            last = t
+            timestamps.append(to_nanoseconds(t))
+            for column, value in zip(columns, row[1:]):
+                column.append(float(value))
+
+    files = []
+
+    for name, values in zip(header[1:], columns):
+        signal = "{0}_{1}.sig".format(base, re.sub(r"[^\w\-]+", "_", name))
+        if os.path.exists(signal):
+            os.remove(signal)
+        with SignalWriter(signal, "float64", chunk_size, name=name) as writer:
+            writer.extend(timestamps, values)
+        files.append(signal)
+
+    return files
+
+
+def parse_time(text: str) -> time:
+
+    """Parses the time column of the CSV databases, with or without milliseconds."""
+
+    text = text.strip()
+
+    for fmt in ("%H:%M:%S.%f", "%H:%M:%S"):
+        try:
+            return datetime.strptime(text, fmt).time()
+        except ValueError:
+            pass
+
+    raise ValueError("Invalid time: {}".format(text))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Signal files of recorded OPC UA data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="Convert CSV databases to signal files.")
+    convert.add_argument("files", nargs="+")
+    convert.add_argument("--date", help="Date of the recording (YYYY-MM-DD), default from the file name.")
+    info = commands.add_parser("info", help="Show the contents of signal files.")
+    info.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        day = datetime.strptime(args.date, "%Y-%m-%d").date() if args.date else None
+        for file in args.files:
+            for signal in convert_csv(file, day):
+                print("{0} -> {1}".format(file, signal))
+
+    else:
+        for file in args.files:
+            with SignalReader(file) as reader:
+                print("{0}: {1} ({2}), {3} samples in {4} chunks, {5} - {6}".format(
+                    file, reader.name, reader.value_type, len(reader), len(reader.index),
+                    to_datetime(reader.start) if reader.start is not None else "-",
+                    to_datetime(reader.end) if reader.end is not None else "-"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import hashlib
+import json
+import logging
+import os
+from asyncua import Client, ua
+
+# Namespace array and build info of the server
+SERVER_NODES = [
+    ua.NodeId(ua.ObjectIds.Server_NamespaceArray),
+    ua.NodeId(ua.ObjectIds.Server_ServerStatus_BuildInfo_SoftwareVersion),
+    ua.NodeId(ua.ObjectIds.Server_ServerStatus_BuildInfo_BuildNumber),
+    ua.NodeId(ua.ObjectIds.Server_ServerStatus_BuildInfo_BuildDate)]
+
+
+class TagRegistry:
+
+    """
+    Maps logical tag names to node ids that are resolved on the server.
+
+    A tag is defined as:
+    - a node id string: "ns=4;i=22", used as is;
+    - a node id with a namespace URI: "nsu=http://www.siemens.com/simatic-s7-opcua;s=\"Velocity_Jog_left\"",
+      the namespace index is looked up in the namespace array of the server;
+    - a browse path from the Objects folder: {"namespace": uri, "path": ["Folder", "Variable"]},
+      the browse names are in the given namespace unless written as "index:Name".
+
+    All browse paths are resolved in one TranslateBrowsePathsToNodeIds request.
+    The result is cached on disk per endpoint, together with a signature of the
+    namespace array, the build info of the server and the tag definitions. On a
+    connect with the same signature no resolution requests are made at all.
+    """
+
+    def __init__(self, tags: dict, cache_file: str = None):
+
+        """Initializes the tag registry."""
+
+        self.tags = tags
+        self.cache_file = cache_file
+        self.node_ids = {} # Resolved node ids: name -> ua.NodeId
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.tags
+
+    def get_node_id(self, name: str, url: str = None) -> ua.NodeId:
+
+        """Returns the resolved node id, or the node id from the cache file if not resolved yet."""
+
+        node_id = self.node_ids.get(name)
+
+        if node_id is None and url is not None:
+            cached = self._load_cache().get(url, {}).get("nodes", {})
+            if name in cached:
+                node_id = ua.NodeId.from_string(cached[name])
+
+        return node_id if node_id is not None else ua.NodeId()
+
+    async def resolve(self, client: Client, url: str) -> dict:
+
+        """Resolves all tags on the server. Returns a dictionary name -> ua.NodeId."""
+
+        # One request for the namespace array and the server version
+        values = await client.read_values([client.get_node(node_id) for node_id in SERVER_NODES])
+        namespaces = values[0] or []
+        definitions = json.dumps(self.tags, sort_keys=True) # An edited tag is resolved again
+        signature = hashlib.sha1(json.dumps([str(value) for value in values] + [definitions]).encode("utf-8")).hexdigest()
+
+        # Cached result of the same server version
+        cache = self._load_cache()
+        entry = cache.get(url)
+
+        if entry is not None and entry.get("signature") == signature and set(entry["nodes"].keys()) == set(self.tags.keys()):
+            self.node_ids = {name: ua.NodeId.from_string(node_id) for name, node_id in entry["nodes"].items()}
+            logging.debug("Tags of {} loaded from the cache.".format(url))
+            return self.node_ids
+
+        node_ids = {}
+        paths = {}
+
+        for name, tag in self.tags.items():
+            if isinstance(tag, dict):
+                paths[name] = self._get_browse_path(tag, namespaces)
+            elif tag.startswith("nsu="):
+                node_ids[name] = self._get_node_id(tag, namespaces)
+            else:
+                node_ids[name] = ua.NodeId.from_string(tag)
+
+        # All browse paths in one request
+        if len(paths) > 0:
+            results = await client.uaclient.translate_browsepaths_to_nodeids(list(paths.values()))
+            for name, result in zip(paths.keys(), results):
+                if not result.StatusCode.is_good() or len(result.Targets) == 0:
+                    raise ua.UaError("Failed to resolve tag '{0}': {1}".format(name, result.StatusCode))
+                target = result.Targets[0].TargetId
+                node_ids[name] = ua.NodeId(target.Identifier, target.NamespaceIndex)
+
+        self.node_ids = node_ids
+        cache[url] = {"signature": signature, "nodes": {name: node_id.to_string() for name, node_id in node_ids.items()}}
+        self._save_cache(cache)
+        logging.info("Resolved {0} tags of {1}.".format(len(node_ids), url))
+
+        return self.node_ids
+
+    def _get_node_id(self, tag: str, namespaces: list) -> ua.NodeId:
+
+        """Converts a nsu=<uri>;<identifier> node id to a node id with the namespace index."""
+
+        uri, identifier = tag[4:].split(";", 1)
+
+        if uri not in namespaces:
+            raise ua.UaError("Namespace {} not found on the server".format(uri))
+
+        return ua.NodeId.from_string("ns={0};{1}".format(namespaces.index(uri), identifier))
+
+    def _get_browse_path(self, tag: dict, namespaces: list) -> ua.BrowsePath:
+
+        """Returns the browse path of a tag, relative to the Objects folder."""
+
+        uri = tag.get("namespace")
+        index = namespaces.index(uri) if uri in namespaces else None
+        elements = []
+
+        for name in tag["path"]:
+            if ":" in name and name.split(":", 1)[0].isdigit():
+                idx, name = name.split(":", 1)
+                idx = int(idx)
+            elif index is not None:
+                idx = index
+            else:
+                raise ua.UaError("Namespace {} not found on the server".format(uri))
+
+            element = ua.RelativePathElement()
+            element.ReferenceTypeId = ua.NodeId(ua.ObjectIds.HierarchicalReferences)
+            element.IsInverse = False
+            element.IncludeSubtypes = True
+            element.TargetName = ua.QualifiedName(name, idx)
+            elements.append(element)
+
+        path = ua.BrowsePath()
+        path.StartingNode = ua.NodeId(ua.ObjectIds.ObjectsFolder)
+        path.RelativePath = ua.RelativePath()
+        path.RelativePath.Elements = elements
+
+        return path
+
+    def _load_cache(self) -> dict:
+
+        """Loads the cache file."""
+
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return {}
+
+        try:
+            with open(self.cache_file) as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logging.warning("Failed to read the tag cache {0}: {1}".format(self.cache_file, e))
+            return {}
+
+    def _save_cache(self, cache: dict) -> None:
+
+        """Saves the cache file."""
+
+        if self.cache_file is None:
+            return
+
+        temp = self.cache_file + ".tmp"
+
+        try:
+            with open(temp, "w") as file:
+                json.dump(cache, file, indent=2)
+            os.replace(temp, self.cache_file)
+        except OSError as e:
+            logging.warning("Failed to save the tag cache {0}: {1}".format(self.cache_file, e))
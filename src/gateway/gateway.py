@@ -0,0 +1,542 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Gateway that mirrors the nodes of all machines behind one OPC UA endpoint.
+
+The gateway has one session per machine (upstream) with one subscription per
+group of nodes, see common/session_group.py. Every notification is written with
+its source timestamp and status to a variable in the address space of the
+gateway: ns=<namespace>;s=<upstream>.<name>, in a folder per upstream. Any
+number of clients (dashboards, recorders, scripts) subscribe to the gateway,
+the machines only see the gateway.
+
+Writes of clients to writable nodes are forwarded to the machine, the client
+gets the status of the upstream write. The mirrored value follows with the next
+notification of the machine.
+
+The gateway listens on 127.0.0.1 by default. On another address "security"
+is needed if any node is writable: the server policy and its certificate and
+private key, and the users that may log in (anonymous clients are refused).
+The users have read and write access.
+
+A node is stale if its machine is not connected, or if it has "stale_after"
+and didn't change for that many seconds (for values that change continuously,
+such as a livebit). The value of a stale node keeps its last value with the
+status UncertainLastUsableValue, until the next notification. The stale nodes
+are logged and, with "metrics", served with the age of every value (see common/metrics.py).
+
+Config:
+    {
+        "endpoint": "opc.tcp://0.0.0.0:4840/gateway/",
+        "security": {"policy": "Basic256Sha256", "certificate": "gateway.der", "private_key": "gateway.pem",
+                     "users": {"operator": "password"}},
+        "log_interval": 10,
+        "metrics": {"port": 9101},
+        "upstreams": {
+            "material": {
+                "url": "opc.tcp://10.129.4.30:4840",
+                "subscriptions": [{
+                    "publishing_interval": 100, "sampling_interval": 50,
+                    "nodes": {"Status": "ns=2;i=90",
+                              "AO0": {"node_id": "ns=4;i=78", "writable": true},
+                              "Livebit": {"node_id": "ns=4;i=20", "stale_after": 5.0}}}]}}}
+
+The upstream config is the endpoint config of the recorder: url, user, password,
+connect_timeout and security, with the same monitoring settings per subscription
+and node (sampling_interval, queuesize, trigger and deadband, see
+common/monitoring.py). Relative paths are relative to the config file.
+
+Usage: python gateway.py gateway_config.json
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+from asyncua import Node, Server, ua
+from asyncua.crypto.permission_rules import User, UserRole
+from asyncua.server.address_space import AttributeService
+from asyncua.server.user_managers import UserManager
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import STATE_CONNECTED, ConnectionManager, create_connection
+from metrics import MetricsRegistry, MetricsServer, register_connection
+from monitoring import load_monitoring, log_savings
+from session_group import SessionGroup
+
+# Defaults of the config file
+ENDPOINT = "opc.tcp://127.0.0.1:4840/gateway/"
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1") # Without security writable nodes are only served on these hosts
+NAMESPACE = "urn:3dcp-tue:python-opc-ua:gateway"
+LOG_INTERVAL = 10.0 # [FLOAT: seconds]
+PUBLISHING_INTERVAL = 100 # [FLOAT: milliseconds]
+STALE_CHECK_INTERVAL = 0.5 # [FLOAT: seconds]
+
+
+class MirroredNode:
+
+    """Upstream node and its variable in the gateway."""
+
+    def __init__(self, name: str, node_id: str, local_id: ua.NodeId, writable: bool = False, stale_after: float = None):
+
+        """Initializes the mirrored node."""
+
+        self.name = name
+        self.node_id = node_id
+        self.local_id = local_id
+        self.writable = writable
+        self.stale_after = stale_after
+        self.value = None # Last DataValue of the upstream node
+        self.typed = False # True if the data type of the variable is set
+        self.last_update = None # Monotonic time of the last notification
+        self.stale = True
+        self.stale_task = None # Write of the stale status in flight, superseded by a new value
+        self.notifications = 0
+        self.writes = 0
+        self.write_errors = 0
+
+    def get_age(self) -> float:
+
+        """Returns the time since the last notification [s], None before the first."""
+
+        return time.monotonic() - self.last_update if self.last_update is not None else None
+
+
+class UpstreamMirror:
+
+    """
+    Mirrors the nodes of one machine: subscribes to them, writes the
+    notifications to the variables of the gateway and forwards writes.
+    """
+
+    def __init__(self, name: str, connection: ConnectionManager, server: Server, namespace: int):
+
+        """Initializes the mirror of an upstream endpoint."""
+
+        self.name = name
+        self.connection = connection
+        self.server = server
+        self.namespace = namespace
+        self.nodes = {} # Configured node id -> MirroredNode
+        self.folder = None
+        self._mirrored = None # Node id object of the session -> MirroredNode, known after connect
+        self._types_read = False
+        self._types_task = None
+
+        connection.add_listener(self.on_state_change)
+
+    def add_subscription(self, config: dict) -> None:
+
+        """Adds a subscription from the config, the variables are created by create_variables()."""
+
+        node_ids = []
+        monitoring, settings = load_monitoring(config)
+
+        for name, node in config["nodes"].items():
+            if isinstance(node, str):
+                node = {"node_id": node}
+            node_id = node["node_id"]
+            local_id = ua.NodeId("{0}.{1}".format(self.name, name), self.namespace)
+            self.nodes[node_id] = MirroredNode(name, node_id, local_id, node.get("writable", False), node.get("stale_after"))
+            node_ids.append(node_id)
+
+        self.connection.add_subscription(config.get("publishing_interval", PUBLISHING_INTERVAL), self, node_ids,
+                                         settings=settings or None, monitoring=monitoring)
+
+    async def create_variables(self) -> None:
+
+        """
+        Creates the folder and the variables. The data type is BaseDataType until
+        the first value arrives or the data types of the upstream nodes are read.
+        """
+
+        self.folder = await self.server.nodes.objects.add_folder(self.namespace, self.name)
+
+        for node in self.nodes.values():
+            variable = await self.folder.add_variable(node.local_id, node.name, ua.Variant(), datatype=ua.NodeId(ua.ObjectIds.BaseDataType))
+            await self.server.write_attribute_value(node.local_id, ua.DataValue(StatusCode=ua.StatusCode(ua.StatusCodes.BadWaitingForInitialData)))
+            if node.writable:
+                await variable.set_writable()
+
+    async def datachange_notification(self, node: Node, val, data):
+
+        """
+        Called for every datachange notification from server.
+        """
+
+        if self._mirrored is None:
+            self._mirrored = {self.connection.get_node(node_id).nodeid: mirrored for node_id, mirrored in self.nodes.items()}
+
+        mirrored = self._mirrored.get(node.nodeid)
+
+        if mirrored is None:
+            return
+
+        value = data.monitored_item.Value
+
+        # The server only accepts values of the data type of the variable
+        if not mirrored.typed and value.Value is not None and value.Value.VariantType != ua.VariantType.Null:
+            await self.server.write_attribute_value(mirrored.local_id, ua.DataValue(ua.NodeId(value.Value.VariantType.value)), ua.AttributeIds.DataType)
+            mirrored.typed = True
+
+        # A new value supersedes a stale status that is not written yet
+        if mirrored.stale_task is not None and not mirrored.stale_task.done():
+            mirrored.stale_task.cancel()
+
+        mirrored.value = value
+        mirrored.last_update = time.monotonic()
+        mirrored.stale = False
+        mirrored.notifications += 1
+
+        await self.server.write_attribute_value(mirrored.local_id, ua.DataValue(
+            value.Value, StatusCode=value.StatusCode, SourceTimestamp=value.SourceTimestamp,
+            SourcePicoseconds=value.SourcePicoseconds, ServerTimestamp=datetime.now(timezone.utc)))
+
+    def event_notification(self, event: ua.EventNotificationList):
+
+        """
+        Called for every event notification from server.
+        """
+
+        pass
+
+    def status_change_notification(self, status: ua.StatusChangeNotification):
+
+        """
+        Called for every status change notification from server.
+        """
+
+        pass
+
+    def on_state_change(self, state: str, reason: str) -> None:
+
+        """Marks all nodes stale when the connection is lost, reads the data types on the first connect."""
+
+        if state == STATE_CONNECTED:
+            if not self._types_read and (self._types_task is None or self._types_task.done()):
+                self._types_task = asyncio.ensure_future(self._read_data_types())
+            return
+
+        for node in self.nodes.values():
+            if not node.stale:
+                self._mark_stale(node)
+
+    def check_staleness(self) -> list:
+
+        """Marks the nodes that didn't change within their stale_after as stale. Returns all stale nodes."""
+
+        connected = self.connection.connected.is_set()
+
+        for node in self.nodes.values():
+            if node.stale or not connected or node.stale_after is None:
+                continue
+            if node.get_age() > node.stale_after:
+                self._mark_stale(node)
+
+        return [node for node in self.nodes.values() if node.stale]
+
+    async def write(self, node: MirroredNode, datavalue: ua.DataValue) -> ua.StatusCode:
+
+        """Writes a value to the upstream node, without timestamps (most PLCs reject them). Returns the status."""
+
+        if not self.connection.connected.is_set():
+            node.write_errors += 1
+            return ua.StatusCode(ua.StatusCodes.BadNotConnected)
+
+        params = ua.WriteParameters()
+        params.NodesToWrite.append(ua.WriteValue(NodeId=self.connection.get_node(node.node_id).nodeid,
+                                                 AttributeId=ua.AttributeIds.Value, Value=ua.DataValue(datavalue.Value)))
+
+        try:
+            status = (await self.connection.client.uaclient.write(params))[0]
+        except Exception as e:
+            logging.warning("%s: write of %s failed: %s", self.name, node.name, e)
+            node.write_errors += 1
+            return ua.StatusCode(ua.StatusCodes.BadCommunicationError)
+
+        node.writes += 1
+
+        if not status.is_good():
+            node.write_errors += 1
+
+        return status
+
+    def get_stats(self) -> dict:
+
+        """Returns the mirror and connection statistics of the upstream."""
+
+        stats = self.connection.get_stats()
+        stats.update({
+            "nodes": len(self.nodes),
+            "stale": sum(node.stale for node in self.nodes.values()),
+            "notifications": sum(node.notifications for node in self.nodes.values()),
+            "writes": sum(node.writes for node in self.nodes.values()),
+            "write_errors": sum(node.write_errors for node in self.nodes.values())})
+
+        return stats
+
+    def _mark_stale(self, node: MirroredNode) -> None:
+
+        """Marks a node as stale and writes the stale status, one write in flight per node."""
+
+        node.stale = True
+
+        if node.stale_task is None or node.stale_task.done():
+            node.stale_task = asyncio.ensure_future(self._set_stale(node))
+
+    async def _set_stale(self, node: MirroredNode) -> None:
+
+        """Keeps the last value of a node with the status UncertainLastUsableValue."""
+
+        # Not stale anymore if a new value arrived in the meantime
+        if not node.stale or node.value is None or node.value.Value is None:
+            return
+
+        await self.server.write_attribute_value(node.local_id, ua.DataValue(
+            node.value.Value, StatusCode=ua.StatusCode(ua.StatusCodes.UncertainLastUsableValue),
+            SourceTimestamp=node.value.SourceTimestamp, ServerTimestamp=datetime.now(timezone.utc)))
+
+    async def _read_data_types(self) -> None:
+
+        """Copies the data types of the upstream nodes to the variables, in one read."""
+
+        self._types_read = True
+        nodes = list(self.nodes.values())
+
+        try:
+            types = await self.connection.client.read_attributes([self.connection.get_node(node.node_id) for node in nodes], ua.AttributeIds.DataType)
+        except Exception as e:
+            logging.warning("%s: reading the data types failed: %s", self.name, e)
+            self._types_read = False
+            return
+
+        for node, data_type in zip(nodes, types):
+            if data_type.StatusCode is None or data_type.StatusCode.is_good():
+                await self.server.write_attribute_value(node.local_id, data_type, ua.AttributeIds.DataType)
+                node.typed = True
+
+
+class GatewayAttributeService(AttributeService):
+
+    """
+    Attribute service of the gateway server: writes to the value of a mirrored
+    node are forwarded to the machine, all other writes are handled by the server.
+    """
+
+    def __init__(self, aspace, mirrors: list):
+
+        """Initializes the attribute service with the mirrors of all upstreams."""
+
+        super().__init__(aspace)
+        self.nodes = {node.local_id: (mirror, node) for mirror in mirrors for node in mirror.nodes.values()}
+
+    async def write(self, params: ua.WriteParameters, user: User = User(role=UserRole.Admin)) -> list:
+
+        """Writes the values, the mirrored nodes concurrently."""
+
+        results = [None] * len(params.NodesToWrite)
+        local = ua.WriteParameters()
+        local_indices = []
+        forwards = []
+
+        for i, write_value in enumerate(params.NodesToWrite):
+            item = self.nodes.get(write_value.NodeId)
+
+            if item is None or write_value.AttributeId != ua.AttributeIds.Value:
+                local.NodesToWrite.append(write_value)
+                local_indices.append(i)
+            elif not item[1].writable:
+                results[i] = ua.StatusCode(ua.StatusCodes.BadNotWritable)
+            else:
+                forwards.append((i, item[0].write(item[1], write_value.Value)))
+
+        if len(forwards) > 0:
+            for (i, _), status in zip(forwards, await asyncio.gather(*[forward for _, forward in forwards])):
+                results[i] = status
+
+        if len(local.NodesToWrite) > 0:
+            statuses = await super().write(local, user)
+            for i, status in zip(local_indices, statuses):
+                results[i] = status
+
+        return results
+
+
+class GatewayUserManager(UserManager):
+
+    """Users of the gateway server with a password, anonymous clients are refused."""
+
+    def __init__(self, users: dict):
+
+        """Initializes the user manager with a dictionary user name -> password."""
+
+        self.users = users
+
+    def get_user(self, iserver, username: str = None, password: str = None, certificate = None) -> User:
+        expected = self.users.get(username) if username is not None else None
+        if expected is None or password is None or not hmac.compare_digest(str(password), str(expected)):
+            return None
+        return User(role=UserRole.User, name=username)
+
+
+async def check_staleness(mirrors: list, interval: float) -> None:
+
+    """Checks the staleness of the nodes every interval."""
+
+    while True:
+        await asyncio.sleep(interval)
+
+        for mirror in mirrors:
+            mirror.check_staleness()
+
+
+async def log_stats(server: Server, mirrors: list, interval: float) -> None:
+
+    """Logs the state of every upstream and the stale nodes every interval."""
+
+    last_time = time.monotonic()
+    last = {mirror.name: 0 for mirror in mirrors}
+
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+
+        for mirror in mirrors:
+            stats = mirror.get_stats()
+            rate = (stats["notifications"] - last[mirror.name]) / (now - last_time)
+            last[mirror.name] = stats["notifications"]
+            logging.info("%s: %s, %d nodes, %.0f notifications/s, stale: %d, writes: %d (%d failed), reconnects: %d",
+                         mirror.name, stats["state"], stats["nodes"], rate, stats["stale"], stats["writes"], stats["write_errors"], stats["reconnects"])
+
+            stale = [node.name for node in mirror.nodes.values() if node.stale]
+
+            if 0 < len(stale) < len(mirror.nodes):
+                logging.warning("%s: stale nodes: %s", mirror.name, ", ".join(stale))
+
+            log_savings(mirror.connection)
+
+        logging.info("Downstream subscriptions: %d", len(server.iserver.subscription_service.subscriptions))
+        last_time = now
+
+
+def register_mirror(registry: MetricsRegistry, mirror: UpstreamMirror) -> None:
+
+    """Registers the staleness, the age of the value and the writes of every node of a mirror."""
+
+    register_connection(registry, mirror.name, mirror.connection)
+
+    for node in mirror.nodes.values():
+        labels = {"endpoint": mirror.name, "item": node.name}
+        registry.gauge("gateway_stale", "1 if the mirrored value is stale.", lambda node=node: node.stale, labels)
+        registry.gauge("gateway_value_age_seconds", "Time since the last notification of the node.", node.get_age, labels)
+        registry.counter_function("gateway_notifications_total", "Notifications mirrored per node.", lambda node=node: node.notifications, labels)
+        if node.writable:
+            registry.counter_function("gateway_writes_total", "Writes forwarded to the machine per node.", lambda node=node: node.writes, labels)
+            registry.counter_function("gateway_write_errors_total", "Failed forwarded writes per node.", lambda node=node: node.write_errors, labels)
+
+
+async def create_gateway(config: dict, directory: str) -> tuple:
+
+    """
+    Creates the server, the mirrors and their variables from a config. Returns
+    the server and the mirrors. Raises a ValueError if writable nodes would be
+    served without security on another host than 127.0.0.1.
+    """
+
+    endpoint = config.get("endpoint", ENDPOINT)
+    security = config.get("security")
+    users = security.get("users") if security is not None else None
+    server = Server(user_manager=GatewayUserManager(users) if users else None)
+    await server.init()
+    server.set_endpoint(endpoint)
+    server.set_server_name("Python-OPC-UA gateway")
+
+    if security is not None:
+        server.set_security_policy([getattr(ua.SecurityPolicyType, security["policy"] + "_SignAndEncrypt")])
+        await server.load_certificate(os.path.join(directory, security["certificate"]))
+        await server.load_private_key(os.path.join(directory, security["private_key"]))
+        if "application_uri" in security:
+            await server.set_application_uri(security["application_uri"])
+        if users:
+            server.set_security_IDs(["Username"])
+
+    namespace = await server.register_namespace(config.get("namespace", NAMESPACE))
+    mirrors = []
+
+    for name, upstream in config["upstreams"].items():
+        mirror = UpstreamMirror(name, await create_connection(upstream, directory), server, namespace)
+        for subscription in upstream["subscriptions"]:
+            mirror.add_subscription(subscription)
+        await mirror.create_variables()
+        mirrors.append(mirror)
+
+    writable = [node.name for mirror in mirrors for node in mirror.nodes.values() if node.writable]
+
+    if len(writable) > 0 and security is None and urlparse(endpoint).hostname not in LOCAL_HOSTS:
+        raise ValueError("Writable nodes ({0}) on {1} need \"security\" in the config, or the endpoint on 127.0.0.1".format(
+            ", ".join(writable), endpoint))
+
+    server.iserver.attribute_service = GatewayAttributeService(server.iserver.aspace, mirrors)
+
+    return server, mirrors
+
+
+async def run(file: str) -> None:
+
+    """Runs the gateway of a config file until cancelled."""
+
+    with open(file) as handle:
+        config = json.load(handle)
+
+    directory = os.path.dirname(os.path.abspath(file))
+    server, mirrors = await create_gateway(config, directory)
+    group = SessionGroup({mirror.name: mirror.connection for mirror in mirrors})
+    metrics = None
+
+    if "metrics" in config:
+        registry = MetricsRegistry()
+        metrics = MetricsServer(registry, config["metrics"].get("port", 9100), config["metrics"].get("host", "127.0.0.1"))
+        for mirror in mirrors:
+            register_mirror(registry, mirror)
+        metrics.start()
+
+    logging.info("Mirroring {0} nodes of {1} upstreams on {2}".format(
+        sum(len(mirror.nodes) for mirror in mirrors), len(mirrors), config.get("endpoint", ENDPOINT)))
+
+    try:
+        async with server:
+            await asyncio.gather(group.run(), check_staleness(mirrors, STALE_CHECK_INTERVAL),
+                                 log_stats(server, mirrors, config.get("log_interval", LOG_INTERVAL)))
+    finally:
+        if metrics is not None:
+            metrics.stop()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Mirrors the nodes of all machines behind one OPC UA endpoint.")
+    parser.add_argument("config", help="JSON config file with the endpoint and the upstreams.")
+    args = parser.parse_args()
+    asyncio.run(run(args.config))
+
+
+if __name__ == "__main__":
+    logging.getLogger('asyncua').setLevel(logging.WARNING)
+    setup_logging(logging.INFO, rate_limit=10)
+    main()
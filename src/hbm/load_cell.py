@@ -2,80 +2,248 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
-import csv
 import os
+import sys
 from datetime import datetime
-from asyncua import Client, ua
+from asyncua import Node
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from aggregation import AggregatingWriter
+from async_logging import setup_logging
+from batch_handler import BatchHandler, get_source_time
+from connection_manager import ConnectionManager
+from csv_logger import CsvLogger
+from monitoring import MonitoringConfig
+from signal_processing import LoadCellProcessor
+from signal_store import SignalWriter, to_nanoseconds
+
+DATABASE = "D:/GitHub/Python-OPC-UA/src/HBM/20240528_ACE1.csv"
+MAX_FILE_SIZE = 100 * 1024 * 1024 # [INT: bytes], rotate the CSV file after 100 MB
+STORAGE_FORMAT = "csv" # "csv", "signal" (compact binary file with a time index, see common/signal_store.py) or "aggregate"
+
+# Aggregation settings, only used with the "aggregate" storage format (see common/aggregation.py)
+AGGREGATION_WINDOW = 1.0 # [FLOAT: seconds], min, max, mean and last per window
+LTTB_POINTS = 100 # [INT: -], LTTB downsample for plotting: points per block of LTTB_BLOCK samples, 0 to disable
+LTTB_BLOCK = 5000 # [INT: -]
+RAW_PRE = 10.0 # [FLOAT: seconds], raw samples kept before an event
+RAW_POST = 30.0 # [FLOAT: seconds], raw samples kept after an event
+RAW_ABOVE = 50.0 # [FLOAT: kg], a load above this limit is an event, None to disable
+RAW_BELOW = None # [FLOAT: kg], a load below this limit is an event, None to disable
+
+# Acquisition settings
+ACQUISITION_MODE = "subscription" # "subscription" or "polling"
+SAMPLING_INTERVAL = 20 # [FLOAT: milliseconds], sampling interval of the load cell on the server
+PUBLISHING_INTERVAL = 200 # [FLOAT: milliseconds], interval of the publish responses
+QUEUE_SIZE = 20 # [INT: -], server-side queue, should hold at least PUBLISHING_INTERVAL / SAMPLING_INTERVAL samples
+DEADBAND = 0.0 # [FLOAT: kg], absolute deadband on the server: only changes larger than this are sent, 0 to disable
+POLLING_INTERVAL = 0.020 # [FLOAT: seconds], only used in polling mode
+
+# Signal processing of every batch, only used in subscription mode (see common/signal_processing.py)
+PROCESSING = True # Weight and mass flow rate to <DATABASE>_Weight.sig and <DATABASE>_MassFlow.sig, next to the raw load
+TARE = 0.0 # [FLOAT: kg], offset subtracted from the raw load
+CALIBRATION_GAIN = 1.0 # [FLOAT: -], multiplies the load after the tare
+MEDIAN_WINDOW = 5 # [INT: samples], moving median, removes spikes shorter than half the window
+CUTOFF = 2.0 # [FLOAT: Hz], cutoff frequency of the low-pass filter of the weight
+FLOW_SPAN = 50 # [INT: samples], the mass flow rate is the weight loss over this span
+GAP = 10 # [INT: -], the filters start again after a gap of more than GAP sampling intervals (a reconnect)
 
 async def main():
-  
-    while True:
 
-        client = Client(url="opc.tcp://10.129.4.2:4840")
-        client.set_user("Admin") 
-        client.set_password("admin")
+    if STORAGE_FORMAT == "signal":
+        # Full date and time as int64 nanoseconds, the values as float64
+        database = SignalWriter(os.path.splitext(DATABASE)[0] + "_Load.sig", "float64", name="Load")
+    elif STORAGE_FORMAT == "aggregate":
+        # Statistics per window, a downsample for plotting and the raw samples only around events
+        database = AggregatingWriter(os.path.splitext(DATABASE)[0] + "_Load.sig", window=AGGREGATION_WINDOW, lttb_block=LTTB_BLOCK,
+                                     lttb_points=LTTB_POINTS, pre=RAW_PRE, post=RAW_POST, above=RAW_ABOVE, below=RAW_BELOW, name="Load")
+    else:
+        # Writes the rows on a separate thread: slow disk access doesn't stall the event loop
+        database = CsvLogger(DATABASE, ["Time", "Load"], max_bytes=MAX_FILE_SIZE, rotate_daily=True, formatter=format_row)
 
-        database = "D:/GitHub/Python-OPC-UA/src/HBM/20240528_ACE1.csv"
-        create_database(database)
+    with database:
+        await acquire(database)
 
-        counter = 0
+
+async def acquire(database: CsvLogger):
+
+    connection = ConnectionManager("opc.tcp://10.129.4.2:4840", user="Admin", password="admin")
+    node = connection.get_node("ns=1;i=104")
+
+    if ACQUISITION_MODE == "subscription":
+        # The server samples the load cell at SAMPLING_INTERVAL and queues the samples until the next publish response
+        handler = LoadCellHandler(database)
+        outputs = []
+
+        if PROCESSING:
+            # Equidistant samples: the deadband should be disabled
+            base = os.path.splitext(DATABASE)[0]
+            outputs = [SignalWriter(base + "_Weight.sig", "float64", name="Weight"), SignalWriter(base + "_MassFlow.sig", "float64", name="MassFlow")]
+            handler.processor = LoadCellProcessor(1000.0 / SAMPLING_INTERVAL, TARE, CALIBRATION_GAIN, MEDIAN_WINDOW, CUTOFF, FLOW_SPAN)
+            handler.outputs = outputs
+
+        monitoring = MonitoringConfig(SAMPLING_INTERVAL, QUEUE_SIZE, deadband_type="absolute", deadband_value=DEADBAND)
+        connection.add_subscription(PUBLISHING_INTERVAL, BatchHandler(handler.process), ["ns=1;i=104"], monitoring=monitoring)
 
         try:
-            async with client:
-
-                node = client.get_node("ns=1;i=104") 
-                
-                while True: 
-                    
-                    # Time
-                    date = datetime.now()
-                    t = date.strftime("%H:%M:%S.%f")[:-3]
-
-                    # Value
-                    value = await node.read_value()
-
-                    # Write data to CSV database
-                    with open(database, 'a', newline='') as file:
-                        writer = csv.writer(file, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                        writer.writerow([t, "{0:.8f}".format(value)])
-                    
-                    if counter > 100:
-                        logging.info("{0}, {1:.8f}".format(t, value))
-                        counter = 0
-                    
-                    counter += 1
-
-                    await asyncio.sleep(0.020)
-                    await client.check_connection() # Throws a exception if connection is lost
-
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
-
-
-def create_database(file: str) -> None:
+            for output in outputs:
+                output.open()
+            await connection.run()
+        finally:
+            for output in outputs:
+                output.close()
+    
+    else:
+        await connection.run(lambda client: poll(node, database))
+
+
+async def poll(node: Node, database: CsvLogger):
+
+    """
+    Acquires the load cell by reading the value every POLLING_INTERVAL.
+    """
+
+    counter = 0
+
+    while True: 
+        
+        # Time
+        date = datetime.now()
+
+        # Value
+        value = await node.read_value()
+
+        # Write data to CSV database (formatted and written by the logger thread)
+        database.write_row((date, value))
+        
+        if counter > 100:
+            log_sample(date, value, database)
+            counter = 0
+        
+        counter += 1
+
+        await asyncio.sleep(POLLING_INTERVAL)
+
+
+class LoadCellHandler:
+
+    """
+    Writes the batches of load cell samples of a subscription to the database.
+
+    With a processor every batch is filtered as one block: the weight and the
+    mass flow rate are written to the outputs (weight, mass flow rate) as soon
+    as the batch arrives.
+    """
+
+    def __init__(self, database: CsvLogger):
+
+        """Initializes the handler."""
+
+        self.database = database
+        self.counter = 0
+        self.first_time = None
+        self.samples = 0
+        self.bad_samples = 0
+        self.processor = None
+        self.outputs = None
+        self.mass_flow = None # Last mass flow rate
+        self._last_timestamp = None
+
+    def process(self, batch: list):
+
+        """
+        Called with all samples of one publish response.
+        """
+
+        rows = []
+
+        for node, data_value in batch:
+
+            # Skip bad and uncertain samples, as the recorder does
+            if (data_value.StatusCode is not None and not data_value.StatusCode.is_good()) or data_value.Value is None or data_value.Value.Value is None:
+                self.bad_samples += 1
+                continue
+
+            # Source timestamp of the load cell, in local time as in the polling mode
+            date = get_source_time(data_value).astimezone()
+            value = data_value.Value.Value
+            rows.append((date, value))
+
+        if len(rows) > 0:
+            # All samples of the batch at once, the aggregation works on arrays
+            self.database.write_rows(rows)
+
+            if self.processor is not None:
+                self.filter(rows)
+
+        if self.first_time is None:
+            self.first_time = get_source_time(batch[0][1])
+
+        self.samples += len(batch)
+        self.counter += len(batch)
+
+        if self.counter > 100:
+            duration = (get_source_time(batch[-1][1]) - self.first_time).total_seconds()
+            rate = (self.samples - 1) / duration if duration > 0 else 0.0
+            logging.info("Samples: {0}, batch size: {1}, sample rate [Hz]: {2:.1f}, bad: {3}".format(self.samples, len(batch), rate, self.bad_samples))
+            if len(rows) > 0:
+                log_sample(*rows[-1], self.database)
+            if self.mass_flow is not None:
+                logging.info("Mass flow rate [kg/s]: {0:.4f}, non-finite samples: {1}".format(self.mass_flow, self.processor.invalid))
+            self.counter = 0
+
+    def filter(self, rows: list):
+
+        """
+        Filters the samples of a batch and writes the weight and the mass flow rate.
+        """
+
+        timestamps = [to_nanoseconds(date) for date, _ in rows]
+        values = [value for _, value in rows]
+
+        if self._last_timestamp is not None and timestamps[0] - self._last_timestamp > GAP * SAMPLING_INTERVAL * 1e6:
+            self.processor.reset()
+
+        # Non-finite samples are dropped by the processor, they would make all later outputs NaN
+        timestamps, weight, mass_flow = self.processor.process(timestamps, values)
+
+        if len(timestamps) == 0:
+            return
+
+        self.outputs[0].extend(timestamps.tolist(), weight.tolist())
+        self.outputs[1].extend(timestamps.tolist(), mass_flow.tolist())
+        self.mass_flow = float(mass_flow[-1])
+        self._last_timestamp = int(timestamps[-1])
+
+
+def log_sample(date: datetime, value: float, database: CsvLogger) -> None:
+
+    """Logs a sample and the state of the database."""
+
+    stats = database.get_stats()
+    logging.info("{0}, {1:.8f}".format(date.strftime("%H:%M:%S.%f")[:-3], value))
+    logging.info("Rows written: {0}, dropped: {1}, queue depth: {2}, flush latency [ms]: {3:.1f}".format(
+        stats["rows_written"], stats["rows_dropped"], stats["queue_depth"], stats["last_flush_latency"]*1000))
+
+
+def format_row(row: tuple) -> list:
         
-    """Sets and initiates the CSV database."""
+    """Formats a (datetime, value) sample as a row of the CSV database."""
+
+    date, value = row
 
-    # Initiate file with header (only if file doesn't exist yet)
-    if not (os.path.exists(file)):
-        with open(file, 'a', newline='') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='|', quoting=csv.QUOTE_MINIMAL)
-            writer.writerow(["Time", "Load"])
+    return [date.strftime("%H:%M:%S.%f")[:-3], "{0:.8f}".format(value)]
 
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
     asyncio.run(main())
\ No newline at end of file
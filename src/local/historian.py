@@ -0,0 +1,555 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Historian for the local servers: the history of variables in signal files.
+
+Every historized node has its own signal file (see common/signal_store.py).
+New values of live nodes are collected in memory and written as chunks,
+recorded signal files (e.g. of the recorder) are served read-only. A time range
+is located with the chunk index of the file, only the chunks of the range are
+decompressed.
+
+Clients read the history with HistoryRead:
+    ReadRawModifiedDetails : the raw samples, in pages of at most max_values
+    ReadProcessedDetails   : Average, Minimum, Maximum, Range, Count, Start or End per processing interval
+
+If a page is full the result has a continuation point, the time of the next
+sample or interval. Reading again with the continuation point returns the next page.
+
+Usage:
+    storage = await install_historian(server, "D:/recordings")
+    await add_recordings(server, storage, "D:/recordings", idx) # the *.sig files as variables
+    await server.historize_node_data_change(variables, period=None)
+"""
+
+import logging
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from asyncua import Server, ua
+from asyncua.common.utils import Buffer
+from asyncua.server.history import HistoryManager, HistoryStorageInterface
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from signal_store import SignalReader, SignalWriter, to_datetime, to_nanoseconds
+
+# Aggregate function -> statistic of the samples of an interval (sorted by time)
+AGGREGATES = {
+    ua.ObjectIds.AggregateFunction_Average: lambda values, starts, counts: np.add.reduceat(values, starts) / counts,
+    ua.ObjectIds.AggregateFunction_Minimum: lambda values, starts, counts: np.minimum.reduceat(values, starts),
+    ua.ObjectIds.AggregateFunction_Maximum: lambda values, starts, counts: np.maximum.reduceat(values, starts),
+    ua.ObjectIds.AggregateFunction_Range: lambda values, starts, counts: np.maximum.reduceat(values, starts) - np.minimum.reduceat(values, starts),
+    ua.ObjectIds.AggregateFunction_Count: lambda values, starts, counts: counts.astype(np.float64),
+    ua.ObjectIds.AggregateFunction_Start: lambda values, starts, counts: values[starts],
+    ua.ObjectIds.AggregateFunction_End: lambda values, starts, counts: values[starts + counts - 1]}
+
+
+class HistorySignal:
+
+    """
+    History of one node: a signal file and, for live nodes, the samples that are not written yet.
+    """
+
+    def __init__(self, file: str, writable: bool = True, chunk_size: int = 1024):
+
+        """Initializes the signal. The file is created on the first value of a live node."""
+
+        self.file = file
+        self.writable = writable
+        self.chunk_size = chunk_size
+        self.writer = None
+        self.reader = None
+        self.value_type = None
+        self.last_timestamp = None
+        self._timestamps = []
+        self._values = []
+
+        if os.path.exists(file) and os.path.getsize(file) > 0:
+            self.reader = SignalReader(file)
+            self.value_type = self.reader.value_type
+            self.last_timestamp = self.reader.end
+
+    def append(self, timestamp: int, value) -> None:
+
+        """Adds a sample, writes a chunk every chunk_size samples."""
+
+        # Timestamps should be increasing, older samples are dropped
+        if self.last_timestamp is not None and timestamp < self.last_timestamp:
+            return
+
+        if self.writer is None:
+            if self.value_type is None:
+                self.value_type = "bool" if isinstance(value, bool) else "float64"
+            # The writer removes the index at the end of an existing file, the reader maps the file again later
+            if self.reader is not None:
+                self.reader.close()
+                self.reader = None
+            self.writer = SignalWriter(self.file, self.value_type, self.chunk_size)
+            self.writer.open()
+
+        self.last_timestamp = timestamp
+        self._timestamps.append(timestamp)
+        self._values.append(value)
+
+        if len(self._timestamps) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+
+        """Writes the samples in memory to the file."""
+
+        if len(self._timestamps) == 0:
+            return
+
+        self.writer.extend(self._timestamps, self._values)
+        self.writer.flush()
+        self._timestamps = []
+        self._values = []
+
+    def close(self) -> None:
+
+        """Writes the remaining samples and the index and closes the file."""
+
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+            self.writer = None
+
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def read(self, start: int, end: int, count: int, reverse: bool = False) -> tuple:
+
+        """
+        Returns at most `count` samples between start and end (both inclusive,
+        None is unbounded), the oldest first or with reverse the newest first.
+        """
+
+        parts = [self._read_file, self._read_memory]
+
+        if reverse:
+            parts.reverse()
+
+        timestamps = []
+        values = []
+        n = 0
+
+        for part in parts:
+            t, v = part(start, end, count - n, reverse)
+            timestamps.append(t)
+            values.append(v)
+            n += len(t)
+            if n >= count:
+                break
+
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def read_range(self, start: int, end: int) -> tuple:
+
+        """Returns all samples from start (inclusive) to end (exclusive), the oldest first."""
+
+        reader = self._get_reader()
+        timestamps, values = reader.read(start, end) if reader is not None else self._empty()
+        t, v = self._read_memory(start, end, None, False)
+        timestamps, values = np.concatenate([timestamps, t]), np.concatenate([values, v])
+        j = int(np.searchsorted(timestamps, end, side="left"))
+
+        return timestamps[:j], values[:j]
+
+    def _get_reader(self) -> SignalReader:
+
+        """Returns the reader of the file, None if there is no file yet."""
+
+        if self.reader is None:
+            if not os.path.exists(self.file) or os.path.getsize(self.file) == 0:
+                return None
+            self.reader = SignalReader(self.file)
+
+        # The file grows while the node is historized (or recorded by another process)
+        self.reader.refresh()
+
+        return self.reader
+
+    def _read_file(self, start: int, end: int, count: int, reverse: bool) -> tuple:
+
+        """Reads the samples from the file, with the chunk index."""
+
+        reader = self._get_reader()
+
+        if reader is None:
+            return self._empty()
+
+        return reader.read_page(start, end, count, reverse)
+
+    def _read_memory(self, start: int, end: int, count: int, reverse: bool) -> tuple:
+
+        """Reads the samples that are not written yet."""
+
+        timestamps = np.asarray(self._timestamps, dtype="<i8")
+        values = np.asarray(self._values, dtype=self._dtype())
+        i = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        j = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="right"))
+        timestamps, values = timestamps[i:j], values[i:j]
+
+        if reverse:
+            timestamps, values = timestamps[::-1], values[::-1]
+
+        return timestamps[:count], values[:count]
+
+    def _empty(self) -> tuple:
+
+        """Returns no samples."""
+
+        return np.empty(0, dtype="<i8"), np.empty(0, dtype=self._dtype())
+
+    def _dtype(self) -> np.dtype:
+
+        """Returns the type of the values."""
+
+        return np.dtype(np.bool_ if self.value_type == "bool" else np.float64)
+
+
+class SignalHistory(HistoryStorageInterface):
+
+    """
+    History storage of asyncua with a signal file per node.
+
+    Live nodes are written to <directory>/<node id>.sig. Recorded files are added
+    with add_signal(). The files are kept: the period and count of a historized
+    node are not applied.
+    """
+
+    def __init__(self, directory: str, max_history_data_response_size: int = 10000, chunk_size: int = 1024):
+
+        """Initializes the storage. max_history_data_response_size: values per page."""
+
+        super().__init__(max_history_data_response_size)
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.signals = {} # Node id -> HistorySignal
+        self.values_saved = 0
+        self.values_read = 0
+
+    async def init(self) -> None:
+
+        """Creates the directory."""
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def add_signal(self, node_id: ua.NodeId, file: str, writable: bool = False) -> HistorySignal:
+
+        """Serves the history of a node from a signal file, read-only by default."""
+
+        signal = HistorySignal(file, writable, self.chunk_size)
+        self.signals[node_id] = signal
+
+        return signal
+
+    async def new_historized_node(self, node_id: ua.NodeId, period: timedelta, count: int = 0) -> None:
+
+        """Creates the signal of a live node, continues an existing file."""
+
+        if node_id in self.signals:
+            return
+
+        name = re.sub(r"[^\w\-]+", "_", node_id.to_string())
+        self.add_signal(node_id, os.path.join(self.directory, name + ".sig"), writable=True)
+
+    async def save_node_value(self, node_id: ua.NodeId, datavalue: ua.DataValue) -> None:
+
+        """Adds a value of a live node. Values that are not numeric or bool are ignored."""
+
+        signal = self.signals.get(node_id)
+        value = datavalue.Value.Value if datavalue.Value is not None else None
+
+        if signal is None or not signal.writable or not isinstance(value, (bool, int, float)):
+            return
+
+        time = datavalue.SourceTimestamp or datavalue.ServerTimestamp or datetime.now(timezone.utc)
+        signal.append(to_nanoseconds(ensure_utc(time)), value)
+        self.values_saved += 1
+
+    async def read_node_history(self, node_id: ua.NodeId, start: datetime, end: datetime, nb_values: int) -> tuple:
+
+        """
+        Returns the values between start and end (both inclusive) and the time of
+        the first value that didn't fit in the page, or None.
+
+        Without start the values are read backwards from end, with start > end
+        from start back to end. Without both all values are read, the newest first.
+        """
+
+        signal = self.signals.get(node_id)
+
+        if signal is None:
+            logging.warning("History read of a node that is not historized: %s", node_id.to_string())
+            return [], None
+
+        start = None if is_unset(start) else to_nanoseconds(ensure_utc(start))
+        end = None if is_unset(end) else to_nanoseconds(ensure_utc(end))
+        reverse = start is None or (end is not None and start > end)
+
+        if reverse and start is not None:
+            start, end = end, start
+
+        size = self.max_history_data_response_size
+        count = min(nb_values, size) if nb_values > 0 else size
+
+        # One more than the page, the continuation point
+        timestamps, values = signal.read(start, end, count + 1, reverse)
+        data_values = [make_data_value(t, v, signal.value_type) for t, v in zip(timestamps[:count].tolist(), values[:count].tolist())]
+        cont = to_datetime(int(timestamps[count])) if len(timestamps) > count else None
+        self.values_read += len(data_values)
+
+        return data_values, cont
+
+    async def read_node_processed(self, node_id: ua.NodeId, start: datetime, end: datetime, interval: float, aggregate: ua.NodeId) -> tuple:
+
+        """
+        Returns a value of the aggregate per processing interval [ms] from start
+        to end and the start of the first interval that didn't fit in the page, or None.
+        Intervals without samples have the status BadNoData.
+        """
+
+        signal = self.signals.get(node_id)
+        function = AGGREGATES.get(aggregate.Identifier) if aggregate.NamespaceIndex == 0 else None
+
+        if signal is None:
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadNodeIdUnknown)
+        if function is None:
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadAggregateNotSupported)
+        if is_unset(start) or is_unset(end) or start > end:
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadInvalidTimestampArgument)
+
+        start = to_nanoseconds(ensure_utc(start))
+        end = to_nanoseconds(ensure_utc(end))
+        step = max(1, int(interval * 1e6) if interval > 0 else end - start) # [ns], start == end is one interval
+
+        # The intervals of this page
+        total = max(1, -(-(end - start) // step))
+        count = min(total, self.max_history_data_response_size)
+        edges = np.minimum(start + np.arange(count + 1, dtype=np.int64) * step, end)
+        timestamps, values = signal.read_range(int(edges[0]), int(edges[-1]))
+        values = values.astype(np.float64)
+
+        # Samples per interval, statistics of the intervals with samples
+        bounds = np.searchsorted(timestamps, edges, side="left")
+        bounds[-1] = len(timestamps)
+        counts = np.diff(bounds)
+        full = np.flatnonzero(counts > 0)
+        results = np.full(count, np.nan)
+
+        if len(full) > 0:
+            results[full] = function(values, bounds[full], counts[full])
+
+        data_values = []
+
+        for t, value, n in zip(edges[:-1].tolist(), results.tolist(), counts.tolist()):
+            if n > 0:
+                data_values.append(make_data_value(t, value, "float64"))
+            else:
+                data_values.append(ua.DataValue(StatusCode=ua.StatusCode(ua.StatusCodes.BadNoData), SourceTimestamp=to_datetime(t)))
+
+        self.values_read += len(data_values)
+        cont = to_datetime(int(edges[-1])) if count < total else None
+
+        return data_values, cont
+
+    async def new_historized_event(self, source_id, evtypes, period, count=0):
+        raise ua.UaStatusCodeError(ua.StatusCodes.BadNotImplemented)
+
+    async def save_event(self, event):
+        pass
+
+    async def read_event_history(self, source_id, start, end, nb_values, evfilter):
+        return [], None
+
+    async def stop(self) -> None:
+
+        """Writes the remaining values and closes the files."""
+
+        for signal in self.signals.values():
+            signal.close()
+
+    def get_stats(self) -> dict:
+
+        """Returns the counters of the storage."""
+
+        return {
+            "signals": len(self.signals),
+            "values_saved": self.values_saved,
+            "values_read": self.values_read}
+
+
+class HistorianManager(HistoryManager):
+
+    """
+    History manager of asyncua that also answers ReadProcessedDetails requests
+    and reads backwards from a continuation point. Needs a SignalHistory storage.
+    """
+
+    async def _read_history(self, details, rv: ua.HistoryReadValueId) -> ua.HistoryReadResult:
+
+        """Reads the raw history of a node, events are read by the base class."""
+
+        if not isinstance(details, ua.ReadRawModifiedDetails):
+            return await super()._read_history(details, rv)
+
+        result = ua.HistoryReadResult()
+        result.HistoryData = ua.HistoryModifiedData() if details.IsReadModified else ua.HistoryData()
+        start, end = details.StartTime, details.EndTime
+
+        # The continuation point is the time of the next value, in the direction of the read
+        if rv.ContinuationPoint:
+            time = ua.ua_binary.Primitives.DateTime.unpack(Buffer(rv.ContinuationPoint))
+            if is_unset(start):
+                end = time
+            elif not is_unset(end) and start > end:
+                start = time
+            else:
+                start = time
+
+        values, cont = await self.storage.read_node_history(rv.NodeId, start, end, details.NumValuesPerNode)
+        result.HistoryData.DataValues = values
+        result.ContinuationPoint = ua.ua_binary.Primitives.DateTime.pack(cont) if cont is not None else None
+
+        return result
+
+    async def _read_processed_history(self, details: ua.ReadProcessedDetails, rv: ua.HistoryReadValueId, aggregate: ua.NodeId) -> ua.HistoryReadResult:
+
+        """Reads the aggregate of a node per processing interval."""
+
+        result = ua.HistoryReadResult()
+        result.HistoryData = ua.HistoryData()
+        start = details.StartTime
+
+        if rv.ContinuationPoint:
+            start = ua.ua_binary.Primitives.DateTime.unpack(Buffer(rv.ContinuationPoint))
+
+        try:
+            values, cont = await self.storage.read_node_processed(rv.NodeId, start, details.EndTime, details.ProcessingInterval, aggregate)
+        except ua.UaStatusCodeError as e:
+            result.StatusCode = ua.StatusCode(e.code)
+            return result
+
+        result.HistoryData.DataValues = values
+        result.ContinuationPoint = ua.ua_binary.Primitives.DateTime.pack(cont) if cont is not None else None
+
+        return result
+
+    async def read_history(self, params: ua.HistoryReadParameters) -> list:
+
+        """Reads the history of all nodes of the request. The aggregate of the n-th node is AggregateType[n]."""
+
+        details = params.HistoryReadDetails
+        results = []
+
+        for i, rv in enumerate(params.NodesToRead):
+
+            # The continuation points are stateless, there is nothing to release
+            if params.ReleaseContinuationPoints:
+                results.append(ua.HistoryReadResult())
+
+            elif not isinstance(details, ua.ReadProcessedDetails):
+                results.append(await self._read_history(details, rv))
+
+            elif len(details.AggregateType) != len(params.NodesToRead):
+                results.append(ua.HistoryReadResult(StatusCode=ua.StatusCode(ua.StatusCodes.BadAggregateListMismatch)))
+
+            else:
+                results.append(await self._read_processed_history(details, rv, details.AggregateType[i]))
+
+        return results
+
+
+async def install_historian(server: Server, directory: str, max_values: int = 10000) -> SignalHistory:
+
+    """
+    Replaces the history manager of an initialized server by a HistorianManager
+    with a SignalHistory storage in the directory. Returns the storage.
+    """
+
+    storage = SignalHistory(directory, max_values)
+    manager = HistorianManager(server.iserver)
+    manager.set_storage(storage)
+    await manager.init()
+    server.iserver.history_manager = manager
+
+    return storage
+
+
+async def add_recordings(server: Server, storage: SignalHistory, directory: str, namespace: int) -> list:
+
+    """
+    Adds every signal file in the directory as a historized variable in the
+    folder "Recordings", with the file name as name. The value is the last
+    recorded sample. Returns the variables.
+    """
+
+    folder = await server.nodes.objects.add_folder(namespace, "Recordings")
+    variables = []
+
+    for file in sorted(os.listdir(directory)):
+        if not file.endswith(".sig"):
+            continue
+
+        path = os.path.join(directory, file)
+        name = os.path.splitext(file)[0]
+        node_id = ua.NodeId(name, namespace)
+
+        # Files of historized nodes are served by their node
+        if node_id in storage.signals or any(os.path.samefile(path, signal.file) for signal in storage.signals.values() if os.path.exists(signal.file)):
+            continue
+
+        try:
+            signal = storage.add_signal(node_id, path)
+        except Exception as e:
+            logging.warning("Skipped {0}: {1}".format(path, e))
+            continue
+
+        reader = signal.reader
+        last = reader.read_page(reader.end, None, 1)[1] if reader is not None and reader.end is not None else []
+        value = bool(last[0]) if signal.value_type == "bool" and len(last) > 0 else float(last[0]) if len(last) > 0 else 0.0
+        variant = ua.VariantType.Boolean if signal.value_type == "bool" else ua.VariantType.Double
+        variable = await folder.add_variable(node_id, name, value, varianttype=variant)
+        await variable.write_attribute(ua.AttributeIds.Historizing, ua.DataValue(True))
+        await variable.set_attr_bit(ua.AttributeIds.AccessLevel, ua.AccessLevel.HistoryRead)
+        await variable.set_attr_bit(ua.AttributeIds.UserAccessLevel, ua.AccessLevel.HistoryRead)
+        variables.append(variable)
+
+    return variables
+
+
+def make_data_value(timestamp: int, value, value_type: str) -> ua.DataValue:
+
+    """Returns a sample as a DataValue, with the source timestamp."""
+
+    variant = ua.Variant(value, ua.VariantType.Boolean if value_type == "bool" else ua.VariantType.Double)
+
+    return ua.DataValue(variant, SourceTimestamp=to_datetime(timestamp))
+
+
+def is_unset(time: datetime) -> bool:
+
+    """Returns True for a time that is not specified (None or the minimum DateTime)."""
+
+    return time is None or ensure_utc(time) <= ua.get_win_epoch().replace(tzinfo=timezone.utc)
+
+
+def ensure_utc(time: datetime) -> datetime:
+
+    """Returns an aware datetime, naive datetimes of OPC UA are UTC."""
+
+    return time if time.tzinfo is not None else time.replace(tzinfo=timezone.utc)
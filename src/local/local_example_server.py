@@ -2,62 +2,107 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
+"""
+Example OPC UA server with writable values that count up.
+
+With --history the server is also a historian (see historian.py): the values
+are historized and the signal files in the directory, e.g. of the recorder,
+are served as variables in the folder "Recordings". Clients read the raw and
+processed history with HistoryRead, in pages with continuation points.
+
+Usage: python local_example_server.py [--history DIRECTORY] [--max-values N]
+"""
+
+import argparse
 import asyncio
 import logging
-from asyncua import Server, ua
+import time
+from datetime import datetime, timezone
+from asyncua import ua
+from historian import add_recordings, install_historian
+from plant_simulator import create_server
 
-async def main():
-    
-    # Setup the server
-    logging.info("Starting the OPC UA server.")
-    server = Server()
-    await server.init()
-    server.set_endpoint("opc.tcp://0.0.0.0:4840/example/")
-    server.set_server_name("OPC UA server example")
+URI = "http://examples.freeopcua.github.io"
+
+async def create_example_server(endpoint: str, count: int = 3):
 
-    # Set up the name space
-    uri = "http://examples.freeopcua.github.io"
-    idx = await server.register_namespace(uri)
+    """Creates the example server with count writable Double values. Returns the server and the variables."""
+
+    server = await create_server(endpoint, "OPC UA server example", {2: URI})
+    idx = await server.get_namespace_index(URI)
 
     # Populate
     myobj = await server.nodes.objects.add_object(idx, "Values")
-    myvar1 = await myobj.add_variable(idx, "Value 1", 10.0, varianttype=ua.VariantType.Double)
-    myvar2 = await myobj.add_variable(idx, "Value 2", 20.0, varianttype=ua.VariantType.Double)
-    myvar3 = await myobj.add_variable(idx, "Value 3", 30.0, varianttype=ua.VariantType.Double)
+    variables = []
+
+    for i in range(1, count + 1):
+        variable = await myobj.add_variable(idx, "Value {}".format(i), 10.0 * i, varianttype=ua.VariantType.Double)
+        await variable.set_writable()
+        variables.append(variable)
+
+    return server, variables
+
+
+async def run_example_server(server, variables: list, interval: float = 1.0):
+
+    """Runs the example server. The values count up every interval [s]."""
 
-    # Node ID
-    logging.info("Object info           : {}".format(myobj))
-    logging.info("Node ID of 'value 1'  : {}".format(myvar1.nodeid.to_string()))
-    logging.info("Node ID of 'value 2'  : {}".format(myvar2.nodeid.to_string()))
-    logging.info("Node ID of 'value 3'  : {}".format(myvar3.nodeid.to_string()))
-    
     # Value counters
-    counter1 = 10.0
-    counter2 = 20.0
-    counter3 = 30.0
+    counters = [10.0 * (i + 1) for i in range(len(variables))]
+    last_log = 0.0
 
     async with server:
         
         while True:
             
-            logging.info("The OPC UA server is still running...")
-            
-            await myvar1.write_value(counter1)
-            await myvar2.write_value(counter2)
-            await myvar3.write_value(counter3)
+            if time.monotonic() - last_log >= 1.0:
+                logging.info("The OPC UA server is still running...")
+                last_log = time.monotonic()
             
-            counter1 += 1
-            counter2 += 1
-            counter3 += 1
+            timestamp = datetime.now(timezone.utc)
+
+            for i, variable in enumerate(variables):
+                variant = ua.Variant(counters[i], ua.VariantType.Double)
+                await server.write_attribute_value(variable.nodeid, ua.DataValue(variant, SourceTimestamp=timestamp, ServerTimestamp=timestamp))
+                counters[i] += 1
+
+            await asyncio.sleep(interval)
+
+
+async def main():
+
+    parser = argparse.ArgumentParser(description="Example OPC UA server, optionally with history.")
+    parser.add_argument("--endpoint", default="opc.tcp://0.0.0.0:4840/example/")
+    parser.add_argument("--interval", type=float, default=1.0, help="Update interval of the values [s].")
+    parser.add_argument("--history", help="Directory of the signal files of the historian.")
+    parser.add_argument("--max-values", type=int, default=10000, help="Values per page of a history read.")
+    args = parser.parse_args()
+    
+    # Setup the server
+    logging.info("Starting the OPC UA server.")
+    server, variables = await create_example_server(args.endpoint)
+
+    # Node ID
+    for i, variable in enumerate(variables):
+        logging.info("Node ID of 'value {0}'  : {1}".format(i + 1, variable.nodeid.to_string()))
+
+    # Historian
+    if args.history is not None:
+        storage = await install_historian(server, args.history, args.max_values)
+        await server.historize_node_data_change(variables, period=None)
+        recordings = await add_recordings(server, storage, args.history, await server.get_namespace_index(URI))
+
+        for variable in recordings:
+            logging.info("Recording: {}".format(variable.nodeid.to_string()))
 
-            await asyncio.sleep(1.0)
+    await run_example_server(server, variables, args.interval)
 
 
 if __name__ == "__main__":
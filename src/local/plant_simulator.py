@@ -0,0 +1,316 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Simulator of the machines of the printing facility.
+
+Every device is a separate OPC UA server on its own port, with the node ids
+and data types of the real machine. The values are produced by signal
+generators with a configurable update rate (up to a few kHz), so the clients
+can be benchmarked and soak tested at production data rates. Point a client at
+opc.tcp://127.0.0.1:<port> instead of the address of the machine.
+
+Usage: python plant_simulator.py [--devices mtec hbm ...] [--rate HZ] [--host HOST]
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+from datetime import datetime, timezone
+from asyncua import Server, ua
+
+# Statistics
+LOG_INTERVAL = 10.0 # [FLOAT: seconds]
+
+
+# Signal generators: functions of the time since the start of the simulator [s]
+
+def constant(value):
+    return lambda t: value
+
+def square(period: float, duty: float = 0.5, low = False, high = True):
+
+    """On/off cycle, for example a mixer or a valve."""
+
+    return lambda t: high if (t % period) < duty * period else low
+
+def toggle(period: float):
+
+    """Boolean that toggles every period, for example a live bit."""
+
+    return lambda t: int(t / period) % 2 == 1
+
+def sine(amplitude: float, period: float, offset: float = 0.0, phase: float = 0.0):
+    return lambda t: offset + amplitude * math.sin(2 * math.pi * t / period + phase)
+
+def noisy_ramp(slope: float, period: float, noise: float, offset: float = 0.0):
+
+    """Ramp that restarts every period with gaussian noise, for example the load cell under a filling container."""
+
+    return lambda t: offset + slope * (t % period) + random.gauss(0.0, noise)
+
+def trajectory(velocity: float, distance: float, acceleration: float, position: bool = False):
+
+    """
+    Velocity (or position) of an axis that moves back and forth over a distance
+    with a trapezoidal velocity profile, for example a printer axis (aaVactM, aaIm).
+    """
+
+    ramp_time = velocity / acceleration
+    move_time = distance / velocity + ramp_time
+
+    def get_position(t: float) -> float:
+        if t < ramp_time:
+            return 0.5 * acceleration * t * t
+        if t > move_time - ramp_time:
+            return distance - 0.5 * acceleration * (move_time - t) ** 2
+        return 0.5 * acceleration * ramp_time * ramp_time + velocity * (t - ramp_time)
+
+    def generator(t: float) -> float:
+        t = t % (2 * move_time)
+        forward = t < move_time
+        t = t % move_time
+        if position:
+            return get_position(t) if forward else distance - get_position(t)
+        return (1.0 if forward else -1.0) * min(velocity, acceleration * t, acceleration * (move_time - t))
+
+    return generator
+
+
+class Signal:
+
+    """Variable of a simulated device."""
+
+    def __init__(self, node_id: str, name: str, variant_type: ua.VariantType, value, generator = None, rate: float = 0.0, writable: bool = False):
+
+        """
+        Initializes the signal.
+
+        generator: function of time that returns the value, None for a value that only changes by client writes.
+        rate: update rate of the generator [Hz].
+        """
+
+        self.node_id = ua.NodeId.from_string(node_id)
+        self.name = name
+        self.variant_type = variant_type
+        self.value = value
+        self.generator = generator
+        self.rate = rate
+        self.writable = writable
+
+
+MTEC = "ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC."
+GECO = "ns=2;s=Tags.GECO/"
+
+# Devices: name -> port, namespaces (index -> uri) and signals
+DEVICES = {
+    "mtec": {
+        "port": 4841,
+        "name": "MTEC DuoMix connect",
+        "namespaces": {4: "urn:simulator:mtec:IecVarAccess"},
+        "signals": [
+            Signal(MTEC + "Livebit2extern", "Livebit2extern", ua.VariantType.Boolean, False, toggle(1.0), 10),
+            Signal(MTEC + "Livebit2DuoMix", "Livebit2DuoMix", ua.VariantType.Boolean, False, writable=True),
+            Signal(MTEC + "aut_mixer", "aut_mixer", ua.VariantType.UInt16, 0, square(60.0, 0.7, 0, 1), 100),
+            Signal(MTEC + "aut_solenoid_valve", "aut_solenoid_valve", ua.VariantType.Boolean, False, square(8.0, 0.3), 100),
+            Signal(MTEC + "set_value_mixingpump", "set_value_mixingpump", ua.VariantType.UInt16, 0, writable=True)]},
+    "mai": {
+        "port": 48010,
+        "name": "MAI MultiMix",
+        "namespaces": {2: "urn:simulator:mai:Tags"},
+        "signals": [
+            Signal(GECO + "MP_Mixer_Run", "MP_Mixer_Run", ua.VariantType.Boolean, False, square(20.0, 0.4), 100),
+            Signal(GECO + "MPRX_DI_Mixer_Disabled", "MPRX_DI_Mixer_Disabled", ua.VariantType.Boolean, False, writable=True),
+            Signal(GECO + "MPRX_DI_Wetprobe_Upper_Cov_Delay_s_I", "MPRX_DI_Wetprobe_Upper_Cov_Delay_s_I", ua.VariantType.Int16, 0, writable=True),
+            Signal(GECO + "MPRX_DI_Wetprobe_Upper_NCov_Delay_s_I", "MPRX_DI_Wetprobe_Upper_NCov_Delay_s_I", ua.VariantType.Int16, 0, writable=True),
+            Signal(GECO + "MPRX_EXT_Pump_Speed_cHz_I", "MPRX_EXT_Pump_Speed_cHz_I", ua.VariantType.Int16, 0, writable=True)]},
+    "printhead": {
+        "port": 4842,
+        "name": "Smart printhead PLC",
+        "namespaces": {3: "http://www.siemens.com/simatic-s7-opcua"},
+        "signals": [
+            Signal("ns=3;s=\"Velocity_Jog_left\"", "Velocity_Jog_left", ua.VariantType.Double, 0.0, writable=True)]},
+    "material": {
+        "port": 4843,
+        "name": "Material delivery PLC",
+        "namespaces": {2: "urn:simulator:material:Status", 4: "urn:simulator:material:IO"},
+        "signals": [
+            Signal("ns=2;i=90", "Status", ua.VariantType.Boolean, False, square(10.0), 100),
+            Signal("ns=4;i=22", "DO0", ua.VariantType.Boolean, False, writable=True),
+            Signal("ns=4;i=78", "AO0", ua.VariantType.Float, 0.0, writable=True)]},
+    "vertico": {
+        "port": 4844,
+        "name": "Vertico",
+        "namespaces": {5: "urn:simulator:vertico:IO"},
+        "signals": [
+            Signal("ns=5;i=2", "DO3", ua.VariantType.Boolean, False, writable=True)]},
+    "hbm": {
+        "port": 4845,
+        "name": "HBM load cell",
+        "namespaces": {},
+        "signals": [
+            Signal("ns=1;i=104", "Load", ua.VariantType.Double, 0.0, noisy_ramp(0.5, 120.0, 0.02, 2.0), 1000)]},
+    "sinumerik": {
+        "port": 4846,
+        "name": "Sinumerik",
+        "namespaces": {2: "SinumerikVarProvider"},
+        "signals": [
+            Signal("ns=2;s=/Channel/MachineAxis/{0}[1,{1}]".format(variable, axis), "{0}[1,{1}]".format(variable, axis), ua.VariantType.Double, 0.0,
+                   trajectory(100.0 * axis, 1000.0, 500.0, variable == "aaIm"), 500) for variable in ["aaIm", "aaVactM"] for axis in range(1, 5)]}}
+
+
+async def create_server(endpoint: str, name: str, namespaces: dict = None) -> Server:
+
+    """
+    Creates and initializes a server. The namespaces (index -> uri) are registered at
+    the given index, lower free indices are filled with placeholder namespaces.
+    Index 1 is the namespace of the server itself.
+    """
+
+    server = Server()
+    await server.init()
+    server.set_endpoint(endpoint)
+    server.set_server_name(name)
+
+    for index, uri in sorted((namespaces or {}).items()):
+        count = len(await server.get_namespace_array())
+        for i in range(count, index):
+            await server.register_namespace("urn:simulator:unused:{}".format(i))
+        await server.register_namespace(uri)
+
+    return server
+
+
+class Device:
+
+    """Simulated device: a server with its signals."""
+
+    def __init__(self, name: str, host: str, rate: float = 0.0):
+
+        """Initializes the device. A rate > 0 overrides the update rate of all generators [Hz]."""
+
+        config = DEVICES[name]
+        self.name = name
+        self.title = config["name"]
+        self.endpoint = "opc.tcp://{0}:{1}".format(host, config["port"])
+        self.namespaces = config["namespaces"]
+        self.signals = config["signals"]
+        self.rate = rate
+        self.server = None
+        self.updates = 0
+        self.late_ticks = 0 # Ticks that were skipped because the loop fell behind
+
+    async def start(self) -> None:
+
+        """Creates the server and its nodes, and starts the server."""
+
+        self.server = await create_server(self.endpoint, self.title, self.namespaces)
+        objects = self.server.nodes.objects
+
+        for signal in self.signals:
+            variant = ua.Variant(signal.value, signal.variant_type)
+            node = await objects.add_variable(signal.node_id, ua.QualifiedName(signal.name, signal.node_id.NamespaceIndex), variant)
+            if signal.writable:
+                await node.set_writable()
+
+        await self.server.start()
+        logging.info("{0} simulated on {1} with {2} nodes.".format(self.title, self.endpoint, len(self.signals)))
+
+    async def stop(self) -> None:
+
+        """Stops the server."""
+
+        if self.server is not None:
+            await self.server.stop()
+
+    async def run(self, start: float) -> None:
+
+        """Runs the signal generators, one task per update rate."""
+
+        groups = {}
+
+        for signal in self.signals:
+            if signal.generator is not None:
+                rate = self.rate if self.rate > 0 else signal.rate
+                groups.setdefault(rate, []).append(signal)
+
+        await asyncio.gather(*[self._generate(rate, signals, start) for rate, signals in groups.items()])
+
+    async def _generate(self, rate: float, signals: list, start: float) -> None:
+
+        """Updates the signals at the given rate, with deadlines on the monotonic clock."""
+
+        period = 1.0 / rate
+        tick = 0
+
+        while True:
+            now = time.monotonic()
+            t = now - start
+            timestamp = datetime.now(timezone.utc)
+
+            for signal in signals:
+                variant = ua.Variant(signal.generator(t), signal.variant_type)
+                await self.server.write_attribute_value(signal.node_id, ua.DataValue(variant, SourceTimestamp=timestamp, ServerTimestamp=timestamp))
+
+            self.updates += len(signals)
+
+            # Skip ticks that are already past, the values are functions of time
+            tick += 1
+            due = int((time.monotonic() - start) / period)
+            if due > tick:
+                self.late_ticks += due - tick
+                tick = due
+
+            await asyncio.sleep(max(0.0, start + tick * period - time.monotonic()))
+
+
+async def log_stats(devices: list) -> None:
+
+    """Logs the update rate of every device."""
+
+    last = {device.name: (device.updates, device.late_ticks) for device in devices}
+
+    while True:
+        await asyncio.sleep(LOG_INTERVAL)
+
+        for device in devices:
+            updates, late = last[device.name]
+            if device.updates > updates:
+                logging.info("{0}: {1:.0f} updates/s, {2} late ticks.".format(device.name, (device.updates - updates) / LOG_INTERVAL, device.late_ticks - late))
+            last[device.name] = (device.updates, device.late_ticks)
+
+
+async def main():
+
+    parser = argparse.ArgumentParser(description="Simulator of the OPC UA servers of the printing facility.")
+    parser.add_argument("--devices", nargs="+", choices=list(DEVICES.keys()), default=list(DEVICES.keys()))
+    parser.add_argument("--rate", type=float, default=0.0, help="Update rate of all signal generators [Hz], default per signal.")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    devices = [Device(name, args.host, args.rate) for name in args.devices]
+
+    try:
+        await asyncio.gather(*[device.start() for device in devices])
+        start = time.monotonic()
+        await asyncio.gather(log_stats(devices), *[device.run(start) for device in devices])
+    finally:
+        for device in devices:
+            await device.stop()
+
+
+if __name__ == "__main__":
+    logging.getLogger('asyncua').setLevel(logging.WARNING)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -2,18 +2,25 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
+import os
+import sys
 from datetime import datetime
 from asyncua import Client, Node, ua
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
+from deadline_scheduler import DeadlineScheduler
+
 # CONSTANT: GLOBAL PARAMETERS
 BATCH_TIME = 5  # [FLOAT: seconds]
 MIN_PAUSE = 20 # [FLOAT: seconds]
@@ -26,36 +33,24 @@ DATA_VALUE_FALSE = ua.DataValue(ua.Variant(False, ua.VariantType.Boolean))
 
 async def main():
     
-    while True:
-        
-        client = Client(url="opc.tcp://10.129.4.80:48010")
-        
-        try:
-            async with client:
-            
-                # Set settings
-                node_wetprobe_covered = client.get_node("ns=2;s=Tags.GECO/MPRX_DI_Wetprobe_Upper_Cov_Delay_s_I")
-                node_wetprobe_uncovered = client.get_node("ns=2;s=Tags.GECO/MPRX_DI_Wetprobe_Upper_NCov_Delay_s_I")         
-                await node_wetprobe_covered.set_data_value(ua.DataValue(ua.Variant(DELAY_WETPROBE_COVERED, ua.VariantType.Int16)))
-                await node_wetprobe_uncovered.set_data_value(ua.DataValue(ua.Variant(DELAY_WETPROBE_UNCOVERED, ua.VariantType.Int16)))
-
-                # Mixer nodes and interval handler
-                node_mixer_disabled = client.get_node("ns=2;s=Tags.GECO/MPRX_DI_Mixer_Disabled")
-                node_mixer_run = client.get_node("ns=2;s=Tags.GECO/MP_Mixer_Run")
-                dosing_time_handler = DosingTimeHandler(node_mixer_disabled)
-                sub_mixer_run = await client.create_subscription(100, dosing_time_handler)
-                await sub_mixer_run.subscribe_data_change(node_mixer_run)
-
-                while True:
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws an exception if the connection is lost
-        
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: %s", e)
-        
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    connection = ConnectionManager("opc.tcp://10.129.4.80:48010")
+    
+    # Mixer nodes and interval handler
+    node_mixer_disabled = connection.get_node("ns=2;s=Tags.GECO/MPRX_DI_Mixer_Disabled")
+    dosing_time_handler = DosingTimeHandler(node_mixer_disabled)
+    connection.add_subscription(100, dosing_time_handler, ["ns=2;s=Tags.GECO/MP_Mixer_Run"])
+
+    async def session(client: Client):
+
+        # Set settings (after every reconnect)
+        node_wetprobe_covered = connection.get_node("ns=2;s=Tags.GECO/MPRX_DI_Wetprobe_Upper_Cov_Delay_s_I")
+        node_wetprobe_uncovered = connection.get_node("ns=2;s=Tags.GECO/MPRX_DI_Wetprobe_Upper_NCov_Delay_s_I")         
+        await node_wetprobe_covered.set_data_value(ua.DataValue(ua.Variant(DELAY_WETPROBE_COVERED, ua.VariantType.Int16)))
+        await node_wetprobe_uncovered.set_data_value(ua.DataValue(ua.Variant(DELAY_WETPROBE_UNCOVERED, ua.VariantType.Int16)))
+
+        await asyncio.Future() # Keep the session open until the connection is lost
+
+    await connection.run(session)
 
 
 class DosingTimeHandler:
@@ -69,6 +64,7 @@ class DosingTimeHandler:
         """Initializes the event handler."""
 
         self.node_mixer_disabled = node_mixer_disabled
+        self.scheduler = DeadlineScheduler() # Disable/enable timers, the handler never sleeps
         self.start_time = datetime.now() # Start time of batch
         self.stop_time = datetime.now() # End time of batch
         self.stop_time_last = datetime.now() # End time of last batch
@@ -89,8 +85,9 @@ class DosingTimeHandler:
             logging.info("Mixer started.")
             self.start_time = time
 
-            await asyncio.sleep(BATCH_TIME)
-            await self.node_mixer_disabled.set_data_value(DATA_VALUE_TRUE)
+            # A pending enable of an earlier batch is stale
+            self.scheduler.cancel("enable")
+            self.scheduler.schedule("disable", BATCH_TIME, self.node_mixer_disabled.set_data_value, DATA_VALUE_TRUE)
         
         else:
             logging.info("Mixer stopped.")
@@ -106,12 +103,12 @@ class DosingTimeHandler:
             self.interval_times.append(interval_time)
             self.predictions.append(prediction)
             
-            logging.info("Batch duration [s]            : {0:.2f}".format(batch_time))
-            logging.info("Interval time [s]             : {0:.2f}".format(interval_time))
-            logging.info("Predicted mass flow rate      : {0:.5f}\n".format(prediction))
+            logging.info("Batch duration [s]            : %.2f", batch_time)
+            logging.info("Interval time [s]             : %.2f", interval_time)
+            logging.info("Predicted mass flow rate      : %.5f\n", prediction)
             
-            await asyncio.sleep(MIN_PAUSE)
-            await self.node_mixer_disabled.set_data_value(DATA_VALUE_FALSE)
+            # Re-armed if the mixer stops again before the pause is over
+            self.scheduler.schedule("enable", MIN_PAUSE, self.node_mixer_disabled.set_data_value, DATA_VALUE_FALSE)
 
     def event_notification(self, event):
         
@@ -132,5 +129,5 @@ class DosingTimeHandler:
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
     asyncio.run(main())
\ No newline at end of file
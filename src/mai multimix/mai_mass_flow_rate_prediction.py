@@ -2,42 +2,34 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
+import os
+import sys
 from datetime import datetime
-from asyncua import Client, ua
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
+from rolling_stats import RollingStats
+
+SIZES = [2, 4, 8, 16, 32] # Window sizes of the moving means
 
 async def main():
     
-    while True:
-        
-        client = Client(url="opc.tcp://10.129.4.80:48010")
-        
-        try:
-            async with client:
-
-                node_mixer_run = client.get_node("ns=2;s=Tags.GECO/MP_Mixer_Run")
-                mass_flow_handler = MassFlowHandler()
-                sub_mixer_run = await client.create_subscription(100, mass_flow_handler)
-                await sub_mixer_run.subscribe_data_change(node_mixer_run)
+    connection = ConnectionManager("opc.tcp://10.129.4.80:48010")
+    
+    mass_flow_handler = MassFlowHandler()
+    connection.add_subscription(100, mass_flow_handler, ["ns=2;s=Tags.GECO/MP_Mixer_Run"])
 
-                while True:
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws an exception if the connection is lost
-        
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: %s", e)
-        
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    await connection.run()
 
 
 class MassFlowHandler:
@@ -53,9 +45,9 @@ class MassFlowHandler:
         self.start_time = datetime.now() # Start time of batch
         self.stop_time = datetime.now() # End time of batch
         self.stop_time_last = datetime.now() # End time of last batch
-        self.interval_times = {} # Time between the end of two batches
-        self.batch_times = {} # Time between start of batch and end of batch
-        self.predictions = {} # Mass flow rate prediction
+        self.interval_times = RollingStats(SIZES) # Time between the end of two batches
+        self.batch_times = RollingStats(SIZES) # Time between start of batch and end of batch
+        self.predictions = RollingStats(SIZES) # Mass flow rate prediction
         self.dosing_flow_rate = 33.0 # Flow rate of mixer continous running
 
     async def datachange_notification(self, node, val, data):
@@ -80,22 +72,18 @@ class MassFlowHandler:
             interval_time = (self.stop_time - self.stop_time_last).total_seconds()
             prediction = self.dosing_flow_rate * (batch_time / interval_time)
             
-            self.batch_times[time] = batch_time
-            self.interval_times[time] = interval_time
-            self.predictions[time] = prediction
+            self.batch_times.add(batch_time)
+            self.interval_times.add(interval_time)
+            self.predictions.add(prediction)
 
-            logging.info("Batch duration [s]            : {0:.2f}".format(batch_time))
-            logging.info("Interval time [s]             : {0:.2f}".format(interval_time))
-            logging.info("Predicted mass flow rate      : {0:.5f}".format(prediction))
+            logging.info("Batch duration [s]            : %.2f", batch_time)
+            logging.info("Interval time [s]             : %.2f", interval_time)
+            logging.info("Predicted mass flow rate      : %.5f", prediction)
             
             # Mean of last x values
-            values = list(self.predictions.values())
-            sizes = [2, 4, 8, 16, 32]
-
-            for size in sizes:
-                sliced_values = values[-size:] if len(values) > size else values
-                mean = sum(sliced_values) / len(sliced_values)
-                logging.info("Mean predicted value k={0:<2}     : {1:.5f}".format(size, mean))
+            for size in SIZES:
+                mean = self.predictions.get_mean(size)
+                logging.info("Mean predicted value k=%-2d     : %.5f", size, mean)
 
     def event_notification(self, event):
         
@@ -116,5 +104,5 @@ class MassFlowHandler:
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
     asyncio.run(main())
\ No newline at end of file
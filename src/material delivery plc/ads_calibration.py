@@ -2,53 +2,279 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
+"""
+Calibration of the speed setpoint (AO0, mA) of the ADS against its mass flow rate.
+
+In the sweep mode every setpoint of SETPOINTS is written, the ADS runs for
+RUN_TIME seconds (DO0) and the mass flow rate is the weight change of the load
+cell divided by the run time. The weight is the mean over WEIGH_TIME before the
+start and after the stop. Without a load cell (LOAD_CELL_URL = None) the
+dispensed masses are entered after the sweep. A polynomial of degree DEGREE is
+fitted by least squares and written as a lookup table (speed -> mass flow rate)
+to TABLE. Every run is appended to RUNS as soon as it is measured. A run
+that fails on a connection error (also of the stop) is retried after the
+reconnect, a run without weight loss is retried at once, at most ATTEMPTS
+times in total, and then skipped.
+
+In the manual mode the speed and time of every run are entered, as before.
+Input is read on a separate thread: the connections stay alive while waiting.
+"""
+
 import asyncio
+import csv
 import logging
-from asyncua import Client, ua
+import os
+import sys
+import numpy as np
+from asyncua import Node, ua
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from connection_manager import CONNECTION_ERRORS, ConnectionManager
+from session_group import SessionGroup
+
+# Connections
+URL = "opc.tcp://10.129.4.30:4840"
+LOAD_CELL_URL = "opc.tcp://10.129.4.2:4840" # HBM load cell under the ADS, None to enter the dispensed masses after the sweep
+LOAD_CELL_USER = "Admin"
+LOAD_CELL_PASSWORD = "admin"
+LOAD_CELL_NODE = "ns=1;i=104" # [kg]
+
+# Calibration settings
+MODE = "sweep" # "sweep" (automated) or "manual" (speed and time entered per run)
+SETPOINTS = [4.0, 6.0, 8.0, 10.0, 12.0, 14.0, 16.0, 18.0, 20.0] # [FLOAT: mA]
+REPETITIONS = 1 # [INT: -], runs per setpoint
+RUN_TIME = 20.0 # [FLOAT: seconds], run time per setpoint
+SETTLE_TIME = 1.0 # [FLOAT: seconds], wait after writing the speed and after the stop
+WEIGH_TIME = 2.0 # [FLOAT: seconds], the weight is the mean over this time
+WEIGH_INTERVAL = 0.05 # [FLOAT: seconds], reading interval of the load cell while weighing
+ATTEMPTS = 3 # [INT: -], attempts of a setpoint, a failed attempt (connection error) is retried after the reconnect
+RECONNECT_TIMEOUT = 60.0 # [FLOAT: seconds], maximum wait for the reconnect after a connection error
+DEGREE = 1 # [INT: -], degree of the calibration polynomial
+TABLE_STEP = 0.5 # [FLOAT: mA], speed step of the lookup table
+TABLE = "D:/GitHub/Python-OPC-UA/src/material delivery plc/ads_calibration.csv"
+RUNS = "D:/GitHub/Python-OPC-UA/src/material delivery plc/ads_calibration_runs.csv"
+
 
 async def main():
-  
-    while True:
-        
-        client = Client(url="opc.tcp://10.129.4.30:4840")
 
+    managers = {"plc": ConnectionManager(URL)}
+
+    if MODE == "sweep" and LOAD_CELL_URL is not None:
+        managers["load_cell"] = ConnectionManager(LOAD_CELL_URL, user=LOAD_CELL_USER, password=LOAD_CELL_PASSWORD)
+
+    group = SessionGroup(managers)
+    node_do0 = group["plc"].get_node("ns=4;i=22") # Start/stop
+    node_ao0 = group["plc"].get_node("ns=4;i=78") # Speed
+    load_cell = group["load_cell"].get_node(LOAD_CELL_NODE) if "load_cell" in managers else None
+
+    async def session(group: SessionGroup):
+
+        if MODE == "manual":
+            await manual(node_ao0, node_do0)
+            return
+
+        runs = await sweep(group, node_ao0, node_do0, load_cell)
+
+        if load_cell is None:
+            await enter_masses(runs)
+            write_runs(runs, RUNS)
+
+        coefficients = fit(runs, DEGREE)
+        write_table(coefficients, TABLE)
+
+    await group.run(session)
+
+
+async def run_ads(node_ao0: Node, node_do0: Node, speed: float, duration: float) -> None:
+
+    """Runs the ADS at a speed [mA] for a duration [s]. The stop is always written, also when cancelled, a failing stop is raised."""
+
+    await node_ao0.write_value(ua.DataValue(ua.Variant(float(speed), ua.VariantType.Float)))
+    await asyncio.sleep(SETTLE_TIME)
+
+    try:
+        await node_do0.write_value(ua.DataValue(ua.Variant(True, ua.VariantType.Boolean)))
+        await asyncio.sleep(duration)
+    finally:
         try:
-            async with client:               
-
-                node_do0 = client.get_node("ns=4;i=22") # Start/stop
-                node_ao0 = client.get_node("ns=4;i=78") # Speed
-
-                while True:
-                    
-                    val1 = input("Enter speed [mA]: ")
-                    val2 = input("Enter time [s]: ")
-                    
-                    await node_ao0.write_value(ua.DataValue(ua.Variant(float(val1), ua.VariantType.Float)))
-                    await asyncio.sleep(1)
-                    await node_do0.write_value(ua.DataValue(ua.Variant(True, ua.VariantType.Boolean)))
-                    
-                    await asyncio.sleep(float(val2))
-                    
-                    await node_do0.write_value(ua.DataValue(ua.Variant(False, ua.VariantType.Boolean)))
-                    
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws a exception if connection is lost
-        
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+            await node_do0.write_value(ua.DataValue(ua.Variant(False, ua.VariantType.Boolean)))
+        except Exception as e:
+            logging.error("Failed to stop the ADS, check that it stopped: {}".format(e))
+            raise # The ADS may still be running, the run is not valid
+
+
+async def weigh(node: Node) -> float:
+
+    """Returns the mean weight [kg] over WEIGH_TIME."""
+
+    values = []
+
+    for _ in range(max(1, round(WEIGH_TIME / WEIGH_INTERVAL))):
+        values.append(await node.read_value())
+        await asyncio.sleep(WEIGH_INTERVAL)
+
+    return float(np.mean(values))
+
+
+async def measure(node_ao0: Node, node_do0: Node, load_cell: Node, speed: float) -> dict:
+
+    """
+    Runs one setpoint and returns the run as a dictionary with the speed [mA], the
+    run time [s], the dispensed mass [kg] (None without load cell) and the mass
+    flow rate [kg/s]. Raises a ValueError if the weight didn't decrease.
+    """
+
+    before = await weigh(load_cell) if load_cell is not None else None
+    await run_ads(node_ao0, node_do0, speed, RUN_TIME)
+    await asyncio.sleep(SETTLE_TIME)
+    run = {"speed": speed, "time": RUN_TIME, "mass": None, "flow": None}
+
+    if load_cell is not None:
+        after = await weigh(load_cell)
+        if before - after <= 0:
+            raise ValueError("no weight loss ({0:.4f} kg), refilled or no material".format(before - after))
+        run["mass"] = before - after
+        run["flow"] = run["mass"] / RUN_TIME
+
+    return run
+
+
+async def sweep(group: SessionGroup, node_ao0: Node, node_do0: Node, load_cell: Node = None) -> list:
+
+    """
+    Runs all setpoints and returns the runs (see measure). Every run is appended
+    to RUNS when it is measured. A setpoint that fails on a connection error is
+    retried after the reconnect, a run without weight loss is retried at once,
+    and the setpoint is skipped after ATTEMPTS attempts.
+    """
+
+    runs = []
+    total = len(SETPOINTS) * REPETITIONS
+    write_runs([], RUNS)
+
+    for repetition in range(REPETITIONS):
+        for speed in SETPOINTS:
+            for attempt in range(1, ATTEMPTS + 1):
+                try:
+                    run = await measure(node_ao0, node_do0, load_cell, speed)
+                    break
+                except CONNECTION_ERRORS as e:
+                    run = None
+                    logging.warning("Run at {0:.2f} mA failed (attempt {1}/{2}): {3}".format(speed, attempt, ATTEMPTS, e))
+                    try:
+                        await asyncio.wait_for(group.wait_connected(), RECONNECT_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        logging.warning("Not reconnected within {:.0f} seconds.".format(RECONNECT_TIMEOUT))
+                except ValueError as e:
+                    run = None
+                    logging.warning("Run at {0:.2f} mA rejected (attempt {1}/{2}): {3}".format(speed, attempt, ATTEMPTS, e))
+
+            if run is None:
+                logging.error("Setpoint {:.2f} mA skipped.".format(speed))
+                continue
+
+            runs.append(run)
+            append_run(run, RUNS)
+            logging.info("Run {0}/{1}: speed {2:.2f} mA, mass {3}".format(
+                len(runs), total, speed, "{0:.4f} kg".format(run["mass"]) if run["mass"] is not None else "to be entered"))
+
+    return runs
+
+
+async def enter_masses(runs: list) -> None:
+
+    """Asks the dispensed mass of every run, input is read on a separate thread."""
+
+    for i, run in enumerate(runs):
+        while True:
+            text = await asyncio.to_thread(input, "Run {0}/{1}, speed {2:.2f} mA, mass [kg]: ".format(i + 1, len(runs), run["speed"]))
+            try:
+                run["mass"] = float(text)
+                break
+            except ValueError:
+                logging.warning("Not a number: {}".format(text))
+
+        run["flow"] = run["mass"] / run["time"]
+
+
+async def manual(node_ao0: Node, node_do0: Node) -> None:
+
+    """Runs the ADS at the entered speed for the entered time, until stopped."""
+
+    while True:
+        speed = await asyncio.to_thread(input, "Enter speed [mA]: ")
+        duration = await asyncio.to_thread(input, "Enter time [s]: ")
+        await run_ads(node_ao0, node_do0, float(speed), float(duration))
+        await asyncio.sleep(1)
+
+
+def fit(runs: list, degree: int) -> np.ndarray:
+
+    """Fits the mass flow rate [kg/s] as a polynomial of the speed [mA] by least squares, highest power first."""
+
+    speeds = np.array([run["speed"] for run in runs], dtype=np.float64)
+    flows = np.array([run["flow"] for run in runs], dtype=np.float64)
+
+    if len(np.unique(speeds)) <= degree:
+        raise ValueError("A polynomial of degree {0} needs more than {0} different setpoints".format(degree))
+
+    coefficients = np.polyfit(speeds, flows, degree)
+    residuals = flows - np.polyval(coefficients, speeds)
+    logging.info("Coefficients (highest power first): {0}, residual RMS: {1:.6f} kg/s".format(
+        ", ".join("{:.6g}".format(c) for c in coefficients), float(np.sqrt(np.mean(residuals**2)))))
+
+    return coefficients
+
+
+def write_table(coefficients: np.ndarray, file: str) -> None:
+
+    """Writes the lookup table speed [mA] -> mass flow rate [kg/s] over the range of the setpoints."""
+
+    speeds = np.arange(min(SETPOINTS), max(SETPOINTS) + TABLE_STEP / 2, TABLE_STEP)
+
+    with open(file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Speed [mA]", "Mass flow rate [kg/s]"])
+        for speed, flow in zip(speeds, np.polyval(coefficients, speeds)):
+            writer.writerow(["{0:.3f}".format(speed), "{0:.6f}".format(flow)])
+
+    logging.info("Lookup table written to {}".format(file))
+
+
+def write_runs(runs: list, file: str) -> None:
+
+    """Writes the header and the measured runs, replaces the file."""
+
+    with open(file, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Speed [mA]", "Time [s]", "Mass [kg]", "Mass flow rate [kg/s]"])
+        writer.writerows(format_run(run) for run in runs)
+
+
+def append_run(run: dict, file: str) -> None:
+
+    """Appends a run, the runs measured so far are kept if the calibration fails later on."""
+
+    with open(file, "a", newline="") as f:
+        csv.writer(f).writerow(format_run(run))
+
+
+def format_run(run: dict) -> list:
+
+    """Formats a run as a row, the mass and mass flow rate are empty until they are known."""
+
+    return ["{0:.3f}".format(run["speed"]), "{0:.3f}".format(run["time"])] + [
+        "{0:.6f}".format(run[key]) if run[key] is not None else "" for key in ("mass", "flow")]
 
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
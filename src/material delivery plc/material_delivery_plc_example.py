@@ -2,41 +2,31 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
-from asyncua import Client, Node, ua
+import os
+import sys
+from asyncua import Node, ua
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
 
 async def main():
   
     handler = SubHandler()
 
-    while True:
-        
-        client = Client(url="opc.tcp://10.129.4.30:4840")
-
-        try:
-            async with client:               
-
-                subscription = await client.create_subscription(10, handler)
-                node = client.get_node("ns=2;i=90") # TODO: check node id
-                await subscription.subscribe_data_change(node)
-                
-                while True:
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws a exception if connection is lost
-        
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    connection = ConnectionManager("opc.tcp://10.129.4.30:4840")
+    connection.add_subscription(10, handler, ["ns=2;i=90"]) # TODO: check node id
+    
+    await connection.run()
 
 
 class SubHandler:
@@ -73,5 +63,5 @@ class SubHandler:
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO, rate_limit=10) # Every notification is logged, at most 10 per second are printed
     asyncio.run(main())
\ No newline at end of file
@@ -2,83 +2,49 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
+import os
+import sys
 from datetime import datetime
-from asyncua import Client, Node, ua
+from asyncua import Node, ua
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
+from heartbeat import Heartbeat
+from rolling_stats import RollingStats
 
-async def main():
-  
-    while True:
-        
-        client = Client(url="opc.tcp://10.129.4.73:4840")
-
-        try:
-            async with client:
-
-                # Live bit handler
-                livebit2duomix = client.get_node("ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.Livebit2DuoMix")
-                live_bit_handler = LivebitHandler(livebit2duomix)
-                livebit2extern = client.get_node("ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.Livebit2extern")
-                sub_live_bit = await client.create_subscription(1000, live_bit_handler)
-                await sub_live_bit.subscribe_data_change(livebit2extern)
-                
-                # Prediction of mass flow rate
-                sub_handler_flow = SubHandlerFlow() 
-                node_flow = client.get_node("ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.aut_solenoid_valve")
-                sub_flow = await client.create_subscription(10, sub_handler_flow)
-                await sub_flow.subscribe_data_change(node_flow)
-
-                while True:
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws a exception if connection is lost
-        
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
-
-
-# Toggle Livebit by subscription
-class LivebitHandler:
-
-    """
-    Subscription Handler. To receive events from server for a subscription.
-    """
-    
-    def __init__(self, livebit2duomix):
+URL = "opc.tcp://10.129.4.73:4840"
+WATCHDOG_TIME = 3.0 # [FLOAT: seconds], livebit watchdog of the DuoMix
+WATCHDOG_MARGIN = 1.0 # [FLOAT: seconds], local alarm this long before the watchdog expires
 
-        """Initializes the event handler."""
-    
-        self.livebit2duomix = livebit2duomix
 
-    async def datachange_notification(self, node: Node, value, data):
-        await self.livebit2duomix.set_value(ua.Variant(value, ua.VariantType.Boolean))
-
-    def event_notification(self, event: ua.EventNotificationList):
-        
-        """
-        Called for every event notification from server
-        """
+async def main():
+  
+    # Live bit: echoed on its own thread and session, independent of this event loop
+    heartbeat = Heartbeat(URL, "ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.Livebit2extern",
+                          "ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.Livebit2DuoMix",
+                          watchdog_time=WATCHDOG_TIME, margin=WATCHDOG_MARGIN)
+    heartbeat.start()
 
-        pass
+    connection = ConnectionManager(URL)
 
-    def status_change_notification(self, status: ua.StatusChangeNotification):
-        
-        """
-        Called for every status change notification from server.
-        """
+    # Prediction of mass flow rate
+    sub_handler_flow = SubHandlerFlow() 
+    connection.add_subscription(10, sub_handler_flow, ["ns=4;s=|var|ECC2100 0.8S 1131.Application.GVL_OPC.aut_solenoid_valve"])
 
-        pass 
+    try:
+        await connection.run()
+    finally:
+        heartbeat.stop()
 
 
 class SubHandlerFlow:
@@ -93,9 +59,7 @@ class SubHandlerFlow:
 
         self.last_batch_start = datetime.now()
         self.last_batch_end = datetime.now()
-        self.dict_batch_duration = {}
-        self.dict_batch_interval = {}
-        self.dict_pred_mass_flow = {}
+        self.pred_mass_flow = RollingStats([10, 20, 40, 60]) # Moving means with bounded memory
         self.counter = 0
 
     def datachange_notification(self, node: Node, val, data):
@@ -121,43 +85,25 @@ class SubHandlerFlow:
             pred = 27.0 * (float(duration) / interval)
 
             # Set values
-            self.dict_batch_duration[time] = duration
-            self.dict_batch_interval[time] = interval
-            self.dict_pred_mass_flow[time] = pred
+            self.pred_mass_flow.add(pred)
             self.last_batch_end = time
             
-            # Get all values from dictionary
-            values = list(self.dict_pred_mass_flow.values())
-            
-            values60 = values
-            values40 = values
-            values20 = values
-            values10 = values
-
-            if (len(values) > 60):
-                values60 = values[-60:]
-            if (len(values) > 40):
-                values40 = values[-40:]
-            if (len(values) > 20):
-                values20 = values[-20:]
-            if (len(values) > 10):
-                values10 = values[-10:]
-                
-            mean10 = sum(values10) / len(values10)
-            mean20 = sum(values20) / len(values20)
-            mean40 = sum(values40) / len(values40)
-            mean60 = sum(values60) / len(values60)
+            # Moving means of the last 10, 20, 40 and 60 predictions
+            mean10 = self.pred_mass_flow.get_mean(10)
+            mean20 = self.pred_mass_flow.get_mean(20)
+            mean40 = self.pred_mass_flow.get_mean(40)
+            mean60 = self.pred_mass_flow.get_mean(60)
 
             self.counter += 1
 
-            logging.info("Counter [-]                               : {}".format(self.counter))
-            logging.info("Batch interval [sec]                      : {0:.2f}".format(interval))
-            logging.info("Batch duration [sec]                      : {0:.2f}".format(duration))
-            logging.info("Predicted flow (actual) [kg/min]          : {0:.1f}".format(pred))
-            logging.info("Predicted flow (movmean 10) [kg/min]      : {0:.1f}".format(mean10))
-            logging.info("Predicted flow (movmean 20) [kg/min]      : {0:.1f}".format(mean20))
-            logging.info("Predicted flow (movmean 40) [kg/min]      : {0:.1f}".format(mean40))
-            logging.info("Predicted flow (movmean 60) [kg/min]      : {0:.1f}\n".format(mean60))
+            logging.info("Counter [-]                               : %d", self.counter)
+            logging.info("Batch interval [sec]                      : %.2f", interval)
+            logging.info("Batch duration [sec]                      : %.2f", duration)
+            logging.info("Predicted flow (actual) [kg/min]          : %.1f", pred)
+            logging.info("Predicted flow (movmean 10) [kg/min]      : %.1f", mean10)
+            logging.info("Predicted flow (movmean 20) [kg/min]      : %.1f", mean20)
+            logging.info("Predicted flow (movmean 40) [kg/min]      : %.1f", mean40)
+            logging.info("Predicted flow (movmean 60) [kg/min]      : %.1f\n", mean60)
 
     def event_notification(self, event: ua.EventNotificationList):
         
@@ -176,5 +122,5 @@ class SubHandlerFlow:
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO)
     asyncio.run(main())
\ No newline at end of file
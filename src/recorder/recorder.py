@@ -0,0 +1,406 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+"""
+Config-driven recorder for all machines, in a single process.
+
+A JSON config file lists the endpoints (url, credentials and security), the
+subscriptions per endpoint (publishing interval, sampling interval, queue size
+and the nodes) and the sinks the samples are written to. All endpoints run in
+one event loop: every endpoint has its own session that reconnects on its own
+(see common/session_group.py), and the notifications of every publish response
+are handled as one batch (see common/batch_handler.py).
+
+Config:
+    {
+        "log_interval": 10,
+        "sinks": {
+            "csv": {"type": "csv", "file": "recording.csv", "max_bytes": 104857600, "rotate_daily": true},
+            "signals": {"type": "signal", "directory": "signals"}},
+        "endpoints": {
+            "hbm": {
+                "url": "opc.tcp://10.129.4.2:4840", "user": "Admin", "password": "admin",
+                "security": {"policy": "Basic256Sha256", "certificate": "client.der", "private_key": "client.pem",
+                             "application_uri": "urn:host:client"},
+                "subscriptions": [{
+                    "publishing_interval": 200, "sampling_interval": 20, "queuesize": 20, "sink": "signals",
+                    "nodes": {"Load": {"node_id": "ns=1;i=104", "aggregate": {"window": 1.0, "lttb_points": 100, "pre": 10, "post": 30}},
+                              "Other": {"node_id": "ns=1;i=105", "sampling_interval": 100, "queuesize": 4, "type": "bool", "flags": ["Load"]},
+                              "Force": {"node_id": "ns=1;i=106", "deadband": {"type": "absolute", "value": 0.05}}}}]}}}
+
+Relative paths are relative to the config file. Samples are written with the
+source timestamp. A CSV sink holds the samples of all its nodes as rows
+(time, endpoint, name, value). A signal sink writes one signal file per node
+(see common/signal_store.py) named <endpoint>_<name>.sig. With "aggregate" the
+samples of a node in a signal sink are reduced before they are stored (see
+common/aggregation.py): the keys are the arguments of AggregatingWriter. A node
+with "flags" flags an event on the listed nodes of the same endpoint (in the
+same or an earlier subscription) when its value becomes true: their raw samples
+around that moment are kept.
+
+The monitoring settings (sampling_interval, queuesize, discard_oldest, trigger
+and deadband) of a subscription apply to all its nodes, a node can override
+them (see common/monitoring.py). With a deadband or trigger the server only
+reports the changes that matter; the notifications saved per second are logged per item.
+
+With "metrics": {"port": 9100} the notification rate, delay and handler time
+per item, the connection statistics per endpoint and the queue depths of the
+sinks are served in the Prometheus text format (see common/metrics.py).
+
+Usage: python recorder.py recorder_config.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from aggregation import AggregatingWriter
+from async_logging import setup_logging
+from batch_handler import BatchHandler, get_source_time
+from connection_manager import ConnectionManager, create_connection
+from csv_logger import CsvLogger
+from metrics import MetricsHandler, MetricsRegistry, MetricsServer, register_connection
+from monitoring import load_monitoring, log_savings
+from session_group import SessionGroup
+from signal_store import SignalWriter, to_nanoseconds
+
+# Defaults of the config file
+LOG_INTERVAL = 10.0 # [FLOAT: seconds]
+PUBLISHING_INTERVAL = 1000 # [FLOAT: milliseconds]
+CONNECT_TIMEOUT = 10.0 # [FLOAT: seconds]
+
+
+class CsvSink:
+
+    """Writes the samples of all its nodes as (time, endpoint, name, value) rows to a CSV file."""
+
+    def __init__(self, file: str, max_bytes: int = None, rotate_daily: bool = False):
+
+        """Initializes the sink."""
+
+        self.logger = CsvLogger(file, ["Time", "Endpoint", "Name", "Value"], max_bytes=max_bytes,
+                                rotate_daily=rotate_daily, formatter=format_row)
+
+    def add(self, endpoint: str, name: str, value_type: str, aggregate: dict = None) -> None:
+
+        """Adds a node, the rows of all nodes are written to the same file."""
+
+        if aggregate is not None:
+            raise ValueError("Aggregation of {0} {1} is only supported in a signal sink".format(endpoint, name))
+
+    def flag(self, endpoint: str, name: str, timestamp: int) -> None:
+
+        """Flags an event, all samples are kept."""
+
+        pass
+
+    def write(self, endpoint: str, name: str, times: list, values: list) -> None:
+
+        """Queues the samples of one node, written by the logger thread."""
+
+        self.logger.write_rows((date, endpoint, name, value) for date, value in zip(times, values))
+
+    def get_queue_depth(self) -> int:
+
+        """Returns the number of rows that are not written yet."""
+
+        return self.logger.get_stats()["queue_depth"]
+
+    def open(self) -> None:
+        self.logger.start()
+
+    def close(self) -> None:
+        self.logger.stop()
+
+
+class SignalSink:
+
+    """Writes the samples of every node to its own signal file in a directory."""
+
+    def __init__(self, directory: str):
+
+        """Initializes the sink."""
+
+        self.directory = directory
+        self.writers = {}
+
+    def add(self, endpoint: str, name: str, value_type: str, aggregate: dict = None) -> None:
+
+        """Adds a node with its value type (float64 or bool) and the optional aggregation settings."""
+
+        file = os.path.join(self.directory, "{0}_{1}.sig".format(endpoint, name))
+
+        if aggregate is not None:
+            self.writers[(endpoint, name)] = AggregatingWriter(file, name=name, **aggregate)
+        else:
+            self.writers[(endpoint, name)] = SignalWriter(file, value_type, name=name)
+
+    def flag(self, endpoint: str, name: str, timestamp: int) -> None:
+
+        """Flags an event on a node, only aggregated nodes keep the raw samples around events."""
+
+        writer = self.writers[(endpoint, name)]
+
+        if isinstance(writer, AggregatingWriter):
+            writer.flag(timestamp)
+
+    def write(self, endpoint: str, name: str, times: list, values: list) -> None:
+
+        """Appends the samples of one node."""
+
+        self.writers[(endpoint, name)].extend([to_nanoseconds(date) for date in times], values)
+
+    def get_queue_depth(self) -> int:
+
+        """Returns the number of samples that are not written yet, of all nodes."""
+
+        return sum(writer.get_stats()["queue_depth"] for writer in self.writers.values())
+
+    def open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        for writer in self.writers.values():
+            writer.open()
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+
+
+class EndpointRecorder:
+
+    """
+    Records the subscriptions of one endpoint to the sinks and keeps the
+    throughput statistics of the endpoint.
+    """
+
+    def __init__(self, name: str, connection: ConnectionManager, registry: MetricsRegistry = None):
+
+        """Initializes the recorder of an endpoint, with the optional metrics registry."""
+
+        self.name = name
+        self.connection = connection
+        self.registry = registry
+        self.handlers = []
+        self.samples = 0
+        self.bad_samples = 0
+        self.items = {} # Node id -> (name, sink), as configured
+        self.flags = {} # Node id -> names of the nodes flagged when its value becomes true
+        self._sinks = {} # Name -> sink
+        self._last_values = {}
+        self._names = None # Node id object -> (name, sink), the node ids are known after connect
+
+    def add_subscription(self, config: dict, sinks: dict) -> None:
+
+        """Adds a subscription from the config, with one batch handler."""
+
+        sink = sinks[config["sink"]]
+        node_ids = []
+
+        for name, node in config["nodes"].items():
+            if isinstance(node, str):
+                node = {"node_id": node}
+            node_id = node["node_id"]
+            node_ids.append(node_id)
+            self.items[node_id] = (name, sink)
+            self._sinks[name] = sink
+            sink.add(self.name, name, node.get("type", "float64"), node.get("aggregate"))
+
+            if "flags" in node:
+                self.flags[node_id] = node["flags"]
+
+        # The flagged nodes should be known before the first trigger
+        for node_id in node_ids:
+            for name in self.flags.get(node_id, []):
+                if name not in self._sinks:
+                    raise ValueError("{0} {1} flags the unknown node {2}, it should be in the same or an earlier subscription".format(
+                        self.name, self.items[node_id][0], name))
+
+        # Sampling interval, queue and data change filter, per subscription and per node
+        monitoring, settings = load_monitoring(config)
+        handler = BatchHandler(self.process)
+        self.handlers.append(handler)
+
+        if self.registry is not None:
+            labels = {"endpoint": self.name, "subscription": str(len(self.handlers))}
+            self.registry.histogram("recorder_batch_seconds", "Execution time of the recorder per publish response.", labels, handler.callback_time)
+            handler = MetricsHandler(handler, self.registry, self.name, {node_id: self.items[node_id][0] for node_id in node_ids})
+
+        self.connection.add_subscription(config.get("publishing_interval", PUBLISHING_INTERVAL), handler, node_ids,
+                                         settings=settings or None, monitoring=monitoring)
+
+    def process(self, batch: list) -> None:
+
+        """Called with all notifications of one publish response: groups the samples per node."""
+
+        if self._names is None:
+            self._names = {self.connection.get_node(node_id).nodeid: item for node_id, item in self.items.items()}
+
+        samples = {}
+
+        for node, data_value in batch:
+            item = self._names.get(node.nodeid)
+
+            if item is None:
+                continue
+
+            # Bad, uncertain and empty values are not recorded
+            if (data_value.StatusCode is not None and not data_value.StatusCode.is_good()) or data_value.Value is None or data_value.Value.Value is None:
+                self.bad_samples += 1
+                continue
+
+            times, values = samples.setdefault(item, ([], []))
+            times.append(get_source_time(data_value))
+            values.append(data_value.Value.Value)
+
+        # Flags first: the samples before the event are still kept by the event capture of the flagged nodes
+        if len(self.flags) > 0:
+            self._flag(samples)
+
+        for (name, sink), (times, values) in samples.items():
+            sink.write(self.name, name, times, values)
+            self.samples += len(times)
+
+    def _flag(self, samples: dict) -> None:
+
+        """Flags the events of the trigger nodes: a change of the value to true."""
+
+        for node_id, names in self.flags.items():
+            item = self.items[node_id]
+
+            if item not in samples:
+                continue
+
+            for date, value in zip(*samples[item]):
+                if value and not self._last_values.get(node_id):
+                    for name in names:
+                        self._sinks[name].flag(self.name, name, to_nanoseconds(date))
+                self._last_values[node_id] = value
+
+    def get_stats(self) -> dict:
+
+        """Returns the recording and connection statistics of the endpoint."""
+
+        stats = self.connection.get_stats()
+        stats.update({
+            "items": len(self.items),
+            "notifications": sum(handler.notifications for handler in self.handlers),
+            "batches": sum(handler.batches for handler in self.handlers),
+            "samples": self.samples,
+            "bad_samples": self.bad_samples})
+
+        return stats
+
+
+def format_row(row: tuple) -> list:
+
+    """Formats a (datetime, endpoint, name, value) sample as a row of the CSV file, in local time."""
+
+    date, endpoint, name, value = row
+
+    return [date.astimezone().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3], endpoint, name, value]
+
+
+def create_sink(config: dict, directory: str):
+
+    """Returns the sink of a sink config. Relative paths are relative to the given directory."""
+
+    if config["type"] == "csv":
+        return CsvSink(os.path.join(directory, config["file"]), config.get("max_bytes"), config.get("rotate_daily", False))
+    if config["type"] == "signal":
+        return SignalSink(os.path.join(directory, config["directory"]))
+
+    raise ValueError("Unknown sink type: {}".format(config["type"]))
+
+
+async def log_stats(recorders: list, interval: float) -> None:
+
+    """Logs the throughput of every endpoint every interval."""
+
+    last_time = time.monotonic()
+    last = {recorder.name: 0 for recorder in recorders}
+
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+
+        for recorder in recorders:
+            stats = recorder.get_stats()
+            rate = (stats["notifications"] - last[recorder.name]) / (now - last_time)
+            last[recorder.name] = stats["notifications"]
+            logging.info("{0}: {1}, {2} items, {3:.0f} notifications/s in {4} batches, samples: {5}, bad: {6}, reconnects: {7}".format(
+                recorder.name, stats["state"], stats["items"], rate, stats["batches"], stats["samples"], stats["bad_samples"], stats["reconnects"]))
+            log_savings(recorder.connection)
+
+        last_time = now
+
+
+async def run(file: str) -> None:
+
+    """Records all endpoints of a config file until cancelled."""
+
+    with open(file) as handle:
+        config = json.load(handle)
+
+    directory = os.path.dirname(os.path.abspath(file))
+    sinks = {name: create_sink(sink, directory) for name, sink in config["sinks"].items()}
+    recorders = []
+    registry = None
+    server = None
+
+    if "metrics" in config:
+        registry = MetricsRegistry()
+        server = MetricsServer(registry, config["metrics"].get("port", 9100), config["metrics"].get("host", "127.0.0.1"))
+        for name, sink in sinks.items():
+            registry.gauge("recorder_sink_queue_depth", "Samples that are not written yet.", sink.get_queue_depth, {"sink": name})
+
+    for name, endpoint in config["endpoints"].items():
+        recorder = EndpointRecorder(name, await create_connection(endpoint, directory, CONNECT_TIMEOUT), registry)
+        for subscription in endpoint["subscriptions"]:
+            recorder.add_subscription(subscription, sinks)
+        if registry is not None:
+            register_connection(registry, name, recorder.connection)
+        recorders.append(recorder)
+
+    group = SessionGroup({recorder.name: recorder.connection for recorder in recorders})
+    logging.info("Recording {0} items of {1} endpoints.".format(sum(len(recorder.items) for recorder in recorders), len(recorders)))
+
+    for sink in sinks.values():
+        sink.open()
+
+    if server is not None:
+        server.start()
+
+    try:
+        await asyncio.gather(group.run(), log_stats(recorders, config.get("log_interval", LOG_INTERVAL)))
+    finally:
+        if server is not None:
+            server.stop()
+        for sink in sinks.values():
+            sink.close()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Records the nodes of all endpoints of a config file.")
+    parser.add_argument("config", help="JSON config file with the endpoints, subscriptions and sinks.")
+    args = parser.parse_args()
+    asyncio.run(run(args.config))
+
+
+if __name__ == "__main__":
+    logging.getLogger('asyncua').setLevel(logging.WARNING)
+    setup_logging(logging.INFO)
+    main()
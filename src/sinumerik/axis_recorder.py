@@ -0,0 +1,181 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+# This file is part of Python-OPC-UA.
+# Project: https://github.com/3DCP-TUe/Python-OPC-UA
+#
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
+#
+# Authors:
+#   - Arjen Deetman (2024-2026)
+#
+# For license details, see the LICENSE file in the project root.
+
+import asyncio
+import logging
+import math
+import os
+import sys
+import time
+from datetime import datetime
+from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from batch_handler import BatchHandler, get_source_time
+from connection_manager import ConnectionManager
+from monitoring import MonitoringConfig, log_savings
+from signal_store import SignalWriter, to_nanoseconds
+
+URL = "opc.tcp://10.129.4.100:4840"
+USER = "TUe" # User with write and read access
+PASSWORD = "TUe"
+CERT = "PythonOPCUA-Client@TUE025918.der"
+PRIVATE_KEY = "PythonOPCUA-Client@TUE025918.pem"
+APPLICATION_URI = "urn:TUE025918:PythonOPCUA-Client"
+SECURITY = True # False for the plant simulator (local/plant_simulator.py)
+CONNECT_TIMEOUT = 5.0 # [FLOAT: seconds], abort a connection attempt (including the handshake) after this time
+
+# Recording
+DIRECTORY = "D:/GitHub/Python-OPC-UA/src/sinumerik" # A sub folder per recording, one signal file per channel
+AXES = [1, 2, 3, 4] # Machine axes of channel 1
+CHANNELS = {
+    "aaIm": (10, 0.001), # Actual position, machine coordinates: sampling interval [ms], absolute deadband [mm]
+    "aaVactM": (10, 0.01)} # Actual velocity, machine coordinates: sampling interval [ms], absolute deadband [mm/min]
+PUBLISHING_INTERVAL = 100 # [FLOAT: milliseconds]
+QUEUE_MARGIN = 2.0 # [FLOAT: -], queue size = QUEUE_MARGIN * samples per publishing interval, headroom for late publishes
+LOG_INTERVAL = 10.0 # [FLOAT: seconds]
+
+# Overflow bit of the status code: the server queue of the item was full and samples were discarded
+STATUS_OVERFLOW = 0x0480 # InfoType DataValue (0x0400) + Overflow (0x0080)
+
+
+async def main():
+
+    connection = ConnectionManager(URL, user=USER, password=PASSWORD, connect_timeout=CONNECT_TIMEOUT)
+
+    if SECURITY:
+        await connection.set_security(SecurityPolicyBasic256Sha256, certificate=CERT, private_key=PRIVATE_KEY,
+                                      application_uri=APPLICATION_URI)
+
+    # Node ids and per item sampling interval, queue size and deadband: a standing axis sends no samples
+    channels = {}
+    settings = {}
+
+    for variable, (sampling_interval, deadband) in CHANNELS.items():
+        queuesize = math.ceil(QUEUE_MARGIN * PUBLISHING_INTERVAL / sampling_interval)
+        monitoring = MonitoringConfig(sampling_interval, queuesize, deadband_type="absolute", deadband_value=deadband)
+        for axis in AXES:
+            node_id = "ns=2;s=/Channel/MachineAxis/{0}[1,{1}]".format(variable, axis)
+            channels[node_id] = "{0}_{1}".format(variable, axis)
+            settings[node_id] = monitoring
+
+    directory = os.path.join(DIRECTORY, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(directory, exist_ok=True)
+    recorder = AxisRecorder(connection, channels, directory)
+
+    # One subscription for all channels, restored by the connection manager after every reconnect
+    handler = BatchHandler(recorder.process)
+    connection.add_subscription(PUBLISHING_INTERVAL, handler, list(channels.keys()), settings=settings)
+    logging.info("Recording {0} channels to {1}.".format(len(channels), directory))
+
+    with recorder:
+        await asyncio.gather(connection.run(), recorder.log_stats(connection, handler))
+
+
+class AxisRecorder:
+
+    """
+    Writes the axis samples of a subscription to one signal file per channel.
+
+    The notifications of a publish response are decoded as one batch: the
+    samples are grouped per channel and appended to the signal writers at once.
+    The number of samples with the overflow bit set is counted per channel: the
+    server discarded samples of that item because its queue was full.
+    """
+
+    def __init__(self, connection: ConnectionManager, channels: dict, directory: str):
+
+        """Initializes the recorder. channels: dictionary node id -> channel name."""
+
+        self.connection = connection
+        self.channels = channels
+        self.writers = {name: SignalWriter(os.path.join(directory, name + ".sig"), "float64", name=name) for name in channels.values()}
+        self.samples = {name: 0 for name in channels.values()}
+        self.overflows = {name: 0 for name in channels.values()}
+        self.bad_samples = 0
+        self._names = None # Node id object -> channel name, the node ids are known after connect
+
+    def __enter__(self):
+        for writer in self.writers.values():
+            writer.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for writer in self.writers.values():
+            writer.close()
+
+    def process(self, batch: list) -> None:
+
+        """Called with all notifications of one publish response."""
+
+        if self._names is None:
+            self._names = {self.connection.get_node(node_id).nodeid: name for node_id, name in self.channels.items()}
+
+        timestamps = {}
+        values = {}
+
+        for node, data_value in batch:
+            name = self._names.get(node.nodeid)
+
+            if name is None:
+                continue
+
+            status = data_value.StatusCode.value if data_value.StatusCode is not None else 0
+
+            if status & STATUS_OVERFLOW == STATUS_OVERFLOW:
+                self.overflows[name] += 1
+
+            # Bad and uncertain values are not recorded, the overflow bit is info only
+            if (data_value.StatusCode is not None and not data_value.StatusCode.is_good()) or data_value.Value is None or data_value.Value.Value is None:
+                self.bad_samples += 1
+                continue
+
+            timestamps.setdefault(name, []).append(to_nanoseconds(get_source_time(data_value)))
+            values.setdefault(name, []).append(data_value.Value.Value)
+
+        for name, times in timestamps.items():
+            self.writers[name].extend(times, values[name])
+            self.samples[name] += len(times)
+
+    async def log_stats(self, connection: ConnectionManager, handler: BatchHandler) -> None:
+
+        """Logs the notification rate, the overflow counts and the savings of the deadbands every LOG_INTERVAL."""
+
+        last_time = time.monotonic()
+        last_notifications = 0
+        last_overflows = dict(self.overflows)
+
+        while True:
+            await asyncio.sleep(LOG_INTERVAL)
+
+            now = time.monotonic()
+            notifications = handler.notifications
+            overflows = sum(self.overflows.values())
+            rate = (notifications - last_notifications) / (now - last_time)
+            logging.info("Notifications: {0:.0f}/s in {1} batches, samples: {2}, overflows: {3}, bad: {4}".format(
+                rate, handler.batches, sum(self.samples.values()), overflows, self.bad_samples))
+
+            for name, count in self.overflows.items():
+                if count > last_overflows[name]:
+                    logging.warning("{0}: {1} new samples with overflow, increase the queue size or decrease the publishing interval.".format(name, count - last_overflows[name]))
+
+            log_savings(connection)
+
+            last_time = now
+            last_notifications = notifications
+            last_overflows = dict(self.overflows)
+
+
+if __name__ == "__main__":
+    logging.getLogger('asyncua').setLevel(logging.WARNING)
+    setup_logging(logging.INFO)
+    asyncio.run(main())
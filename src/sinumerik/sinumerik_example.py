@@ -2,52 +2,43 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
-from asyncua import Client, Node, ua
+import os
+import sys
+from asyncua import Node, ua
 from asyncua.crypto.security_policies import SecurityPolicyBasic256Sha256
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from async_logging import setup_logging
+from connection_manager import ConnectionManager
+
 CERT = "PythonOPCUA-Client@TUE025918.der"
 PRIVATE_KEY = "PythonOPCUA-Client@TUE025918.pem"
+CONNECT_TIMEOUT = 5.0 # [FLOAT: seconds], abort a connection attempt (including the handshake) after this time
 
 
 async def main():
 
     handler = SubHandler()
 
-    while True:
-        
-        client = Client(url="opc.tcp://10.129.4.100:4840")
-        
-        client.set_user("TUe") ## User with write and read acces
-        client.set_password("TUe")
-        client.application_uri = "urn:TUE025918:PythonOPCUA-Client"
-        
-        await client.set_security(SecurityPolicyBasic256Sha256, certificate=CERT, private_key=PRIVATE_KEY)
-            
-        try:
-            async with client:
-                
-                subscription = await client.create_subscription(10, handler)
-                node = client.get_node("ns=2;s=/Channel/MachineAxis/aaVactM[1,4]")
-                await subscription.subscribe_data_change(node)
-                
-                while True:
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws a exception if connection is lost
-        
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    connection = ConnectionManager("opc.tcp://10.129.4.100:4840", user="TUe", password="TUe", connect_timeout=CONNECT_TIMEOUT) ## User with write and read acces
+
+    # The key material is read once, the secure channel is set up on every connect
+    await connection.set_security(SecurityPolicyBasic256Sha256, certificate=CERT, private_key=PRIVATE_KEY, 
+                                  application_uri="urn:TUE025918:PythonOPCUA-Client")
+    
+    # Restored by the connection manager after every reconnect
+    connection.add_subscription(10, handler, ["ns=2;s=/Channel/MachineAxis/aaVactM[1,4]"])
+    
+    await connection.run()
 
 
 class SubHandler:
@@ -84,7 +75,7 @@ class SubHandler:
 
 if __name__ == "__main__":
     logging.getLogger('asyncua').setLevel(logging.WARNING)
-    logging.basicConfig(level=logging.INFO)
+    setup_logging(logging.INFO, rate_limit=10) # Every notification is logged, at most 10 per second are printed
     asyncio.run(main())
 
 
@@ -2,42 +2,43 @@
 # This file is part of Python-OPC-UA.
 # Project: https://github.com/3DCP-TUe/Python-OPC-UA
 #
-# Copyright (c) 2024-2025 3D Concrete Printing Research Group at Eindhoven University of Technology
+# Copyright (c) 2024-2026 3D Concrete Printing Research Group at Eindhoven University of Technology
 #
 # Authors:
-#   - Arjen Deetman (2024-2025)
+#   - Arjen Deetman (2024-2026)
 #
 # For license details, see the LICENSE file in the project root.
 
 import asyncio
 import logging
+import os
+import sys
 from asyncua import Client, ua
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from connection_manager import ConnectionManager
+from tag_registry import TagRegistry
+
+# Tags of the printhead PLC, the namespace index is looked up on the server
+PRINTHEAD_TAGS = {"velocity_jog_left": "nsu=http://www.siemens.com/simatic-s7-opcua;s=\"Velocity_Jog_left\""}
+TAG_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tag_cache.json") # Resolved node ids per server version
+
 async def main():
   
-    while True:
+    connection = ConnectionManager("opc.tcp://10.129.4.20:4840", tags=TagRegistry(PRINTHEAD_TAGS, TAG_CACHE))
+    node_motor_1_velocity = connection.get_node("velocity_jog_left")
 
-        client = Client(url="opc.tcp://10.129.4.20:4840")
+    async def session(client: Client):
+                    
+        while True: 
+            
+            # Write value: motor 1 RPM
+            value = ua.DataValue(ua.Variant(100, ua.VariantType.Double))
+            await node_motor_1_velocity.write_value(value)
 
-        try:
-            async with client:
+            await asyncio.sleep(1)
 
-                node_motor_1_velocity = client.get_node("ns=3;s=\"Velocity_Jog_left\"")
-                            
-                while True: 
-                    
-                    # Write value: motor 1 RPM
-                    value = ua.DataValue(ua.Variant(100, ua.VariantType.Double))
-                    await node_motor_1_velocity.write_value(value)
-
-                    await asyncio.sleep(1)
-                    await client.check_connection()  # Throws a exception if connection is lost
-
-        except ua.UaError as e:
-            logging.warning("An OPC UA error occurred: {}".format(e))
-        except ConnectionError:
-            logging.warning("Lost connection to the OPC UA server. Reconnecting in 2 seconds...")
-            await asyncio.sleep(2)
+    await connection.run(session)
 
 
 if __name__ == "__main__":